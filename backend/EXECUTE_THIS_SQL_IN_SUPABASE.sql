@@ -35,7 +35,8 @@ CREATE TABLE IF NOT EXISTS campaigns (
     duration_days INTEGER DEFAULT 30,
     tags TEXT[] DEFAULT '{}',
     reward_tiers JSONB DEFAULT '[]',
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 -- AI Analyses Table
@@ -104,3 +105,54 @@ CREATE INDEX IF NOT EXISTS idx_pledges_user_id ON pledges(user_id);
 CREATE INDEX IF NOT EXISTS idx_payment_transactions_campaign_id ON payment_transactions(campaign_id);
 CREATE INDEX IF NOT EXISTS idx_payment_transactions_user_id ON payment_transactions(user_id);
 CREATE INDEX IF NOT EXISTS idx_chat_messages_session_id ON chat_messages(session_id);
+
+-- Migrations for existing projects
+-- campaigns.updated_at is the row version marker behind list ETags
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+-- user_sessions: session_token is the primary key, so token lookups already
+-- use its unique index. The per-user cap check reads a user's sessions newest
+-- first, and the expiry sweeper scans by expires_at.
+CREATE INDEX IF NOT EXISTS idx_user_sessions_user_created ON user_sessions(user_id, created_at DESC);
+
+-- users: the admin console pages through users by email (keyset on the
+-- UNIQUE index) and prefix-searches email or name with ILIKE 'term%', which
+-- trigram indexes serve. Admin counts use a partial index.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_users_email_trgm ON users USING gin (email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_name_trgm ON users USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_admins ON users(email) WHERE is_admin;
+
+-- pledges are the ledger behind write-behind campaign counters: a confirmed
+-- pledge is inserted with counter_pending and added to its campaign's totals
+-- by apply_pledge_counters(), which claims only still-pending pledges, so a
+-- retried or duplicated flush counts each pledge once. Existing pledges were
+-- already counted and default to false.
+ALTER TABLE pledges ADD COLUMN IF NOT EXISTS counter_pending BOOLEAN NOT NULL DEFAULT FALSE;
+CREATE INDEX IF NOT EXISTS idx_pledges_counter_pending ON pledges(id) WHERE counter_pending;
+
+-- Also returns each campaign's backers_count after the update: readers of a
+-- lagging replica compare it with the row they read (see backend/counters.py).
+-- The return type changed, so the old definition is dropped first.
+DROP FUNCTION IF EXISTS apply_pledge_counters(UUID[]);
+CREATE FUNCTION apply_pledge_counters(p_pledge_ids UUID[])
+RETURNS TABLE (campaign_id UUID, amount DECIMAL(12, 2), backers INTEGER, backers_count INTEGER)
+LANGUAGE sql AS $$
+    WITH claimed AS (
+        UPDATE pledges SET counter_pending = FALSE
+        WHERE id = ANY(p_pledge_ids) AND counter_pending
+        RETURNING pledges.campaign_id, pledges.amount
+    ), totals AS (
+        SELECT claimed.campaign_id, SUM(claimed.amount) AS amount, COUNT(*)::INTEGER AS backers
+        FROM claimed GROUP BY claimed.campaign_id
+    ), applied AS (
+        UPDATE campaigns c
+        SET raised_amount = c.raised_amount + t.amount,
+            backers_count = c.backers_count + t.backers
+        FROM totals t
+        WHERE c.id = t.campaign_id
+        RETURNING c.id, c.backers_count
+    )
+    SELECT totals.campaign_id, totals.amount, totals.backers, applied.backers_count
+    FROM totals LEFT JOIN applied ON applied.id = totals.campaign_id;
+$$;
@@ -0,0 +1,239 @@
+"""
+Write-behind batching for append-only tables (APPEND_TABLES).
+
+Requests used to wait on a single-row insert for every chat message and
+comment. Now put() writes the row to a local spool
+file and queues it; a flusher inserts queued rows in multi-row batches of up
+to `batch_size`, every `max_delay` seconds or as soon as a batch fills, so
+database round trips scale with batches rather than requests.
+
+- Crash safety: a row is in the spool, fsynced, before put() returns. Each flush starts
+  a new spool and deletes the old ones once their rows are committed. replay() at
+  startup inserts spooled rows whose ids are not in the table yet; spools
+  still locked (flock) by a live worker are left to their owner.
+- Bounded memory: past `max_pending` queued rows put() flushes inline, so a
+  burst slows its own requests down; if the database can't take the rows
+  either, put() raises Backpressure.
+- Failures: a batch that fails is retried row by row. Rows that fail alone
+  (e.g. their campaign was deleted meanwhile) are never dropped: they go to
+  the queue's dead-letter spool, are logged and counted
+  (append_dead_letters_total), and replay() retries them after a restart.
+  If every row fails the database is treated as unavailable and the batch
+  is requeued.
+
+Queued rows are not in the table yet, so readers merge() pending() into
+their results. Spools are per worker and live in APPEND_SPOOL_DIR.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from datastore import StorageBackend, row_matches
+from instrumentation import APPEND_DEAD_LETTERS, db_span
+
+# Not payment_transactions: the payment status check must find a checkout's
+# row from any worker, so it is inserted synchronously
+APPEND_TABLES = ("chat_messages", "comments")
+BATCH_SIZE = int(os.environ.get("APPEND_BATCH_SIZE", "200"))
+MAX_DELAY_SECONDS = float(os.environ.get("APPEND_MAX_DELAY_SECONDS", "0.25"))
+MAX_PENDING = int(os.environ.get("APPEND_MAX_PENDING", "10000"))
+
+logger = logging.getLogger(__name__)
+
+
+class Backpressure(Exception):
+    """The queue is full and the database is not keeping up"""
+
+
+class _Spool:
+    """Append-only JSON-lines file, exclusively locked while its owner lives"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        try:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.file.close()
+            raise
+
+    def write(self, row: dict):
+        self.file.write(json.dumps(row, default=str) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def discard(self):
+        self.path.unlink(missing_ok=True)
+        self.file.close()
+
+
+class AppendQueue:
+    def __init__(self, table: str, spool_dir: Path, batch_size: int = BATCH_SIZE,
+                 max_pending: int = MAX_PENDING):
+        self.table = table
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._rows: List[dict] = []
+        # Taken by a flush that hasn't committed yet; still returned by pending()
+        self._flushing: List[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._generation = 0
+        self._spool = self._open_spool()
+        # Spools whose rows were taken by a flush that hasn't committed yet
+        self._retired: List[_Spool] = []
+        # Rows the database rejected on their own; opened on the first one
+        self._dead: Optional[_Spool] = None
+
+    def _open_spool(self) -> _Spool:
+        self._generation += 1
+        return _Spool(self.spool_dir / f"{self.table}.{self._owner}.{self._generation}.spool")
+
+    def append(self, row: dict) -> int:
+        """Spool and queue `row`; returns the number of queued rows"""
+        with self._lock:
+            self._spool.write(row)
+            self._rows.append(row)
+            return len(self._rows)
+
+    async def put(self, row: dict, db: StorageBackend):
+        if len(self._rows) >= self.max_pending:
+            await asyncio.to_thread(self.flush, db)
+            if len(self._rows) >= self.max_pending:
+                raise Backpressure(f"{self.table}: {len(self._rows)} rows waiting to be written")
+        # append() fsyncs the spool, so it runs off the event loop
+        if await asyncio.to_thread(self.append, row) >= self.batch_size and not self._flush_lock.locked():
+            asyncio.get_running_loop().run_in_executor(None, self._flush_quietly, db)
+
+    def pending(self, filters: Optional[dict] = None) -> List[dict]:
+        """Queued rows matching `filters`, oldest first"""
+        with self._lock:
+            return [dict(row) for row in self._flushing + self._rows if row_matches(row, filters)]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def flush(self, db: StorageBackend) -> int:
+        """Insert every queued row; returns how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._rows:
+                    return 0
+                rows, self._rows = self._rows, []
+                self._flushing = rows
+                self._retired.append(self._spool)
+                self._spool = self._open_spool()
+            written = done = 0
+            try:
+                for done in range(0, len(rows), self.batch_size):
+                    written += self._insert(db, rows[done:done + self.batch_size])
+            except Exception:
+                with self._lock:
+                    self._rows[:0] = rows[done:]
+                    self._flushing = []
+                raise
+            with self._lock:
+                self._flushing = []
+            for spool in self._retired:
+                spool.discard()
+            self._retired = []
+            return written
+
+    def _flush_quietly(self, db: StorageBackend):
+        try:
+            self.flush(db)
+        except Exception as e:
+            logger.error(f"Flushing {self.table} failed: {e}")
+
+    def _insert(self, db: StorageBackend, batch: List[dict]) -> int:
+        try:
+            with db_span(self.table, "insert_batch"):
+                db.insert(self.table, batch)
+            return len(batch)
+        except Exception as batch_error:
+            failures = []
+            for row in batch:
+                try:
+                    with db_span(self.table, "insert"):
+                        db.insert(self.table, [row])
+                except Exception as e:
+                    failures.append((row, e))
+            if len(failures) == len(batch):
+                raise batch_error
+            self._dead_letter(failures)
+            return len(batch) - len(failures)
+
+    def _dead_letter(self, failures: List[tuple]):
+        """Keep rejected rows in the dead-letter spool, which replay() retries"""
+        with self._lock:
+            if self._dead is None:
+                self._dead = _Spool(self.spool_dir / f"{self.table}.{self._owner}.dead.spool")
+            for row, e in failures:
+                self._dead.write(row)
+                logger.error(f"Dead-lettered {self.table} row {row.get('id')} to {self._dead.path.name}: {e}")
+        APPEND_DEAD_LETTERS.inc(len(failures), table=self.table)
+
+    def replay(self, db: StorageBackend) -> int:
+        """Insert rows from spools left behind by stopped workers"""
+        replayed = 0
+        for path in sorted(self.spool_dir.glob(f"{self.table}.*.spool")):
+            if any(path == s.path for s in [self._spool, *self._retired, self._dead] if s is not None):
+                continue
+            try:
+                spool = _Spool(path)
+            except BlockingIOError:
+                continue  # a live worker's spool
+            with open(path, encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                with db_span(self.table, "find"):
+                    stored = db.find(self.table, {"id": {"$in": [r["id"] for r in batch]}}, limit=len(batch),
+                                     columns=["id"])
+                stored_ids = {r["id"] for r in stored}
+                missing = [r for r in batch if r["id"] not in stored_ids]
+                if missing:
+                    replayed += self._insert(db, missing)
+            spool.discard()
+        return replayed
+
+    def reset(self):
+        with self._lock:
+            self._rows, self._flushing = [], []
+
+
+def merge(rows: List[dict], pending: List[dict]) -> List[dict]:
+    """`rows` read from the table plus queued rows it doesn't have yet"""
+    if not pending:
+        return rows
+    stored = {row["id"] for row in rows}
+    return rows + [row for row in pending if row["id"] not in stored]
+
+
+def queues_from_env(root: Path, tables: Iterable[str] = APPEND_TABLES) -> Dict[str, AppendQueue]:
+    spool_dir = Path(os.environ.get("APPEND_SPOOL_DIR", root / "append_spool"))
+    return {table: AppendQueue(table, spool_dir) for table in tables}
+
+
+async def run_flusher(queues: Dict[str, AppendQueue], get_db: Callable[[], StorageBackend],
+                      interval: float = MAX_DELAY_SECONDS):
+    """Flush every queue each `interval` seconds, forever"""
+    while True:
+        await asyncio.sleep(interval)
+        for queue in queues.values():
+            if len(queue):
+                await asyncio.to_thread(queue._flush_quietly, get_db())
+
+
+def flush_all(queues: Dict[str, AppendQueue], db: StorageBackend):
+    for queue in queues.values():
+        queue._flush_quietly(db)
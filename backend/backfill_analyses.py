@@ -0,0 +1,190 @@
+"""
+Backfill ai_analyses for campaigns that don't have one.
+
+Campaigns inserted by create_campaign_extended, seed_campaigns.py or
+add_new_campaigns.py never get an analysis, so get_campaign_analysis serves
+"Analysis pending" for them forever. This script finds those campaigns and
+analyses them in batches: each Gemini call gets BATCH_SIZE campaigns in one
+prompt and answers in JSON mode with one compact record per campaign.
+
+- Calls run with bounded parallelism (--concurrency).
+- Each batch's results are written with one bulk insert.
+- Finished campaign ids are appended to a checkpoint file, so an interrupted
+  run resumes where it stopped.
+- Campaigns missing from or invalid in a response are retried in the next
+  round, up to --rounds.
+
+Usage:
+    python backfill_analyses.py [--batch-size 25] [--concurrency 4] [--dry-run]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from datastore import StorageBackend, backend_from_env, scan
+from instrumentation import db_span, record_llm_usage, span
+from lazy import lazy_import
+from prompts import truncate
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+genai = lazy_import('google.generativeai')
+
+GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash-exp')
+BATCH_SIZE = 25
+DESCRIPTION_TOKENS = 150
+DEFAULT_CHECKPOINT = ROOT_DIR / "backfill_checkpoint.jsonl"
+
+logger = logging.getLogger(__name__)
+
+
+# ============ DISCOVERY ============
+
+# Fields the prompt uses, plus created_at to process oldest campaigns first
+CAMPAIGN_COLUMNS = ["id", "title", "category", "goal_amount", "description", "created_at"]
+
+
+def find_missing(db: StorageBackend, done: Set[str]) -> List[dict]:
+    """Campaigns with no ai_analyses row and not already checkpointed"""
+    analysed = {row["campaign_id"] for row in scan(db, "ai_analyses", columns=["campaign_id"])}
+    missing = [c for c in scan(db, "campaigns", columns=CAMPAIGN_COLUMNS)
+               if c["id"] not in analysed and c["id"] not in done]
+    return sorted(missing, key=lambda c: c.get("created_at") or "")
+
+
+# ============ CHECKPOINT ============
+
+def load_checkpoint(path: Path) -> Set[str]:
+    done = set()
+    if path.exists():
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    done.update(json.loads(line)["campaign_ids"])
+    return done
+
+
+def append_checkpoint(path: Path, campaign_ids: List[str]):
+    with open(path, "a") as f:
+        f.write(json.dumps({"at": datetime.now(timezone.utc).isoformat(), "campaign_ids": campaign_ids}) + "\n")
+
+
+# ============ PROMPTING ============
+
+def build_prompt(batch: List[dict]) -> str:
+    """One prompt for the whole batch; campaigns are referenced by their
+    position, which is shorter and harder to garble than a UUID"""
+    lines = []
+    for key, campaign in enumerate(batch, 1):
+        description = truncate(campaign.get("description"), DESCRIPTION_TOKENS).replace("\n", " ")
+        lines.append(f"[{key}] {campaign['title']} | {campaign.get('category')} | "
+                     f"goal ${campaign.get('goal_amount')} | {description}")
+    return (
+        "Analyze each crowdfunding campaign below and predict its success probability (0-100).\n"
+        "Return campaign_analyses: a JSON array with one object per campaign: "
+        '{"k": <number in brackets>, "p": <probability 0-100>, "a": "<one or two sentence analysis>"}.\n\n'
+        + "\n".join(lines)
+    )
+
+
+def parse_response(text: str, batch: List[dict]) -> Dict[str, dict]:
+    """Valid records by campaign id; anything malformed is simply left out"""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+    if isinstance(data, dict):
+        data = data.get("campaign_analyses", [])
+    results = {}
+    for item in data if isinstance(data, list) else []:
+        try:
+            key, probability, analysis = int(item["k"]), float(item["p"]), str(item["a"]).strip()
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 1 <= key <= len(batch) and 0 <= probability <= 100 and analysis:
+            results[batch[key - 1]["id"]] = {"success_probability": probability, "analysis_text": analysis}
+    return results
+
+
+def generate(prompt: str):
+    genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
+    model = genai.GenerativeModel(GEMINI_MODEL)
+    with span("llm", "backfill_analyses"):
+        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
+    record_llm_usage("backfill_analyses", response)
+    return response
+
+
+# ============ PIPELINE ============
+
+async def analyse_batch(db: StorageBackend, batch: List[dict], semaphore: asyncio.Semaphore,
+                        checkpoint: Optional[Path], dry_run: bool) -> List[dict]:
+    """Analyse one batch and bulk-insert the results; returns the campaigns left unanalysed"""
+    async with semaphore:
+        try:
+            response = await asyncio.to_thread(generate, build_prompt(batch))
+            results = parse_response(response.text, batch)
+        except Exception as e:
+            logger.error(f"Backfill batch of {len(batch)} failed: {e}")
+            return batch
+
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [{"id": str(uuid.uuid4()), "campaign_id": campaign_id, "created_at": now, **result}
+            for campaign_id, result in results.items()]
+    if rows and not dry_run:
+        with db_span("ai_analyses", "insert"):
+            await asyncio.to_thread(db.insert, "ai_analyses", rows)
+        if checkpoint is not None:
+            append_checkpoint(checkpoint, [row["campaign_id"] for row in rows])
+    return [c for c in batch if c["id"] not in results]
+
+
+async def backfill(db: StorageBackend, batch_size: int = BATCH_SIZE, concurrency: int = 4,
+                   checkpoint: Optional[Path] = DEFAULT_CHECKPOINT, rounds: int = 3, dry_run: bool = False) -> dict:
+    done = load_checkpoint(checkpoint) if checkpoint is not None else set()
+    pending = find_missing(db, done)
+    stats = {"missing": len(pending), "analysed": 0, "llm_calls": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    for round_number in range(1, rounds + 1):
+        if not pending:
+            break
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        logger.info(f"Round {round_number}: {len(pending)} campaigns in {len(batches)} calls")
+        leftovers = await asyncio.gather(*(analyse_batch(db, b, semaphore, checkpoint, dry_run) for b in batches))
+        stats["llm_calls"] += len(batches)
+        remaining = [c for batch in leftovers for c in batch]
+        stats["analysed"] += len(pending) - len(remaining)
+        pending = remaining
+
+    stats["failed"] = len(pending)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="campaigns per Gemini call")
+    parser.add_argument("--concurrency", type=int, default=4, help="Gemini calls in flight")
+    parser.add_argument("--rounds", type=int, default=3, help="passes over campaigns a response skipped")
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--dry-run", action="store_true", help="call Gemini but write nothing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    stats = asyncio.run(backfill(backend_from_env(), args.batch_size, args.concurrency,
+                                 args.checkpoint, args.rounds, args.dry_run))
+    print(f"Missing: {stats['missing']}, analysed: {stats['analysed']}, "
+          f"failed: {stats['failed']}, Gemini calls: {stats['llm_calls']}")
+
+
+if __name__ == "__main__":
+    main()
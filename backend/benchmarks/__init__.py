@@ -0,0 +1,6 @@
+"""
+Benchmark suite for the CampaignIQ backend.
+
+Run from the backend directory, e.g.:
+    python -m benchmarks.load_test --mix mixed --requests 2000
+"""
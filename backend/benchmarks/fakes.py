@@ -0,0 +1,202 @@
+"""
+In-process stand-ins for Supabase, Gemini, Stripe and image hosts used by the
+benchmarks.
+
+The data layer is the real MemoryBackend from datastore.py wrapped in
+LatencyBackend. Every fake sleeps for a configurable latency before answering.
+The real SDKs are synchronous, so the fakes block the event loop exactly like
+production does.
+"""
+import functools
+import io
+import json
+import random
+import re
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+
+import appends
+import images
+from datastore import MemoryBackend, StorageBackend
+
+
+class Latency:
+    """Injected latency in milliseconds with optional uniform jitter"""
+
+    def __init__(self, ms: float = 0.0, jitter_ms: float = 0.0):
+        self.ms = ms
+        self.jitter_ms = jitter_ms
+
+    def wait(self):
+        delay = self.ms + (random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+
+# ============ DATA LAYER ============
+
+class LatencyBackend(StorageBackend):
+    """Wraps another backend, sleeping before every call to emulate a network round trip"""
+
+    def __init__(self, inner: StorageBackend, latency: Latency = None):
+        self.inner = inner
+        self.latency = latency or Latency()
+        self.name = f"{inner.name}+latency"
+        self.calls = 0
+
+    def _roundtrip(self):
+        self.latency.wait()
+        self.calls += 1
+
+    def find(self, table, filters=None, limit=1000, order=None, columns=None, max_staleness=0.0):
+        self._roundtrip()
+        return self.inner.find(table, filters, limit=limit, order=order, columns=columns)
+
+    def count(self, table, filters=None, max_staleness=0.0):
+        self._roundtrip()
+        return self.inner.count(table, filters)
+
+    def insert(self, table, rows):
+        self._roundtrip()
+        return self.inner.insert(table, rows)
+
+    def update(self, table, filters, data):
+        self._roundtrip()
+        return self.inner.update(table, filters, data)
+
+    def delete(self, table, filters):
+        self._roundtrip()
+        return self.inner.delete(table, filters)
+
+    def rpc(self, function, params):
+        self._roundtrip()
+        return self.inner.rpc(function, params)
+
+
+# ============ GEMINI ============
+
+def _synthesize(schema: dict):
+    """A minimal value satisfying a compact response_schema (structured.compact_schema)"""
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: _synthesize(child) for name, child in schema.get("properties", {}).items()}
+    if kind == "array":
+        count = schema.get("min_items") or schema.get("max_items") or 3
+        return [_synthesize(schema["items"]) for _ in range(count)]
+    if kind == "integer":
+        return 50
+    if kind == "number":
+        return 50.0
+    if kind == "boolean":
+        return True
+    return "Synthetic"
+
+
+def _canned_reply(prompt: str) -> str:
+    if "campaign_analyses" in prompt:
+        keys = re.findall(r"^\[(\d+)\]", prompt, re.MULTILINE)
+        return json.dumps([{"k": int(k), "p": 60 + int(k) % 30, "a": "Synthetic batch analysis."} for k in keys])
+    if "ONLY a number" in prompt:
+        return "72"
+    return "This is a synthetic assistant reply used for load testing. " * 4
+
+
+class FakeGenerativeModel:
+    latency = Latency()
+
+    def __init__(self, model_name: str = "", **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, **kwargs):
+        self.latency.wait()
+        schema = (kwargs.get("generation_config") or {}).get("response_schema")
+        text = json.dumps(_synthesize(schema)) if schema else _canned_reply(str(prompt))
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=len(str(prompt)) // 4,
+                candidates_token_count=len(text) // 4,
+            ),
+        )
+
+
+# ============ STRIPE ============
+
+class FakeCheckoutSession:
+    latency = Latency()
+    sessions = {}
+
+    @classmethod
+    def create(cls, **kwargs):
+        cls.latency.wait()
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        amount = kwargs["line_items"][0]["price_data"]["unit_amount"]
+        cls.sessions[session_id] = amount
+        return SimpleNamespace(id=session_id, url=f"https://checkout.stripe.test/{session_id}")
+
+    @classmethod
+    def retrieve(cls, session_id):
+        cls.latency.wait()
+        return SimpleNamespace(
+            id=session_id,
+            status="complete",
+            payment_status="paid",
+            amount_total=cls.sessions.get(session_id, 50000),
+            currency="inr",
+        )
+
+
+# ============ IMAGE HOSTS ============
+
+@functools.lru_cache(maxsize=None)
+def _photo(width: int = 2400, height: int = 1600) -> bytes:
+    """A photo-sized JPEG with enough detail that it doesn't compress to nothing"""
+    from PIL import Image
+
+    rng = random.Random(width * height)
+    image = Image.effect_noise((width // 4, height // 4), 64).convert("RGB").resize((width, height))
+    tint = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    out = io.BytesIO()
+    Image.blend(image, tint, 0.5).save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+class FakeImageFetcher:
+    """Serves the same generated photo for every URL"""
+    latency = Latency()
+
+    def __init__(self):
+        self.fetched = []
+
+    def __call__(self, url: str) -> bytes:
+        self.latency.wait()
+        self.fetched.append(url)
+        return _photo()
+
+
+def install_fakes(server, tables: dict, db_ms=0.0, llm_ms=0.0, stripe_ms=0.0, jitter=0.1):
+    """Point an imported `server` module at the fakes. Returns the data backend."""
+    import google.generativeai as genai
+    import stripe
+
+    fake_db = LatencyBackend(MemoryBackend(tables), Latency(db_ms, db_ms * jitter))
+    server.db = fake_db
+
+    FakeGenerativeModel.latency = Latency(llm_ms, llm_ms * jitter)
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+
+    FakeCheckoutSession.latency = Latency(stripe_ms, stripe_ms * jitter)
+    stripe.checkout.Session = FakeCheckoutSession
+
+    cache = images.DiskLRUCache(tempfile.mkdtemp(prefix="image-cache-"), 64 * 1024 * 1024)
+    server.image_proxy = images.ImageProxy(cache, FakeImageFetcher())
+
+    spool_dir = tempfile.mkdtemp(prefix="append-spool-")
+    server.append_queues = {table: appends.AppendQueue(table, spool_dir) for table in appends.APPEND_TABLES}
+
+    return fake_db
@@ -0,0 +1,305 @@
+"""
+End-to-end load test for server.py.
+
+Boots the FastAPI `app` in-process against the fakes in benchmarks/fakes.py,
+drives a weighted traffic mix through httpx and reports throughput and
+p50/p95/p99 latency per endpoint. Results are written as JSON so runs from
+different commits can be compared:
+
+    python -m benchmarks.load_test --mix mixed --requests 2000 --db-latency-ms 5
+    python -m benchmarks.load_test --compare results/load-abc123.json results/load-def456.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def load_app():
+    """Import server.py on the memory backend; the fakes replace the clients"""
+    os.environ["DATA_BACKEND"] = "memory"
+    # Every simulated client shares one IP; measure the app, not the limiter,
+    # unless RATE_LIMIT_ENABLED=1 is set explicitly
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    return server
+
+
+# ============ SCENARIOS ============
+
+class Context:
+    """Shared state the scenarios draw from"""
+
+    def __init__(self, tables: dict, rng: random.Random):
+        self.rng = rng
+        self.campaigns = [c for c in tables["campaigns"] if c["status"] == "active"]
+        self.users = tables["users"]
+        self.tokens = [s["session_token"] for s in tables["user_sessions"]]
+        self.categories = sorted({c["category"] for c in self.campaigns})
+
+    def campaign_id(self):
+        return self.rng.choice(self.campaigns)["id"]
+
+    def auth(self):
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"}
+
+
+async def _timed(client, name, method, url, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    return name, response, (time.perf_counter() - start) * 1000.0
+
+
+async def discover(client, ctx):
+    params = {}
+    roll = ctx.rng.random()
+    if roll < 0.3:
+        params["category"] = ctx.rng.choice(ctx.categories)
+    elif roll < 0.4:
+        params["search"] = ctx.rng.choice(ctx.campaigns)["title"].split()[0]
+    return [await _timed(client, "GET /api/campaigns", "GET", "/api/campaigns", params=params)]
+
+
+async def detail(client, ctx):
+    campaign_id = ctx.campaign_id()
+    return [
+        await _timed(client, "GET /api/campaigns/{id}", "GET", f"/api/campaigns/{campaign_id}"),
+        await _timed(client, "GET /api/campaigns/{id}/analysis", "GET", f"/api/campaigns/{campaign_id}/analysis"),
+        await _timed(client, "GET /api/campaigns/{id}/comments", "GET", f"/api/campaigns/{campaign_id}/comments"),
+    ]
+
+
+async def login(client, ctx):
+    from benchmarks.synthetic import DEFAULT_PASSWORD
+    user = ctx.rng.choice(ctx.users)
+    return [await _timed(client, "POST /api/auth/login", "POST", "/api/auth/login",
+                         json={"email": user["email"], "password": DEFAULT_PASSWORD})]
+
+
+async def me(client, ctx):
+    return [await _timed(client, "GET /api/auth/me", "GET", "/api/auth/me", headers=ctx.auth())]
+
+
+async def ai(client, ctx):
+    campaign = ctx.rng.choice(ctx.campaigns)
+    roll = ctx.rng.random()
+    if roll < 0.5:
+        return [await _timed(client, "POST /api/ai/chat", "POST", "/api/ai/chat", headers=ctx.auth(),
+                             json={"message": "How do I pick reward tiers?"})]
+    if roll < 0.75:
+        return [await _timed(client, "POST /api/ai/optimize-title", "POST", "/api/ai/optimize-title",
+                             headers=ctx.auth(), json={k: campaign[k] for k in ("title", "description", "category")})]
+    return [await _timed(client, "POST /api/ai/success-prediction", "POST", "/api/ai/success-prediction",
+                         headers=ctx.auth(),
+                         json={k: campaign[k] for k in ("title", "description", "category", "goal_amount")})]
+
+
+async def checkout(client, ctx):
+    headers = ctx.auth()
+    results = [await _timed(client, "POST /api/payments/create-checkout", "POST", "/api/payments/create-checkout",
+                            headers=headers, json={"campaign_id": ctx.campaign_id(), "origin_url": "http://bench.test"})]
+    response = results[0][1]
+    if response.status_code == 200:
+        session_id = response.json()["session_id"]
+        results.append(await _timed(client, "GET /api/payments/status/{id}", "GET",
+                                    f"/api/payments/status/{session_id}", headers=headers))
+    return results
+
+
+async def creator(client, ctx):
+    return [
+        await _timed(client, "GET /api/my-campaigns", "GET", "/api/my-campaigns", headers=ctx.auth()),
+        await _timed(client, "GET /api/analytics/overview", "GET", "/api/analytics/overview", headers=ctx.auth()),
+    ]
+
+
+SCENARIOS = {
+    "discover": discover,
+    "detail": detail,
+    "login": login,
+    "me": me,
+    "ai": ai,
+    "checkout": checkout,
+    "creator": creator,
+}
+
+MIXES = {
+    "browse": {"discover": 5, "detail": 4, "me": 1},
+    "login_storm": {"login": 9, "me": 1},
+    "ai": {"ai": 1},
+    "checkout": {"checkout": 1},
+    "mixed": {"discover": 30, "detail": 30, "me": 15, "login": 8, "creator": 7, "ai": 6, "checkout": 4},
+}
+
+
+# ============ RUNNER ============
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples: dict, errors: dict, wall_seconds: float) -> dict:
+    endpoints = {}
+    total = 0
+    for name, latencies in sorted(samples.items()):
+        latencies.sort()
+        total += len(latencies)
+        endpoints[name] = {
+            "count": len(latencies),
+            "errors": errors.get(name, 0),
+            "throughput_rps": round(len(latencies) / wall_seconds, 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "max_ms": round(latencies[-1], 3),
+        }
+    return {
+        "total_requests": total,
+        "total_errors": sum(errors.values()),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(total / wall_seconds, 2) if wall_seconds else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from benchmarks import fakes, synthetic
+
+    server = load_app()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    tables = synthetic.generate(users=args.users, campaigns=args.campaigns, seed=args.seed)
+    fake_db = fakes.install_fakes(server, tables, db_ms=args.db_latency_ms,
+                                  llm_ms=args.llm_latency_ms, stripe_ms=args.stripe_latency_ms)
+
+    rng = random.Random(args.seed)
+    ctx = Context(tables, rng)
+    mix = MIXES[args.mix]
+    names = list(mix)
+    plan = rng.choices(names, weights=[mix[n] for n in names], k=args.requests)
+
+    samples, errors = {}, {}
+    queue = asyncio.Queue()
+    for scenario in plan:
+        queue.put_nowait(scenario)
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench.test", timeout=60.0) as client:
+        async def worker():
+            while True:
+                try:
+                    scenario = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                for name, response, ms in await SCENARIOS[scenario](client, ctx):
+                    samples.setdefault(name, []).append(ms)
+                    if response.status_code >= 400:
+                        errors[name] = errors.get(name, 0) + 1
+
+        # Warm-up request so import-time and first-call costs are not measured
+        await client.get("/api/campaigns")
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - start
+
+    result = summarize(samples, errors, wall)
+    result["db_calls"] = fake_db.calls
+    result["meta"] = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "output")},
+    }
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(result: dict):
+    print(f"\n{'Endpoint':<40} {'count':>7} {'err':>5} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    print("-" * 92)
+    for name, s in result["endpoints"].items():
+        print(f"{name:<40} {s['count']:>7} {s['errors']:>5} {s['throughput_rps']:>9.1f} "
+              f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+    print("-" * 92)
+    print(f"Total: {result['total_requests']} requests, {result['total_errors']} errors, "
+          f"{result['throughput_rps']:.1f} req/s over {result['wall_seconds']:.2f}s")
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float) -> int:
+    """Print per-endpoint p50/p95 deltas; returns the number of regressions above threshold"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    candidate = json.loads(Path(candidate_path).read_text())
+    regressions = 0
+    print(f"\nBaseline {baseline['meta']['commit']}  ->  candidate {candidate['meta']['commit']}")
+    print(f"{'Endpoint':<40} {'p50 base':>10} {'p50 new':>10} {'p95 base':>10} {'p95 new':>10} {'delta':>8}")
+    print("-" * 92)
+    for name, new in candidate["endpoints"].items():
+        old = baseline["endpoints"].get(name)
+        if not old:
+            print(f"{name:<40} {'-':>10} {new['p50_ms']:>10.2f} {'-':>10} {new['p95_ms']:>10.2f} {'new':>8}")
+            continue
+        delta = (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+        flag = ""
+        if delta > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:<40} {old['p50_ms']:>10.2f} {new['p50_ms']:>10.2f} {old['p95_ms']:>10.2f} "
+              f"{new['p95_ms']:>10.2f} {delta:>+7.1%}{flag}")
+    print(f"\nThroughput: {baseline['throughput_rps']:.1f} -> {candidate['throughput_rps']:.1f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the CampaignIQ backend in-process")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--requests", type=int, default=1000, help="number of scenarios to run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--campaigns", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--stripe-latency-ms", type=float, default=30.0)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load-<mix>-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 regression threshold for --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"load-{args.mix}-{result['meta']['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Micro-benchmark: cost of serializing campaign lists.
+
+Compares the old list path (parse created_at with fromisoformat, validate
+every row into Campaign through response_model, dump back to JSON with the
+stdlib encoder) against fast_json() (orjson over the raw rows).
+
+    python -m benchmarks.serialization_bench --rows 1000 10000
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from typing import List
+
+from benchmarks.load_test import load_app
+
+
+def legacy_path(rows, adapter):
+    for row in rows:
+        if isinstance(row['created_at'], str):
+            row['created_at'] = datetime.fromisoformat(row['created_at'])
+    # What FastAPI does for response_model=List[Campaign] with pydantic v2
+    validated = adapter.validate_python(rows)
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(rows, server):
+    return server.fast_json(rows).body
+
+
+def measure(fn, make_rows, repeat):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        rows = make_rows()
+        start = time.perf_counter()
+        body = fn(rows)
+        timings.append(time.perf_counter() - start)
+        size = len(body)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000.0, size
+
+
+def main():
+    from pydantic import TypeAdapter
+    from benchmarks import synthetic
+
+    parser = argparse.ArgumentParser(description="Serialization cost per campaign list size")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    server = load_app()
+    adapter = TypeAdapter(List[server.Campaign])
+
+    print(f"{'rows':>8} {'legacy ms':>12} {'fast ms':>10} {'speedup':>9} {'bytes':>12}")
+    for n in args.rows:
+        source = synthetic.generate(users=20, campaigns=n, comments_per_campaign=0, pledges_per_campaign=0)["campaigns"]
+        make_rows = lambda: [dict(r) for r in source]
+        legacy_ms, _ = measure(lambda rows: legacy_path(rows, adapter), make_rows, args.repeat)
+        fast_ms, size = measure(lambda rows: fast_path(rows, server), make_rows, args.repeat)
+        print(f"{n:>8} {legacy_ms:>12.2f} {fast_ms:>10.2f} {legacy_ms / fast_ms:>8.1f}x {size:>12}")
+
+
+if __name__ == "__main__":
+    main()
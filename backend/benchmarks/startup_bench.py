@@ -0,0 +1,91 @@
+"""
+Worker boot benchmark.
+
+Imports server.py in fresh interpreters under `python -X importtime`, reports
+the cumulative import cost and the heaviest top-level imports, and appends
+the result to benchmarks/results/startup-history.jsonl so boot latency can
+be tracked commit over commit. Exits non-zero when the median import time
+exceeds --budget-ms.
+
+    python -m benchmarks.startup_bench --runs 5 --budget-ms 800
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.load_test import BACKEND_DIR, RESULTS_DIR, git_commit
+
+
+def parse_importtime(stderr: str):
+    """Return {module: (self_us, cumulative_us, depth)} from -X importtime output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def run_once():
+    env = dict(os.environ, DATA_BACKEND="memory")
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000.0
+    if proc.returncode != 0:
+        raise RuntimeError(f"import server failed:\n{proc.stderr[-2000:]}")
+    return wall_ms, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure server.py import/boot time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=800.0, help="median import-time budget")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    walls, imports, last = [], [], {}
+    for _ in range(args.runs):
+        wall_ms, modules = run_once()
+        walls.append(wall_ms)
+        imports.append(modules["server"][1] / 1000.0)
+        last = modules
+
+    # Direct children of `server` are what server.py itself chose to import
+    top_level = sorted(((name, cum / 1000.0) for name, (_, cum, depth) in last.items() if depth == 1),
+                       key=lambda item: item[1], reverse=True)[:args.top]
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "runs": args.runs,
+        "import_ms_median": round(statistics.median(imports), 2),
+        "process_wall_ms_median": round(statistics.median(walls), 2),
+        "budget_ms": args.budget_ms,
+        "heaviest_imports_ms": {name: round(ms, 2) for name, ms in top_level},
+        "sdks_loaded_at_import": [m for m in ("google.generativeai", "stripe", "supabase", "bcrypt") if m in last],
+    }
+
+    print(f"import server: {result['import_ms_median']:.1f}ms median "
+          f"(process wall {result['process_wall_ms_median']:.1f}ms, budget {args.budget_ms:.0f}ms)")
+    for name, ms in result["heaviest_imports_ms"].items():
+        print(f"  {ms:>9.1f}ms  {name}")
+    if result["sdks_loaded_at_import"]:
+        print(f"SDKs imported eagerly: {', '.join(result['sdks_loaded_at_import'])}")
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(RESULTS_DIR / "startup-history.jsonl", "a") as history:
+        history.write(json.dumps(result) + "\n")
+
+    sys.exit(1 if result["import_ms_median"] > args.budget_ms else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Deterministic synthetic data for the benchmarks.
+
+Produces users, sessions, campaigns, comments, pledges and AI analyses in the
+same shape server.py writes them, so the fakes can be seeded with realistic rows.
+"""
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+
+import bcrypt
+
+CATEGORIES = [
+    "Technology", "Health", "Food", "Environment", "Education",
+    "Art", "Film", "Music", "Games", "Fashion",
+]
+
+WORDS = (
+    "smart garden portable solar community heritage recipe coffee roastery "
+    "ocean cleanup learning studio wireless watch fitness board game film "
+    "sustainable apparel science kit workshop fermented zero-waste virtual "
+    "reality kids platform bees urban art gallery music album indie documentary"
+).split()
+
+DEFAULT_PASSWORD = "benchmark-password"
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def generate(users: int = 200, campaigns: int = 1000, comments_per_campaign: int = 5,
+             pledges_per_campaign: int = 3, admins: int = 1, seed: int = 42) -> dict:
+    """Return a dict of table name -> list of rows"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+
+    # A single hash is shared by every user; hashing thousands of passwords
+    # with bcrypt would dominate setup time.
+    password_hash = bcrypt.hashpw(DEFAULT_PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+    tables = {name: [] for name in (
+        "users", "user_sessions", "campaigns", "comments", "pledges",
+        "ai_analyses", "payment_transactions", "chat_messages",
+    )}
+
+    for i in range(users):
+        user_id = _uuid(rng)
+        tables["users"].append({
+            "id": user_id,
+            "email": f"user{i}@bench.test",
+            "name": f"Bench User {i}",
+            "picture": None,
+            "password_hash": password_hash,
+            "is_admin": i < admins,
+            "created_at": (now - timedelta(days=rng.randint(0, 365))).isoformat(),
+        })
+        tables["user_sessions"].append({
+            "session_token": _uuid(rng),
+            "user_id": user_id,
+            "expires_at": (now + timedelta(days=7)).isoformat(),
+            "created_at": now.isoformat(),
+        })
+
+    for i in range(campaigns):
+        creator = rng.choice(tables["users"])
+        goal = float(rng.choice([5000, 10000, 25000, 50000, 100000]))
+        campaign_id = _uuid(rng)
+        tables["campaigns"].append({
+            "id": campaign_id,
+            "title": _sentence(rng, rng.randint(3, 7)).rstrip("."),
+            "description": " ".join(_sentence(rng, rng.randint(8, 16)) for _ in range(rng.randint(3, 8))),
+            "category": rng.choice(CATEGORIES),
+            "goal_amount": goal,
+            "raised_amount": round(goal * rng.uniform(0, 1.6), 2),
+            "creator_id": creator["id"],
+            "creator_name": creator["name"],
+            "image_url": f"https://images.unsplash.com/photo-{rng.randint(10**12, 10**13)}?w=800&h=600&fit=crop",
+            "status": "active" if rng.random() < 0.9 else "completed",
+            "backers_count": rng.randint(0, 800),
+            "duration_days": rng.choice([30, 45, 60]),
+            "tags": rng.sample(WORDS, 3),
+            "reward_tiers": [
+                {"amount": a, "description": _sentence(rng, 5)}
+                for a in sorted(rng.sample([500, 1000, 2500, 5000, 10000], 3))
+            ],
+            "created_at": (now - timedelta(days=rng.randint(0, 60), seconds=rng.randint(0, 86400))).isoformat(),
+        })
+        tables["ai_analyses"].append({
+            "id": _uuid(rng),
+            "campaign_id": campaign_id,
+            "success_probability": round(rng.uniform(20, 95), 1),
+            "analysis_text": _sentence(rng, 12),
+            "created_at": now.isoformat(),
+        })
+
+        for _ in range(comments_per_campaign):
+            author = rng.choice(tables["users"])
+            tables["comments"].append({
+                "id": _uuid(rng),
+                "campaign_id": campaign_id,
+                "user_id": author["id"],
+                "user_name": author["name"],
+                "content": _sentence(rng, rng.randint(5, 20)),
+                "created_at": now.isoformat(),
+            })
+
+        for _ in range(pledges_per_campaign):
+            backer = rng.choice(tables["users"])
+            tables["pledges"].append({
+                "id": _uuid(rng),
+                "campaign_id": campaign_id,
+                "user_id": backer["id"],
+                "amount": rng.choice([500.0, 2500.0, 5000.0]),
+                "session_id": f"cs_test_{rng.getrandbits(64):x}",
+                "payment_status": "paid",
+                "created_at": now.isoformat(),
+            })
+
+    return tables
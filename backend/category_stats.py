@@ -0,0 +1,210 @@
+"""
+Per-category campaign statistics, maintained incrementally.
+
+The engine is built once from the campaigns table and then kept current
+from campaign and pledge events. Each category holds sorted arrays of raised
+amounts and backer counts, so percentiles and medians are index lookups, and
+a ranked list for top campaigns. Snapshots are cached per category and only
+rebuilt after that category changes, so reads are O(1).
+
+Every worker keeps its own engine. `stale()` tells callers when to rebuild
+from the database so writes made by other workers are picked up.
+"""
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import events
+
+TOP_CAMPAIGNS = 5
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _remove(sorted_values: list, value):
+    index = bisect.bisect_left(sorted_values, value)
+    if index < len(sorted_values) and sorted_values[index] == value:
+        del sorted_values[index]
+
+
+class _Category:
+    def __init__(self, name: str):
+        self.name = name
+        # campaign id -> (raised, goal, backers, status, title)
+        self.campaigns: Dict[str, tuple] = {}
+        self.raised = []
+        self.backers = []
+        self.goals = []
+        self.ranked = []  # (-raised, id)
+        self.funded = 0
+        self.active = 0
+        self.raised_total = 0.0
+        self.snapshot: Optional[dict] = None
+
+    def add(self, campaign_id: str, entry: tuple):
+        raised, goal, backers, status, _ = entry
+        self.campaigns[campaign_id] = entry
+        bisect.insort(self.raised, raised)
+        bisect.insort(self.backers, backers)
+        bisect.insort(self.goals, goal)
+        bisect.insort(self.ranked, (-raised, campaign_id))
+        self.funded += goal > 0 and raised >= goal
+        self.active += status == "active"
+        self.raised_total += raised
+        self.snapshot = None
+
+    def remove(self, campaign_id: str):
+        entry = self.campaigns.pop(campaign_id, None)
+        if entry is None:
+            return
+        raised, goal, backers, status, _ = entry
+        _remove(self.raised, raised)
+        _remove(self.backers, backers)
+        _remove(self.goals, goal)
+        _remove(self.ranked, (-raised, campaign_id))
+        self.funded -= goal > 0 and raised >= goal
+        self.active -= status == "active"
+        self.raised_total -= raised
+        self.snapshot = None
+
+    def build_snapshot(self) -> dict:
+        count = len(self.campaigns)
+        top = []
+        for neg_raised, campaign_id in self.ranked[:TOP_CAMPAIGNS]:
+            raised, goal, backers, status, title = self.campaigns[campaign_id]
+            top.append({"id": campaign_id, "title": title, "raised_amount": raised,
+                        "goal_amount": goal, "backers_count": backers, "status": status})
+        return {
+            "category": self.name,
+            "campaign_count": count,
+            "active_count": self.active,
+            "funded_count": self.funded,
+            "success_rate": round(self.funded / count, 4) if count else 0.0,
+            "funding": {
+                "min": self.raised[0] if self.raised else 0.0,
+                "p10": _percentile(self.raised, 10),
+                "p25": _percentile(self.raised, 25),
+                "median": _percentile(self.raised, 50),
+                "p75": _percentile(self.raised, 75),
+                "p90": _percentile(self.raised, 90),
+                "max": self.raised[-1] if self.raised else 0.0,
+                "mean": round(self.raised_total / count, 2) if count else 0.0,
+            },
+            "median_goal": _percentile(self.goals, 50),
+            "median_backers": _percentile(self.backers, 50),
+            "top_campaigns": top,
+        }
+
+
+class CategoryStatsEngine:
+    def __init__(self, refresh_seconds: float = 300.0):
+        self.refresh_seconds = refresh_seconds
+        self._categories: Dict[str, _Category] = {}
+        self._campaign_category: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.built_at: Optional[float] = None
+
+    # ---- maintenance ----
+
+    def rebuild(self, campaigns: Iterable[dict]):
+        categories, index = {}, {}
+        for row in campaigns:
+            category = row.get("category") or "Uncategorized"
+            bucket = categories.get(category)
+            if bucket is None:
+                bucket = categories[category] = _Category(category)
+            bucket.add(row["id"], self._entry(row))
+            index[row["id"]] = category
+        with self._lock:
+            self._categories, self._campaign_category = categories, index
+            self.built_at = time.monotonic()
+
+    def stale(self) -> bool:
+        return self.built_at is None or time.monotonic() - self.built_at > self.refresh_seconds
+
+    @staticmethod
+    def _entry(row: dict) -> tuple:
+        return (float(row.get("raised_amount") or 0.0), float(row.get("goal_amount") or 0.0),
+                int(row.get("backers_count") or 0), row.get("status") or "active", row.get("title") or "")
+
+    def upsert_campaign(self, row: dict):
+        with self._lock:
+            self._remove_locked(row["id"])
+            category = row.get("category") or "Uncategorized"
+            bucket = self._categories.get(category)
+            if bucket is None:
+                bucket = self._categories[category] = _Category(category)
+            bucket.add(row["id"], self._entry(row))
+            self._campaign_category[row["id"]] = category
+
+    def remove_campaign(self, row: dict):
+        with self._lock:
+            self._remove_locked(row["id"])
+
+    def _remove_locked(self, campaign_id: str):
+        category = self._campaign_category.pop(campaign_id, None)
+        if category is not None:
+            self._categories[category].remove(campaign_id)
+
+    def apply_pledge(self, payload: dict):
+        """A confirmed pledge adds its amount and one backer to the campaign"""
+        with self._lock:
+            category = self._campaign_category.get(payload["campaign_id"])
+            if category is None:
+                return
+            bucket = self._categories[category]
+            raised, goal, backers, status, title = bucket.campaigns[payload["campaign_id"]]
+            bucket.remove(payload["campaign_id"])
+            bucket.add(payload["campaign_id"], (raised + float(payload["amount"]), goal, backers + 1, status, title))
+
+    # ---- reads ----
+
+    def get(self, category: str) -> Optional[dict]:
+        with self._lock:
+            bucket = self._categories.get(category)
+            if bucket is None:
+                return None
+            if bucket.snapshot is None:
+                bucket.snapshot = bucket.build_snapshot()
+            return bucket.snapshot
+
+    def all(self) -> Dict[str, dict]:
+        return {name: self.get(name) for name in sorted(self._categories)}
+
+    def totals(self) -> dict:
+        """Platform-wide campaign counts and funds raised, O(categories)"""
+        with self._lock:
+            buckets = list(self._categories.values())
+            return {
+                "campaign_count": sum(len(b.campaigns) for b in buckets),
+                "active_count": sum(b.active for b in buckets),
+                "raised_total": round(sum(b.raised_total for b in buckets), 2),
+            }
+
+    def subscribe(self):
+        events.subscribe(events.CAMPAIGN_CREATED, self.upsert_campaign)
+        events.subscribe(events.CAMPAIGN_UPDATED, self.upsert_campaign)
+        events.subscribe(events.CAMPAIGN_DELETED, self.remove_campaign)
+        events.subscribe(events.PLEDGE_CREATED, self.apply_pledge)
+
+
+def describe(stats: Optional[dict]) -> str:
+    """One-paragraph summary of category stats for LLM prompts"""
+    if not stats or not stats["campaign_count"]:
+        return "No campaigns in this category on our platform yet."
+    funding = stats["funding"]
+    return (
+        f"Platform data for {stats['category']}: {stats['campaign_count']} campaigns, "
+        f"{stats['success_rate'] * 100:.1f}% reached their goal. Raised amounts: median {funding['median']:.0f}, "
+        f"25th-75th percentile {funding['p25']:.0f}-{funding['p75']:.0f}, max {funding['max']:.0f}. "
+        f"Median goal {stats['median_goal']:.0f}, median backers {stats['median_backers']}. "
+        "Top campaigns: " + "; ".join(
+            f"{c['title']} ({c['raised_amount']:.0f} of {c['goal_amount']:.0f}, {c['backers_count']} backers)"
+            for c in stats["top_campaigns"]) + "."
+    )
@@ -0,0 +1,173 @@
+"""
+Response compression and conditional-GET helpers.
+
+CompressionMiddleware compresses text/JSON responses above a size threshold
+with brotli when the client accepts it (and the Brotli wheel is installed),
+falling back to gzip. Single-body responses are compressed in one shot;
+streamed responses are compressed chunk by chunk so memory stays flat.
+
+Strong ETags identify one representation, so the middleware tags the ETag
+with the content coding (`"abc"` -> `"abc-br"`); `etag_matches()` strips the
+suffix again when comparing If-None-Match.
+"""
+import gzip
+import zlib
+from typing import Iterable, Optional
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional wheel
+    brotli = None
+
+COMPRESSIBLE_TYPES = (b"application/json", b"text/", b"application/x-ndjson")
+CODING_SUFFIXES = ("-br", "-gzip")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True when any entity tag in an If-None-Match header equals `etag`"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        for suffix in CODING_SUFFIXES:
+            if candidate.endswith(suffix + '"'):
+                candidate = candidate[:-len(suffix) - 1] + '"'
+                break
+        if candidate == etag:
+            return True
+    return False
+
+
+def _choose_coding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class _StreamCompressor:
+    def __init__(self, coding: str, level: int):
+        if coding == "br":
+            self._obj = brotli.Compressor(quality=level)
+            self._compress, self._flush = self._obj.process, self._obj.finish
+        else:
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._compress, self._flush = self._obj.compress, self._obj.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def finish(self) -> bytes:
+        return self._flush()
+
+
+class CompressionMiddleware:
+    """Pure ASGI gzip/brotli compression for responses of at least `minimum_size` bytes"""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        coding = _choose_coding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        level = self.brotli_quality if coding == "br" else self.gzip_level
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state["start"]
+
+            if state["compressor"] is not None:
+                chunk = state["compressor"].compress(body)
+                if not more_body:
+                    chunk += state["compressor"].finish()
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            response_headers = start.get("headers", [])
+            if not self._should_compress(start, response_headers, body, more_body):
+                state["passthrough"] = True
+                await send(start)
+                await send(message)
+                return
+
+            new_headers = self._rewrite_headers(response_headers, coding)
+            if more_body:
+                # Streamed response: compress incrementally, never buffer the whole body
+                state["compressor"] = _StreamCompressor(coding, level)
+                await send({**start, "headers": new_headers})
+                await send({"type": "http.response.body", "body": state["compressor"].compress(body),
+                            "more_body": True})
+                return
+
+            if coding == "br":
+                compressed = brotli.compress(body, quality=level)
+            else:
+                compressed = gzip.compress(body, compresslevel=level, mtime=0)
+            new_headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+            await send({**start, "headers": new_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _should_compress(self, start, headers: Iterable, body: bytes, more_body: bool) -> bool:
+        if start["status"] < 200 or start["status"] in (204, 304):
+            return False
+        content_type = b""
+        for name, value in headers:
+            name = name.lower()
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.lower()
+        if not any(content_type.startswith(t) for t in COMPRESSIBLE_TYPES):
+            return False
+        return more_body or len(body) >= self.minimum_size
+
+    @staticmethod
+    def _rewrite_headers(headers: Iterable, coding: str):
+        new_headers = []
+        for name, value in headers:
+            lower = name.lower()
+            if lower == b"content-length":
+                continue
+            if lower == b"etag" and value.endswith(b'"'):
+                value = value[:-1] + f"-{coding}".encode("latin-1") + b'"'
+            new_headers.append((name, value))
+        new_headers.append((b"content-encoding", coding.encode("latin-1")))
+        new_headers.append((b"vary", b"Accept-Encoding"))
+        return new_headers
@@ -0,0 +1,179 @@
+"""
+Write-behind campaign counters (raised_amount, backers_count).
+
+A confirmed payment used to read its campaign and write back the new
+totals, so every pledge to a popular campaign was a read-modify-write on one
+row. Now the pledge row itself is the ledger entry: it is inserted with
+`counter_pending = true` and recorded in the worker's CounterAggregator,
+which sums pending pledges per campaign. flush() hands the pending pledge
+ids to the apply_pledge_counters database function, which in one
+transaction flips them to not pending and adds their sums to the campaigns,
+so each flush is one statement however many pledges it carries.
+
+Flushes happen every FLUSH_INTERVAL_SECONDS from run_flusher(), and inline
+once FLUSH_THRESHOLD pledges are pending. They are idempotent: the function
+only claims pledges that are still pending, so a retried flush, or two
+workers flushing the same pledge, counts it once. If a worker dies with
+pledges pending, replay() on the next startup picks them up from the
+pledges table.
+
+merge() adds the worker's pending amounts to campaign rows before they are
+served. Pledges pending in other workers show up after their next flush.
+Campaign rows often come from a lagging read replica, so a flush's amounts
+are kept for `retain_seconds` after it commits and merged into rows that
+don't include them yet. The function returns each campaign's backers_count
+after the flush; as the count only grows, a row showing fewer backers was
+read before the flush reached it.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from datastore import REPORTING, StorageBackend, scan
+from instrumentation import db_span
+
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("COUNTER_FLUSH_INTERVAL_SECONDS", "1"))
+FLUSH_THRESHOLD = int(os.environ.get("COUNTER_FLUSH_THRESHOLD", "200"))
+
+logger = logging.getLogger(__name__)
+
+
+class _Delta:
+    __slots__ = ("amount", "backers", "pledge_ids")
+
+    def __init__(self):
+        self.amount = 0.0
+        self.backers = 0
+        self.pledge_ids: List[str] = []
+
+
+class CounterAggregator:
+    def __init__(self, flush_threshold: int = FLUSH_THRESHOLD, retain_seconds: float = REPORTING):
+        self.flush_threshold = flush_threshold
+        self.retain_seconds = retain_seconds
+        self._pending: Dict[str, _Delta] = {}
+        # Taken by a flush that hasn't committed yet; still merged into reads
+        self._flushing: Dict[str, _Delta] = {}
+        # Committed by a flush, for rows read from a replica that lags behind it:
+        # campaign_id -> [(expires_at, backers_count after the flush, amount, backers)]
+        self._applied: Dict[str, List[Tuple[float, int, float, int]]] = {}
+        self._pledge_ids = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def record(self, pledge: dict) -> bool:
+        """Add a pending pledge; True once enough are pending to flush now"""
+        with self._lock:
+            if pledge["id"] in self._pledge_ids:
+                return False
+            self._pledge_ids.add(pledge["id"])
+            delta = self._pending.get(pledge["campaign_id"])
+            if delta is None:
+                delta = self._pending[pledge["campaign_id"]] = _Delta()
+            delta.amount += float(pledge["amount"])
+            delta.backers += 1
+            delta.pledge_ids.append(pledge["id"])
+            return len(self._pledge_ids) >= self.flush_threshold
+
+    def pending(self, campaign_id: str, backers_count: int = 0):
+        """(amount, backers) missing from a row of `campaign_id` that shows
+        `backers_count`: recorded but not flushed, or flushed after the read"""
+        with self._lock:
+            amount, backers = 0.0, 0
+            for deltas in (self._pending, self._flushing):
+                delta = deltas.get(campaign_id)
+                if delta is not None:
+                    amount += delta.amount
+                    backers += delta.backers
+            for _, backers_after, applied_amount, applied_backers in self._applied.get(campaign_id, ()):
+                if backers_count < backers_after:
+                    amount += applied_amount
+                    backers += applied_backers
+            return amount, backers
+
+    def merge(self, campaign: dict) -> dict:
+        """`campaign` with pending pledges added to its totals"""
+        amount, backers = self.pending(campaign["id"], campaign.get("backers_count") or 0)
+        if backers:
+            campaign["raised_amount"] = (campaign.get("raised_amount") or 0) + amount
+            campaign["backers_count"] = (campaign.get("backers_count") or 0) + backers
+        return campaign
+
+    def merge_all(self, campaigns: Iterable[dict]) -> List[dict]:
+        if not self._pledge_ids and not self._applied:
+            return list(campaigns)
+        return [self.merge(c) for c in campaigns]
+
+    def flush(self, db: StorageBackend) -> int:
+        """Apply every pending pledge to the campaigns table; returns how many were sent"""
+        with self._flush_lock:
+            with self._lock:
+                self._expire_locked(time.monotonic())
+                if not self._pending:
+                    return 0
+                self._flushing, self._pending = self._pending, {}
+                pledge_ids = [i for delta in self._flushing.values() for i in delta.pledge_ids]
+            try:
+                with db_span("campaigns", "apply_pledge_counters"):
+                    applied = db.rpc("apply_pledge_counters", {"p_pledge_ids": pledge_ids})
+            except Exception:
+                # Still pending in the database too; the next flush retries them
+                with self._lock:
+                    for campaign_id, delta in self._flushing.items():
+                        self._requeue_locked(campaign_id, delta)
+                    self._flushing = {}
+                raise
+            now = time.monotonic()
+            with self._lock:
+                for row in applied:
+                    if row.get("backers_count") is not None:
+                        self._applied.setdefault(str(row["campaign_id"]), []).append((
+                            now + self.retain_seconds, int(row["backers_count"]), float(row["amount"]),
+                            int(row["backers"])))
+                self._flushing = {}
+                self._pledge_ids.difference_update(pledge_ids)
+            return len(pledge_ids)
+
+    def _expire_locked(self, now: float):
+        for campaign_id in list(self._applied):
+            entries = [e for e in self._applied[campaign_id] if e[0] > now]
+            if entries:
+                self._applied[campaign_id] = entries
+            else:
+                del self._applied[campaign_id]
+
+    def _requeue_locked(self, campaign_id: str, delta: _Delta):
+        current = self._pending.get(campaign_id)
+        if current is None:
+            self._pending[campaign_id] = delta
+            return
+        current.amount += delta.amount
+        current.backers += delta.backers
+        current.pledge_ids.extend(delta.pledge_ids)
+
+    def replay(self, db: StorageBackend) -> int:
+        """Record pledges left pending by a worker that stopped before flushing"""
+        replayed = 0
+        for row in scan(db, "pledges", {"counter_pending": True}, columns=["id", "campaign_id", "amount"]):
+            self.record(row)
+            replayed += 1
+        return replayed
+
+    def reset(self):
+        with self._lock:
+            self._pending, self._flushing, self._applied = {}, {}, {}
+            self._pledge_ids.clear()
+
+
+async def run_flusher(aggregator: CounterAggregator, get_db: Callable[[], StorageBackend],
+                      interval: float = FLUSH_INTERVAL_SECONDS):
+    """Flush pending counters every `interval` seconds, forever"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(aggregator.flush, get_db())
+        except Exception as e:
+            logger.error(f"Counter flush failed: {e}")
@@ -0,0 +1,542 @@
+"""
+Storage backends behind the sb_* helpers in server.py.
+
+Filters use the same mini-language everywhere: `{"column": value}` is an
+equality match, `{"column": {"$regex": term}}` is a case-insensitive
+substring match (PostgREST `ilike`), `{"column": {"$prefix": term}}` is a
+case-insensitive prefix match, `{"column": {"$in": [a, b]}}` is set
+membership and `{"column": {"$gte": a, "$lt": b}}` are range comparisons
+(`$gt`, `$gte`, `$lt`, `$lte`). `order` is a column name, prefixed with "-"
+for descending. `columns` projects find() results onto a subset of columns.
+PostgREST returns at most SCAN_PAGE_SIZE rows per request, so reads that
+need every matching row page through them with scan().
+Database functions are called with rpc(); MemoryBackend reimplements the
+ones the app uses in MEMORY_FUNCTIONS.
+
+Reads declare how stale a result they tolerate with `max_staleness`
+(seconds; FRESH, BROWSING and REPORTING are the usual values). Single
+backends ignore it; RoutingBackend uses it to pick the read replica or the
+primary.
+
+Implementations:
+- SupabaseBackend talks to PostgREST through the supabase client.
+- MemoryBackend keeps rows in process with hash indexes, for load tests,
+  profiling and CI runs that have no Supabase project.
+- RoutingBackend sends writes to a primary and stale-tolerant reads to a
+  replica, each with its own client and connection pool.
+
+Select one with DATA_BACKEND=supabase|memory (default: supabase). Setting
+SUPABASE_READ_URL adds a RoutingBackend in front of Supabase.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from instrumentation import DB_READ_ROUTES, db_span
+
+# Tables whose primary key is not `id`
+PRIMARY_KEYS = {"user_sessions": "session_token"}
+
+# Columns the memory backend maintains hash indexes for
+INDEXED_COLUMNS = ("id", "email", "session_token", "campaign_id", "creator_id", "user_id")
+
+# Staleness tolerances, in seconds, that reads declare
+FRESH = 0.0        # must see every committed write: auth, payments, read-before-write
+BROWSING = 5.0     # pages people browse; their own writes still read back fresh
+REPORTING = 60.0   # scans, aggregates, admin reports and exports
+
+# PostgREST's default max-rows: one find() never returns more, whatever its
+# limit, so whole-table reads go through scan()
+SCAN_PAGE_SIZE = 1000
+
+# Range operators and the comparison each one applies
+RANGE_OPERATORS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+
+class StorageBackend:
+    """Interface every backend implements. All methods are synchronous."""
+
+    name = "base"
+
+    def find(self, table: str, filters: Optional[dict] = None, limit: int = 1000,
+             order: Optional[str] = None, columns: Optional[Sequence[str]] = None,
+             max_staleness: float = FRESH) -> List[dict]:
+        raise NotImplementedError
+
+    def count(self, table: str, filters: Optional[dict] = None, max_staleness: float = FRESH) -> int:
+        """Number of rows matching `filters`, computed by the backend"""
+        raise NotImplementedError
+
+    def insert(self, table: str, rows: List[dict]) -> List[dict]:
+        raise NotImplementedError
+
+    def update(self, table: str, filters: dict, data: dict) -> List[dict]:
+        raise NotImplementedError
+
+    def delete(self, table: str, filters: dict) -> List[dict]:
+        raise NotImplementedError
+
+    def rpc(self, function: str, params: dict) -> List[dict]:
+        """Call a database function (defined in EXECUTE_THIS_SQL_IN_SUPABASE.sql)"""
+        raise NotImplementedError
+
+    def ping(self):
+        """Cheapest possible round trip; raises if the backend is unreachable"""
+        self.find("campaigns", limit=1)
+
+    @property
+    def auth(self):
+        raise RuntimeError(f"Supabase auth is not available with the {self.name} backend")
+
+
+# ============ SUPABASE ============
+
+def _escape_like(term: str) -> str:
+    """Escape LIKE wildcards so a search term matches literally; PostgREST
+    also treats * as %, so it is dropped"""
+    term = str(term).replace("*", "")
+    return re.sub(r"([\\%_])", r"\\\1", term)
+
+
+class SupabaseBackend(StorageBackend):
+    name = "supabase"
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_env(cls):
+        from supabase import create_client
+        return cls(create_client(os.environ['SUPABASE_URL'], os.environ['SUPABASE_KEY']))
+
+    @staticmethod
+    def _apply_filters(query, filters: Optional[dict]):
+        for key, value in (filters or {}).items():
+            if isinstance(value, dict):
+                if "$regex" in value:
+                    # Supabase uses ilike for pattern matching
+                    query = query.ilike(key, f"%{value['$regex']}%")
+                if "$prefix" in value:
+                    query = query.ilike(key, _escape_like(value["$prefix"]) + "%")
+                if "$in" in value:
+                    query = query.in_(key, list(value["$in"]))
+                for op in RANGE_OPERATORS:
+                    if op in value:
+                        query = getattr(query, op[1:])(key, value[op])
+            else:
+                query = query.eq(key, value)
+        return query
+
+    def find(self, table, filters=None, limit=1000, order=None, columns=None, max_staleness=FRESH):
+        query = self._apply_filters(self.client.table(table).select(",".join(columns or ["*"])), filters)
+        if order:
+            query = query.order(order.lstrip("-"), desc=order.startswith("-"))
+        result = query.limit(limit).execute()
+        return result.data or []
+
+    def count(self, table, filters=None, max_staleness=FRESH):
+        # HEAD request: PostgREST returns the count in Content-Range, no rows
+        pk = PRIMARY_KEYS.get(table, "id")
+        query = self._apply_filters(self.client.table(table).select(pk, count="exact", head=True), filters)
+        return query.execute().count or 0
+
+    def insert(self, table, rows):
+        result = self.client.table(table).insert(rows).execute()
+        return result.data or []
+
+    def update(self, table, filters, data):
+        query = self._apply_filters(self.client.table(table).update(data), filters)
+        return query.execute().data or []
+
+    def delete(self, table, filters):
+        query = self._apply_filters(self.client.table(table).delete(), filters)
+        return query.execute().data or []
+
+    def rpc(self, function, params):
+        return self.client.rpc(function, params).execute().data or []
+
+    @property
+    def auth(self):
+        return self.client.auth
+
+
+# ============ IN-MEMORY ============
+
+def _like_to_regex(pattern: str):
+    """Translate a SQL LIKE pattern (% and _) into a compiled case-insensitive regex"""
+    parts = []
+    for ch in pattern:
+        if ch == "%":
+            parts.append(".*")
+        elif ch == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(ch))
+    return re.compile("^" + "".join(parts) + "$", re.IGNORECASE | re.DOTALL)
+
+
+class _Table:
+    def __init__(self, name: str):
+        self.pk = PRIMARY_KEYS.get(name, "id")
+        self.rows: Dict[str, dict] = {}
+        # column -> value -> {pk: None}; dicts keep insertion order
+        self.indexes: Dict[str, Dict[object, Dict[str, None]]] = {c: {} for c in INDEXED_COLUMNS}
+
+    def index_add(self, key, row):
+        for column, index in self.indexes.items():
+            if column in row:
+                index.setdefault(row[column], {})[key] = None
+
+    def index_remove(self, key, row):
+        for column, index in self.indexes.items():
+            bucket = index.get(row.get(column))
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del index[row.get(column)]
+
+
+class MemoryBackend(StorageBackend):
+    """Dict-backed tables with hash indexes on INDEXED_COLUMNS.
+
+    Equality filters on an indexed column are answered from the index; every
+    other filter is evaluated against the candidate rows. Results are shallow
+    copies, so callers can mutate them the way they mutate PostgREST JSON.
+    """
+
+    name = "memory"
+
+    def __init__(self, tables: Optional[Dict[str, List[dict]]] = None, max_rows: Optional[int] = None):
+        self._tables: Dict[str, _Table] = {}
+        # Caps every find() like PostgREST's max-rows, so tests catch unpaged reads
+        self.max_rows = max_rows
+        self._lock = threading.RLock()
+        for name, rows in (tables or {}).items():
+            self.insert(name, rows)
+
+    def _table(self, name: str) -> _Table:
+        table = self._tables.get(name)
+        if table is None:
+            table = self._tables[name] = _Table(name)
+        return table
+
+    @staticmethod
+    def _predicates(filters: Optional[dict]):
+        predicates = []
+        for key, value in (filters or {}).items():
+            if isinstance(value, dict):
+                if "$regex" in value:
+                    needle = str(value["$regex"]).lower()
+                    predicates.append(lambda row, k=key, n=needle: n in str(row.get(k) or "").lower())
+                if "$prefix" in value:
+                    prefix = str(value["$prefix"]).lower()
+                    predicates.append(lambda row, k=key, p=prefix: str(row.get(k) or "").lower().startswith(p))
+                if "$in" in value:
+                    members = set(value["$in"])
+                    predicates.append(lambda row, k=key, m=members: row.get(k) in m)
+                for op, compare in RANGE_OPERATORS.items():
+                    if op in value:
+                        # NULL never satisfies a comparison, as in SQL
+                        predicates.append(lambda row, k=key, v=value[op], c=compare:
+                                          row.get(k) is not None and c(row[k], v))
+            else:
+                predicates.append(lambda row, k=key, v=value: row.get(k) == v)
+        return predicates
+
+    def _candidates(self, table: _Table, filters: Optional[dict]):
+        """Smallest index bucket matching an equality or $in filter, or a full scan"""
+        best = None
+        for key, value in (filters or {}).items():
+            if isinstance(value, dict):
+                if "$in" not in value or (key != table.pk and key not in table.indexes):
+                    continue
+                if key == table.pk:
+                    bucket = {v: None for v in value["$in"] if v in table.rows}
+                else:
+                    bucket = {}
+                    for member in value["$in"]:
+                        bucket.update(table.indexes[key].get(member, {}))
+                if best is None or len(bucket) < len(best):
+                    best = bucket
+                continue
+            if key == table.pk:
+                row = table.rows.get(value)
+                return [value] if row is not None else []
+            index = table.indexes.get(key)
+            if index is not None:
+                bucket = index.get(value, {})
+                if best is None or len(bucket) < len(best):
+                    best = bucket
+        return list(best) if best is not None else list(table.rows)
+
+    def _match(self, table: _Table, filters: Optional[dict]) -> List[str]:
+        predicates = self._predicates(filters)
+        keys = []
+        for key in self._candidates(table, filters):
+            row = table.rows[key]
+            if all(p(row) for p in predicates):
+                keys.append(key)
+        return keys
+
+    def find(self, table, filters=None, limit=1000, order=None, columns=None, max_staleness=FRESH):
+        if self.max_rows is not None:
+            limit = min(limit, self.max_rows)
+        with self._lock:
+            t = self._table(table)
+            rows = [t.rows[k] for k in self._match(t, filters)]
+            if order:
+                column = order.lstrip("-")
+                # NULLs sort last in both directions, like PostgREST's default
+                present = [r for r in rows if r.get(column) is not None]
+                missing = [r for r in rows if r.get(column) is None]
+                present.sort(key=lambda r: r[column], reverse=order.startswith("-"))
+                rows = present + missing
+            if columns:
+                return [{c: r[c] for c in columns if c in r} for r in rows[:limit]]
+            return [dict(r) for r in rows[:limit]]
+
+    def count(self, table, filters=None, max_staleness=FRESH):
+        with self._lock:
+            return len(self._match(self._table(table), filters))
+
+    def insert(self, table, rows):
+        if isinstance(rows, dict):
+            rows = [rows]
+        with self._lock:
+            t = self._table(table)
+            # All or nothing, like a multi-row INSERT: check every key first
+            keys = set()
+            for row in rows:
+                key = row.get(t.pk)
+                if key is None:
+                    raise ValueError(f"{table}: missing primary key '{t.pk}'")
+                if key in t.rows or key in keys:
+                    raise ValueError(f"{table}: duplicate key value '{key}'")
+                keys.add(key)
+            inserted = []
+            for row in rows:
+                key = row[t.pk]
+                stored = dict(row)
+                t.rows[key] = stored
+                t.index_add(key, stored)
+                inserted.append(dict(stored))
+            return inserted
+
+    def update(self, table, filters, data):
+        with self._lock:
+            t = self._table(table)
+            updated = []
+            for key in self._match(t, filters):
+                row = t.rows[key]
+                t.index_remove(key, row)
+                row.update(data)
+                new_key = row.get(t.pk)
+                if new_key != key:
+                    del t.rows[key]
+                    t.rows[new_key] = row
+                t.index_add(new_key, row)
+                updated.append(dict(row))
+            return updated
+
+    def delete(self, table, filters):
+        with self._lock:
+            t = self._table(table)
+            deleted = []
+            for key in self._match(t, filters):
+                row = t.rows.pop(key)
+                t.index_remove(key, row)
+                deleted.append(dict(row))
+            return deleted
+
+    def rpc(self, function, params):
+        with self._lock:
+            return MEMORY_FUNCTIONS[function](self, params)
+
+    def dump(self) -> Dict[str, List[dict]]:
+        """Copy of every table, e.g. for assertions in tests"""
+        with self._lock:
+            return {name: [dict(r) for r in t.rows.values()] for name, t in self._tables.items()}
+
+
+def scan(db: StorageBackend, table: str, filters: Optional[dict] = None, columns: Optional[Sequence[str]] = None,
+         max_staleness: float = FRESH, page_size: int = SCAN_PAGE_SIZE) -> Iterator[dict]:
+    """Every row matching `filters`, fetched in primary-key order one keyset
+    page at a time (see pagination.py); `columns` always gains the key"""
+    key = PRIMARY_KEYS.get(table, "id")
+    if columns and key not in columns:
+        columns = [*columns, key]
+    after = None
+    while True:
+        page_filters = dict(filters or {})
+        if after is not None:
+            page_filters[key] = {"$gt": after}
+        with db_span(table, "scan"):
+            rows = db.find(table, page_filters, limit=page_size, order=key, columns=columns,
+                           max_staleness=max_staleness)
+        if not rows:
+            # Not `len(rows) < page_size`: a server capped below page_size returns short pages
+            return
+        yield from rows
+        after = rows[-1][key]
+
+
+def row_matches(row: dict, filters: Optional[dict]) -> bool:
+    """Whether `row` satisfies `filters`, evaluated in process"""
+    return all(predicate(row) for predicate in MemoryBackend._predicates(filters))
+
+
+def _apply_pledge_counters(db: MemoryBackend, params: dict) -> List[dict]:
+    """apply_pledge_counters(): claim still-pending pledges and add them to
+    their campaigns' totals; returns what was applied per campaign and the
+    campaign's backers_count afterwards"""
+    claimed = db.update("pledges", {"id": {"$in": params["p_pledge_ids"]}, "counter_pending": True},
+                        {"counter_pending": False})
+    totals: Dict[str, dict] = {}
+    for pledge in claimed:
+        total = totals.setdefault(pledge["campaign_id"], {"campaign_id": pledge["campaign_id"], "amount": 0.0,
+                                                          "backers": 0})
+        total["amount"] += pledge["amount"]
+        total["backers"] += 1
+    applied = []
+    for campaign_id, total in totals.items():
+        for campaign in db.find("campaigns", {"id": campaign_id}):
+            updated = db.update("campaigns", {"id": campaign_id}, {
+                "raised_amount": (campaign.get("raised_amount") or 0) + total["amount"],
+                "backers_count": (campaign.get("backers_count") or 0) + total["backers"],
+            })
+            applied.append({**total, "backers_count": updated[0]["backers_count"]})
+    return applied
+
+
+# Database functions, reimplemented for the in-memory backend
+MEMORY_FUNCTIONS = {
+    "apply_pledge_counters": _apply_pledge_counters,
+}
+
+
+# ============ READ/WRITE ROUTING ============
+
+# Who is making the current request (server.py binds the user id); writes
+# pin that key to the primary so the writer reads its own writes
+_route_key: ContextVar[Optional[str]] = ContextVar("db_route_key", default=None)
+
+
+def bind_route_key(key: Optional[str]):
+    _route_key.set(key)
+
+
+class RoutingBackend(StorageBackend):
+    """Writes go to `primary`. A read goes to `replica` when its max_staleness
+    covers the replica's lag bound (`replica_lag`, seconds) and the caller
+    has not written within that window; otherwise it reads the primary. A
+    failing replica read is retried on the primary.
+
+    Pins live in this process: a request served by another worker right
+    after a write may still read the replica, within the caller's tolerance.
+    """
+
+    name = "routing"
+
+    def __init__(self, primary: StorageBackend, replica: StorageBackend, replica_lag: float = 2.0,
+                 max_pins: int = 100_000):
+        self.primary = primary
+        self.replica = replica
+        self.replica_lag = replica_lag
+        self.max_pins = max_pins
+        self._pins: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.name = f"{primary.name}+replica"
+
+    def _pin(self):
+        key = _route_key.get()
+        if key is None:
+            return
+        with self._lock:
+            self._pins[key] = time.monotonic()
+            self._pins.move_to_end(key)
+            if len(self._pins) > self.max_pins:
+                self._pins.popitem(last=False)
+
+    def _route(self, max_staleness: float):
+        if max_staleness < self.replica_lag:
+            return self.primary, "fresh"
+        key = _route_key.get()
+        if key is not None:
+            with self._lock:
+                written = self._pins.get(key)
+            if written is not None and time.monotonic() - written < self.replica_lag:
+                return self.primary, "pinned"
+        return self.replica, "stale_ok"
+
+    def _read(self, method: str, max_staleness: float, *args, **kwargs):
+        backend, reason = self._route(max_staleness)
+        if backend is self.replica:
+            try:
+                result = getattr(self.replica, method)(*args, **kwargs)
+                DB_READ_ROUTES.inc(target="replica", reason=reason)
+                return result
+            except Exception:
+                reason = "replica_error"
+        DB_READ_ROUTES.inc(target="primary", reason=reason)
+        return getattr(self.primary, method)(*args, **kwargs)
+
+    def find(self, table, filters=None, limit=1000, order=None, columns=None, max_staleness=FRESH):
+        return self._read("find", max_staleness, table, filters, limit=limit, order=order, columns=columns)
+
+    def count(self, table, filters=None, max_staleness=FRESH):
+        return self._read("count", max_staleness, table, filters)
+
+    def insert(self, table, rows):
+        try:
+            return self.primary.insert(table, rows)
+        finally:
+            self._pin()
+
+    def update(self, table, filters, data):
+        try:
+            return self.primary.update(table, filters, data)
+        finally:
+            self._pin()
+
+    def delete(self, table, filters):
+        try:
+            return self.primary.delete(table, filters)
+        finally:
+            self._pin()
+
+    def rpc(self, function, params):
+        try:
+            return self.primary.rpc(function, params)
+        finally:
+            self._pin()
+
+    def ping(self):
+        self.primary.ping()
+
+    @property
+    def auth(self):
+        return self.primary.auth
+
+
+def backend_from_env() -> StorageBackend:
+    kind = os.environ.get('DATA_BACKEND', 'supabase').lower()
+    if kind == 'memory':
+        return MemoryBackend()
+    if kind == 'supabase':
+        primary = SupabaseBackend.from_env()
+        read_url = os.environ.get('SUPABASE_READ_URL')
+        if not read_url:
+            return primary
+        from supabase import create_client
+        replica = SupabaseBackend(create_client(read_url, os.environ.get('SUPABASE_READ_KEY') or os.environ['SUPABASE_KEY']))
+        return RoutingBackend(primary, replica, float(os.environ.get('DB_REPLICA_MAX_LAG_SECONDS', '2')))
+    raise ValueError(f"Unknown DATA_BACKEND '{kind}' (expected 'supabase' or 'memory')")
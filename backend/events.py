@@ -0,0 +1,34 @@
+"""
+In-process domain events.
+
+Handlers that keep derived state (category stats, feeds, similarity index,
+...) subscribe here instead of being called from every write path in
+server.py. Handlers run synchronously in the emitting request and must be
+cheap; a failing handler is logged and never fails the request.
+"""
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+CAMPAIGN_CREATED = "campaign.created"
+CAMPAIGN_UPDATED = "campaign.updated"
+CAMPAIGN_DELETED = "campaign.deleted"
+CAMPAIGN_ENDED = "campaign.ended"  # deadline passed; the row is also emitted as CAMPAIGN_UPDATED
+PLEDGE_CREATED = "pledge.created"
+
+logger = logging.getLogger(__name__)
+
+_handlers: Dict[str, List[Callable[[dict], None]]] = defaultdict(list)
+
+
+def subscribe(event: str, handler: Callable[[dict], None]):
+    if handler not in _handlers[event]:
+        _handlers[event].append(handler)
+
+
+def emit(event: str, payload: dict):
+    for handler in _handlers.get(event, ()):
+        try:
+            handler(payload)
+        except Exception as e:
+            logger.error(f"Event handler {getattr(handler, '__qualname__', handler)} failed for {event}: {e}")
@@ -0,0 +1,177 @@
+"""
+Ranked campaign feeds: trending, nearly funded and newest.
+
+Each feed is a sorted list of (key, campaign id) maintained with bisect, so
+serving the top k is a slice, O(k), and a write costs O(log n) to locate
+plus a list shift. Only active campaigns are ranked.
+
+- trending: pledge velocity with forward exponential decay. A pledge at time
+  t adds exp(LAMBDA * (t - landmark)) to its campaign's score, so older
+  pledges never have to be re-scored; dividing by exp(LAMBDA * (now -
+  landmark)) gives "recent backers", halving every TRENDING_HALF_LIFE. The
+  landmark moves forward before the exponent can overflow.
+- nearly_funded: raised / goal for campaigns that have not reached their goal.
+- newest: created_at.
+
+The index is kept current from campaign and pledge events and rebuilt
+from the campaigns table plus recent pledges on the refresh interval.
+"""
+import bisect
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import events
+
+FEEDS = ("trending", "nearly_funded", "newest")
+TRENDING_HALF_LIFE = timedelta(hours=24)
+# Pledges older than this contribute < 1% of a fresh pledge; rebuilds skip them
+TRENDING_WINDOW = TRENDING_HALF_LIFE * 7
+LAMBDA = math.log(2) / TRENDING_HALF_LIFE.total_seconds()
+MAX_EXPONENT = 50.0
+
+
+def _epoch(value) -> float:
+    if value is None:
+        return 0.0
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value.timestamp()
+
+
+class _Ranking:
+    """Campaign ids ordered by a numeric key, highest first on read"""
+
+    def __init__(self):
+        self._entries = []   # ascending (key, id)
+        self._keys: Dict[str, float] = {}
+
+    def set(self, campaign_id: str, key: float):
+        self.discard(campaign_id)
+        bisect.insort(self._entries, (key, campaign_id))
+        self._keys[campaign_id] = key
+
+    def discard(self, campaign_id: str):
+        key = self._keys.pop(campaign_id, None)
+        if key is not None:
+            index = bisect.bisect_left(self._entries, (key, campaign_id))
+            del self._entries[index]
+
+    def top(self, k: int) -> List[str]:
+        return [campaign_id for _, campaign_id in reversed(self._entries[-k:])] if k > 0 else []
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FeedIndex:
+    def __init__(self, refresh_seconds: float = 300.0):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self.built_at: Optional[float] = None
+        self._reset()
+
+    def _reset(self):
+        self._rows: Dict[str, dict] = {}
+        self._scores: Dict[str, float] = {}   # forward-decay trending scores
+        self._landmark = time.time()
+        self._feeds = {name: _Ranking() for name in FEEDS}
+
+    # ---- maintenance ----
+
+    def rebuild(self, campaigns: Iterable[dict], pledges: Iterable[dict] = ()):
+        fresh = FeedIndex(self.refresh_seconds)
+        fresh._landmark = time.time() - TRENDING_WINDOW.total_seconds()
+        for row in campaigns:
+            fresh._upsert_locked(row)
+        for pledge in pledges:
+            fresh._pledge_locked(pledge["campaign_id"], _epoch(pledge.get("created_at")))
+        with self._lock:
+            self._rows, self._scores = fresh._rows, fresh._scores
+            self._landmark, self._feeds = fresh._landmark, fresh._feeds
+            self.built_at = time.monotonic()
+
+    def stale(self) -> bool:
+        return self.built_at is None or time.monotonic() - self.built_at > self.refresh_seconds
+
+    def _upsert_locked(self, row: dict):
+        campaign_id = row["id"]
+        if row.get("status", "active") != "active":
+            self._remove_locked(campaign_id)
+            return
+        self._rows[campaign_id] = dict(row)
+        self._feeds["newest"].set(campaign_id, _epoch(row.get("created_at")))
+        self._feeds["trending"].set(campaign_id, self._scores.get(campaign_id, 0.0))
+        self._rank_funding_locked(campaign_id)
+
+    def _rank_funding_locked(self, campaign_id: str):
+        row = self._rows[campaign_id]
+        goal, raised = row.get("goal_amount") or 0, row.get("raised_amount") or 0
+        if goal > 0 and raised < goal:
+            self._feeds["nearly_funded"].set(campaign_id, raised / goal)
+        else:
+            self._feeds["nearly_funded"].discard(campaign_id)
+
+    def _remove_locked(self, campaign_id: str):
+        self._rows.pop(campaign_id, None)
+        self._scores.pop(campaign_id, None)
+        for ranking in self._feeds.values():
+            ranking.discard(campaign_id)
+
+    def _pledge_locked(self, campaign_id: str, at: float):
+        if campaign_id not in self._rows:
+            return
+        if LAMBDA * (at - self._landmark) > MAX_EXPONENT:
+            self._rebase_locked(at)
+        score = self._scores.get(campaign_id, 0.0) + math.exp(LAMBDA * (at - self._landmark))
+        self._scores[campaign_id] = score
+        self._feeds["trending"].set(campaign_id, score)
+
+    def _rebase_locked(self, now: float):
+        # Scaling every score by the same factor keeps the order; only the
+        # ranking entries need rewriting
+        factor = math.exp(-LAMBDA * (now - self._landmark))
+        self._landmark = now
+        self._scores = {cid: score * factor for cid, score in self._scores.items()}
+        trending = self._feeds["trending"] = _Ranking()
+        for campaign_id in self._rows:
+            trending.set(campaign_id, self._scores.get(campaign_id, 0.0))
+
+    def upsert_campaign(self, row: dict):
+        with self._lock:
+            self._upsert_locked(row)
+
+    def remove_campaign(self, row: dict):
+        with self._lock:
+            self._remove_locked(row["id"])
+
+    def apply_pledge(self, payload: dict):
+        with self._lock:
+            row = self._rows.get(payload["campaign_id"])
+            if row is None:
+                return
+            row["raised_amount"] = (row.get("raised_amount") or 0) + payload["amount"]
+            row["backers_count"] = (row.get("backers_count") or 0) + 1
+            self._rank_funding_locked(payload["campaign_id"])
+            self._pledge_locked(payload["campaign_id"], time.time())
+
+    def subscribe(self):
+        events.subscribe(events.CAMPAIGN_CREATED, self.upsert_campaign)
+        events.subscribe(events.CAMPAIGN_UPDATED, self.upsert_campaign)
+        events.subscribe(events.CAMPAIGN_DELETED, self.remove_campaign)
+        events.subscribe(events.PLEDGE_CREATED, self.apply_pledge)
+
+    # ---- reads ----
+
+    def top(self, feed: str, k: int) -> List[dict]:
+        """Top-k campaigns of a feed, O(k); trending rows carry their decayed score"""
+        with self._lock:
+            ids = self._feeds[feed].top(k)
+            rows = [dict(self._rows[campaign_id]) for campaign_id in ids]
+            if feed == "trending":
+                decay = math.exp(-LAMBDA * (time.time() - self._landmark))
+                for row in rows:
+                    row["trending_score"] = round(self._scores.get(row["id"], 0.0) * decay, 4)
+            return rows
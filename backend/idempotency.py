@@ -0,0 +1,274 @@
+"""
+Idempotency-Key support for POST endpoints that are expensive to repeat.
+
+A client that sends `Idempotency-Key: <unique value>` on a covered route
+(IDEMPOTENT_ROUTES: campaign creation, checkout, comments, /api/ai/*) gets
+the work done at most once per key. The first request claims the key and
+runs; its response is stored for RESULT_TTL_SECONDS. A duplicate that
+arrives while the original is still running waits for it (up to
+WAIT_SECONDS, then 409), and one that arrives later gets the stored
+response replayed, marked `Idempotent-Replayed: true`. Requests without the
+header behave as before.
+
+Keys are scoped to the caller (hashed session token, or client IP when
+anonymous), so one user can never replay another's response. Reusing a key
+for a different request body is a 422. Only responses the handler
+produced are stored: after a server error, a dropped connection or a "try
+again later" status (TRANSIENT_STATUSES, e.g. admission control's 429) the
+key is released and a retry runs again. A claim left behind by a crashed worker expires
+after LEASE_SECONDS.
+
+Records live in an IdempotencyStore. MemoryIdempotencyStore is per worker;
+RedisIdempotencyStore (optional `redis` package) is shared by every worker.
+Select with IDEMPOTENCY_BACKEND=memory|redis.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from instrumentation import IDEMPOTENT_REQUESTS
+from rate_limit import AdmissionController
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+MAX_STORED_BODY = 1024 * 1024
+RESULT_TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+LEASE_SECONDS = 120.0
+WAIT_SECONDS = 60.0
+# Not stored: the same request is expected to succeed when retried later
+TRANSIENT_STATUSES = frozenset({409, 429})
+
+IDEMPOTENT_ROUTES = tuple(re.compile(pattern) for pattern in (
+    r"^/api/campaigns(/extended)?$",
+    r"^/api/campaigns/[^/]+/comments$",
+    r"^/api/payments/create-checkout$",
+    r"^/api/ai/[^/]+$",
+))
+
+# begin() outcomes
+CLAIMED, PENDING, DONE, MISMATCH = "claimed", "pending", "done", "mismatch"
+
+
+# ============ STORES ============
+
+class IdempotencyStore:
+    def begin(self, key: str, fingerprint: str, lease: float) -> Tuple[str, Optional[dict]]:
+        """Claim `key` for a new request, or report its state: (CLAIMED, None),
+        (PENDING, None), (DONE, response) or (MISMATCH, None)"""
+        raise NotImplementedError
+
+    def complete(self, key: str, fingerprint: str, response: dict, ttl: float):
+        raise NotImplementedError
+
+    def release(self, key: str):
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Per-process records; the oldest are dropped past `max_keys`"""
+
+    def __init__(self, max_keys: int = 50_000):
+        self.max_keys = max_keys
+        # key -> (fingerprint, expires_at, response or None while pending)
+        self._records: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key, fingerprint, lease):
+        now = time.monotonic()
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record[1] <= now:
+                del self._records[key]
+                record = None
+            if record is None:
+                self._records[key] = (fingerprint, now + lease, None)
+                if len(self._records) > self.max_keys:
+                    self._records.popitem(last=False)
+                return CLAIMED, None
+            if record[0] != fingerprint:
+                return MISMATCH, None
+            return (PENDING, None) if record[2] is None else (DONE, record[2])
+
+    def complete(self, key, fingerprint, response, ttl):
+        with self._lock:
+            self._records[key] = (fingerprint, time.monotonic() + ttl, response)
+
+    def release(self, key):
+        with self._lock:
+            self._records.pop(key, None)
+
+    def reset(self):
+        with self._lock:
+            self._records.clear()
+
+
+class RedisIdempotencyStore(IdempotencyStore):
+    """Records shared by every worker; claims are SET NX with the lease as expiry"""
+
+    def __init__(self, client, prefix: str = "idempotency:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def begin(self, key, fingerprint, lease):
+        pending = json.dumps({"fingerprint": fingerprint})
+        if self.client.set(self.prefix + key, pending, nx=True, px=int(lease * 1000)):
+            return CLAIMED, None
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            # Expired between the two calls
+            return self.begin(key, fingerprint, lease)
+        record = json.loads(raw)
+        if record["fingerprint"] != fingerprint:
+            return MISMATCH, None
+        return (DONE, record["response"]) if "response" in record else (PENDING, None)
+
+    def complete(self, key, fingerprint, response, ttl):
+        record = json.dumps({"fingerprint": fingerprint, "response": response})
+        self.client.set(self.prefix + key, record, px=int(ttl * 1000))
+
+    def release(self, key):
+        self.client.delete(self.prefix + key)
+
+    def reset(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+# ============ MIDDLEWARE ============
+
+def covered(scope) -> bool:
+    return scope["method"] == "POST" and any(route.match(scope["path"]) for route in IDEMPOTENT_ROUTES)
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI: runs a keyed request once and replays its response to duplicates"""
+
+    def __init__(self, app, store: IdempotencyStore, enabled: bool = True):
+        self.app = app
+        self.store = store
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled or not covered(scope):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        client_key = headers.get(HEADER, b"").decode("latin-1").strip()
+        if not client_key:
+            await self.app(scope, receive, send)
+            return
+        if len(client_key) > MAX_KEY_LENGTH:
+            await self._respond(send, 400, {"detail": "Idempotency-Key is too long"})
+            return
+
+        body = await self._read_body(receive)
+        owner = AdmissionController.user_key(headers)
+        if owner is None:
+            client = scope.get("client")
+            owner = f"ip:{client[0] if client else 'unknown'}"
+        key = hashlib.sha256(f"{owner}|{scope['path']}|{client_key}".encode("utf-8")).hexdigest()
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        deadline = time.monotonic() + WAIT_SECONDS
+        delay = 0.025
+        waited = False
+        while True:
+            state, stored = self.store.begin(key, fingerprint, LEASE_SECONDS)
+            if state != PENDING:
+                break
+            if time.monotonic() >= deadline:
+                IDEMPOTENT_REQUESTS.inc(outcome="conflict")
+                await self._respond(send, 409, {"detail": "A request with this Idempotency-Key is still in progress"})
+                return
+            waited = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        if state == MISMATCH:
+            IDEMPOTENT_REQUESTS.inc(outcome="mismatch")
+            await self._respond(send, 422, {"detail": "Idempotency-Key was already used for a different request"})
+            return
+        if state == DONE:
+            IDEMPOTENT_REQUESTS.inc(outcome="waited" if waited else "replayed")
+            await self._replay(send, stored)
+            return
+
+        IDEMPOTENT_REQUESTS.inc(outcome="executed")
+        await self._execute(scope, body, send, key, fingerprint)
+
+    async def _execute(self, scope, body: bytes, send, key: str, fingerprint: str):
+        response = {"status": 500, "headers": [], "body": b""}
+        chunks = []
+
+        async def replay_receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in message["headers"]]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        completed = False
+        try:
+            await self.app(scope, replay_receive, capture)
+            completed = True
+        finally:
+            body_out = b"".join(chunks)
+            status = response["status"]
+            if completed and status < 500 and status not in TRANSIENT_STATUSES and len(body_out) <= MAX_STORED_BODY:
+                response["body"] = base64.b64encode(body_out).decode("ascii")
+                self.store.complete(key, fingerprint, response, RESULT_TTL_SECONDS)
+            else:
+                self.store.release(key)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _replay(send, stored: dict):
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in stored["headers"]]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": stored["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": base64.b64decode(stored["body"])})
+
+    @staticmethod
+    async def _respond(send, status: int, content: dict):
+        body = json.dumps(content).encode("utf-8")
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def store_from_env() -> IdempotencyStore:
+    kind = os.environ.get("IDEMPOTENCY_BACKEND", "memory").lower()
+    if kind == "redis":
+        return RedisIdempotencyStore.from_url(os.environ["IDEMPOTENCY_REDIS_URL"])
+    if kind == "memory":
+        return MemoryIdempotencyStore()
+    raise ValueError(f"Unknown IDEMPOTENCY_BACKEND '{kind}' (expected 'memory' or 'redis')")
@@ -0,0 +1,228 @@
+"""
+Campaign image proxy: sized thumbnails with an on-disk LRU cache.
+
+Campaign cards used to load `image_url` directly, often a multi-megabyte
+original. ImageProxy fetches a source once, renders it at one of a few
+named SIZES (center-cropped, WebP when the client accepts it, else JPEG)
+and keeps both the source and every rendition in a DiskLRUCache bounded by
+total bytes. Only named sizes are rendered, so clients can't fill the cache
+with arbitrary dimensions.
+
+Fetching goes through a pluggable `fetcher(url) -> bytes`. The default,
+HttpFetcher, only follows http(s) URLs that resolve to public addresses
+(image_url is user-supplied, so this keeps the proxy from reaching internal
+services) and caps the download size. Tests pass a fetcher that serves
+bytes from memory.
+"""
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from instrumentation import record_cache, span
+from lazy import lazy_import
+
+httpx = lazy_import('httpx')
+Image = lazy_import('PIL.Image')
+ImageOps = lazy_import('PIL.ImageOps')
+
+# name -> (width, height); renditions are cropped to fill exactly
+SIZES = {
+    "thumb": (320, 200),
+    "card": (640, 400),
+    "hero": (1280, 640),
+}
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+QUALITY = {"webp": 75, "jpeg": 80}
+MAX_SOURCE_BYTES = 15 * 1024 * 1024
+
+
+class ImageFetchError(Exception):
+    """The source image could not be fetched or decoded"""
+
+
+# ============ FETCHING ============
+
+def _is_public_host(host: str) -> bool:
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0])
+        if not address.is_global:
+            return False
+    return True
+
+
+class HttpFetcher:
+    def __init__(self, timeout: float = 10.0, max_bytes: int = MAX_SOURCE_BYTES, max_redirects: int = 3):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_redirects = max_redirects
+
+    @staticmethod
+    def _check(url: str):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ImageFetchError(f"Unsupported image URL: {url}")
+        if not _is_public_host(parsed.hostname):
+            raise ImageFetchError(f"Image host is not public: {parsed.hostname}")
+
+    def __call__(self, url: str) -> bytes:
+        try:
+            # Redirects are followed by hand so every hop is checked
+            for _ in range(self.max_redirects + 1):
+                self._check(url)
+                with httpx.stream("GET", url, timeout=self.timeout) as response:
+                    if response.is_redirect:
+                        url = str(response.url.join(response.headers["location"]))
+                        continue
+                    response.raise_for_status()
+                    chunks, size = [], 0
+                    for chunk in response.iter_bytes():
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise ImageFetchError(f"Image larger than {self.max_bytes} bytes: {url}")
+                        chunks.append(chunk)
+                    return b"".join(chunks)
+        except httpx.HTTPError as e:
+            raise ImageFetchError(f"Fetching {url} failed: {e}") from e
+        raise ImageFetchError(f"Too many redirects: {url}")
+
+
+# ============ DISK CACHE ============
+
+class DiskLRUCache:
+    """Files in one directory, evicted least recently used first once their
+    total size passes `max_bytes`. Recency survives restarts through file
+    mtimes, which get() refreshes."""
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self.size = 0
+        files = [p for p in self.directory.iterdir() if p.is_file() and not p.name.endswith(".tmp")]
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            self._entries[path.name] = path.stat().st_size
+            self.size += self._entries[path.name]
+
+    @staticmethod
+    def _name(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        name = self._name(key)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        path = self.directory / name
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.size -= self._entries.pop(name, 0)
+            return None
+        return data
+
+    def put(self, key: str, data: bytes):
+        name = self._name(key)
+        path = self.directory / name
+        tmp = path.with_name(f"{name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self.size += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                victim, victim_size = self._entries.popitem(last=False)
+                self.size -= victim_size
+                try:
+                    (self.directory / victim).unlink()
+                except FileNotFoundError:
+                    pass
+
+
+# ============ RENDERING ============
+
+def render(source: bytes, size: Tuple[int, int], fmt: str) -> bytes:
+    try:
+        image = Image.open(io.BytesIO(source))
+        # JPEG sources can decode straight at a reduced scale
+        image.draft("RGB", (size[0] * 2, size[1] * 2))
+        image = ImageOps.exif_transpose(image)
+        image = ImageOps.fit(image, size, method=Image.Resampling.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageFetchError(f"Could not decode image: {e}") from e
+    if fmt == "jpeg" or image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    out = io.BytesIO()
+    image.save(out, format=fmt.upper(), quality=QUALITY[fmt], optimize=fmt == "jpeg")
+    return out.getvalue()
+
+
+class ImageProxy:
+    def __init__(self, cache: DiskLRUCache, fetcher: Callable[[str], bytes] = None):
+        self.cache = cache
+        self.fetcher = fetcher or HttpFetcher()
+        self._inflight: Dict[str, threading.Lock] = {}
+        self._inflight_lock = threading.Lock()
+
+    @staticmethod
+    def rendition_key(url: str, size: str, fmt: str) -> str:
+        return f"{size}:{fmt}:{url}"
+
+    def _single_flight(self, key: str) -> threading.Lock:
+        with self._inflight_lock:
+            return self._inflight.setdefault(key, threading.Lock())
+
+    def source(self, url: str) -> bytes:
+        key = f"source:{url}"
+        data = self.cache.get(key)
+        record_cache("image_source", data is not None)
+        if data is None:
+            with span("image", "fetch"):
+                data = self.fetcher(url)
+            self.cache.put(key, data)
+        return data
+
+    def rendition(self, url: str, size: str, fmt: str) -> bytes:
+        """Rendered image bytes; concurrent requests for one rendition render it once"""
+        key = self.rendition_key(url, size, fmt)
+        data = self.cache.get(key)
+        if data is not None:
+            record_cache("image_rendition", True)
+            return data
+        lock = self._single_flight(key)
+        with lock:
+            data = self.cache.get(key)
+            record_cache("image_rendition", data is not None)
+            if data is None:
+                source = self.source(url)
+                with span("image", f"render:{size}"):
+                    data = render(source, SIZES[size], fmt)
+                self.cache.put(key, data)
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+        return data
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    return "webp" if accept and "image/webp" in accept else "jpeg"
+
+
+def proxy_from_env(root: Path) -> ImageProxy:
+    directory = Path(os.environ.get("IMAGE_CACHE_DIR", root / "image_cache"))
+    max_bytes = int(float(os.environ.get("IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024)
+    return ImageProxy(DiskLRUCache(directory, max_bytes))
@@ -0,0 +1,262 @@
+"""
+Per-request hot-path instrumentation.
+
+Every request gets a RequestTrace stored in a contextvar. Code on the hot
+path wraps work in `span(kind)` (db, llm, stripe, bcrypt, ...), which both
+records the span on the current trace and feeds a process-wide histogram.
+ServerTimingMiddleware turns the trace into a `Server-Timing` header and
+records per-route latency; `render_metrics()` exposes everything in the
+Prometheus text format for /api/metrics.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21, 34)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+# ============ METRICS REGISTRY ============
+
+def _label_str(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{k}="{v}"' for k, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0.0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {cumulative}")
+                cumulative += series[len(self.buckets)]
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {series[-1]:g}")
+                lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route",
+                            ("method", "route", "status"))
+DB_CALLS_PER_REQUEST = Histogram("db_calls_per_request", "Data layer round trips per request",
+                                 ("route",), COUNT_BUCKETS)
+SPAN_LATENCY = Histogram("span_duration_seconds", "Time spent in instrumented spans", ("span", "detail"))
+LLM_TOKENS = Histogram("llm_tokens", "Tokens per LLM call", ("endpoint", "direction"), TOKEN_BUCKETS)
+LLM_TOKENS_TOTAL = Counter("llm_tokens_total", "Tokens consumed by LLM calls", ("endpoint", "direction"))
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result", ("cache", "result"))
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Requests rejected by admission control",
+                             ("route_class", "reason"))
+LLM_SCHEMA_FAILURES = Counter("llm_schema_failures_total", "LLM outputs that failed schema validation",
+                              ("endpoint",))
+PROMPT_TRUNCATIONS = Counter("prompt_truncations_total", "Prompt inputs shortened to fit the input budget",
+                             ("endpoint", "field"))
+DB_READ_ROUTES = Counter("db_read_routes_total", "Reads by routed backend and why", ("target", "reason"))
+IDEMPOTENT_REQUESTS = Counter("idempotent_requests_total", "Requests carrying an Idempotency-Key, by outcome",
+                              ("outcome",))
+APPEND_DEAD_LETTERS = Counter("append_dead_letters_total", "Queued rows the database rejected, kept for replay",
+                              ("table",))
+
+REGISTRY = [REQUEST_LATENCY, DB_CALLS_PER_REQUEST, SPAN_LATENCY, LLM_TOKENS, LLM_TOKENS_TOTAL, CACHE_REQUESTS,
+            ADMISSION_REJECTED, LLM_SCHEMA_FAILURES, PROMPT_TRUNCATIONS, DB_READ_ROUTES, IDEMPOTENT_REQUESTS,
+            APPEND_DEAD_LETTERS]
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ============ REQUEST TRACES ============
+
+class RequestTrace:
+    def __init__(self):
+        self.start = time.perf_counter()
+        # span kind -> [total seconds, count]
+        self.spans: Dict[str, list] = {}
+        self.db_calls = 0
+
+    def add(self, kind: str, seconds: float):
+        entry = self.spans.get(kind)
+        if entry is None:
+            self.spans[kind] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self) -> str:
+        total = time.perf_counter() - self.start
+        parts = []
+        accounted = 0.0
+        for kind, (seconds, count) in self.spans.items():
+            accounted += seconds
+            parts.append(f'{kind};dur={seconds * 1000:.2f};desc="{count}x"')
+        parts.append(f"app;dur={max(0.0, total - accounted) * 1000:.2f}")
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(kind: str, detail: str = ""):
+    """Time a block of hot-path work (db, llm, stripe, bcrypt, ...)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_LATENCY.observe(elapsed, span=kind, detail=detail)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(kind, elapsed)
+
+
+class QueryLog:
+    """Data layer calls observed while a count_queries() block is active"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __len__(self):
+        return len(self.calls)
+
+    def __str__(self):
+        return ", ".join(f"{op}:{table}" for op, table in self.calls) or "no queries"
+
+
+_query_logs = []
+
+
+@contextmanager
+def count_queries():
+    """Collect every data layer round trip made inside the block, e.g. for query budgets in tests"""
+    log = QueryLog()
+    _query_logs.append(log)
+    try:
+        yield log
+    finally:
+        _query_logs.remove(log)
+
+
+@contextmanager
+def db_span(table: str, op: str):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.db_calls += 1
+    for log in _query_logs:
+        log.calls.append((op, table))
+    with span("db", f"{op}:{table}"):
+        yield
+
+
+def record_llm_usage(endpoint: str, response):
+    """Record token counts from a Gemini response's usage_metadata, if present"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for direction, attr in (("input", "prompt_token_count"), ("output", "candidates_token_count")):
+        tokens = getattr(usage, attr, None) or 0
+        LLM_TOKENS.observe(tokens, endpoint=endpoint, direction=direction)
+        LLM_TOKENS_TOTAL.inc(tokens, endpoint=endpoint, direction=direction)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# ============ MIDDLEWARE ============
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware: opens a RequestTrace, emits Server-Timing, records route metrics"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            endpoint = scope.get("endpoint")
+            route = getattr(endpoint, "__name__", "unmatched")
+            REQUEST_LATENCY.observe(time.perf_counter() - trace.start, method=scope["method"],
+                                    route=route, status=status_holder["status"])
+            DB_CALLS_PER_REQUEST.observe(trace.db_calls, route=route)
@@ -0,0 +1,46 @@
+"""
+Deferred module imports.
+
+`google.generativeai` and `stripe` together account for most of server.py's
+import time. A LazyModule stands in for the real module and only imports it
+on first attribute access, so workers boot without paying for SDKs that a
+given request mix may never touch.
+"""
+import importlib
+import threading
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _load(self):
+        module = object.__getattribute__(self, "_module")
+        if module is None:
+            with object.__getattribute__(self, "_lock"):
+                module = object.__getattribute__(self, "_module")
+                if module is None:
+                    module = importlib.import_module(object.__getattribute__(self, "_name"))
+                    object.__setattr__(self, "_module", module)
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return object.__getattribute__(self, "_module") is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        # e.g. `stripe.api_key = ...` must land on the real module
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyModule {object.__getattribute__(self, '_name')} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
@@ -0,0 +1,188 @@
+"""
+Campaign lifecycle: closing campaigns when their funding period ends.
+
+A campaign runs for `duration_days` from `created_at`; deadline() and
+days_remaining() compute that, and API responses carry both. Active
+campaigns' deadlines are kept in a min-heap by DeadlineScheduler, built from
+the campaigns scan that rebuilds the other in-memory indexes and kept
+current from campaign events. run_scheduler() sleeps until the earliest
+deadline or for the poll interval, whichever is sooner, and close_due() moves
+everything due to COMPLETED in bulk updates of at most CLOSE_BATCH_SIZE rows.
+New campaigns end days from now, so a deadline added while the loop sleeps
+is always picked up in time.
+
+Heap entries are never removed in place: a campaign whose deadline changed
+or that is no longer active is dropped from `_deadlines`, and its stale heap
+entries are skipped when they reach the top.
+
+Every worker runs a scheduler. The update only matches rows that are still
+active, so when several workers race for the same campaigns each one is
+closed, and its events emitted, once.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import events
+from datastore import StorageBackend
+from instrumentation import db_span
+
+ACTIVE = "active"
+COMPLETED = "completed"
+DEFAULT_DURATION_DAYS = 30
+CLOSE_BATCH_SIZE = int(os.environ.get("CAMPAIGN_CLOSE_BATCH_SIZE", "500"))
+POLL_INTERVAL_SECONDS = float(os.environ.get("CAMPAIGN_LIFECYCLE_POLL_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+def _parse(value) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def deadline(campaign: dict) -> Optional[datetime]:
+    created_at = _parse(campaign.get("created_at"))
+    if created_at is None:
+        return None
+    return created_at + timedelta(days=campaign.get("duration_days") or DEFAULT_DURATION_DAYS)
+
+
+def days_remaining(campaign: dict, now: Optional[datetime] = None) -> int:
+    """Calendar days (UTC) left until the deadline; 0 once it has passed"""
+    end = deadline(campaign)
+    if end is None:
+        return campaign.get("duration_days") or DEFAULT_DURATION_DAYS
+    now = now or datetime.now(timezone.utc)
+    return max((end.date() - now.date()).days, 0) if end > now else 0
+
+
+def with_deadline(campaign: dict, now: Optional[datetime] = None) -> dict:
+    """`campaign` plus its computed `deadline` and `days_remaining`"""
+    end = deadline(campaign)
+    campaign["deadline"] = end.isoformat() if end else None
+    campaign["days_remaining"] = days_remaining(campaign, now)
+    return campaign
+
+
+class DeadlineScheduler:
+    def __init__(self, refresh_seconds: float = 300.0,
+                 merge: Optional[Callable[[List[dict]], List[dict]]] = None):
+        self.refresh_seconds = refresh_seconds
+        # Applied to closed rows before their events go out, e.g. to add
+        # pledge totals not yet written (counters.CounterAggregator.merge_all)
+        self.merge = merge
+        self._heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.built_at: Optional[float] = None
+
+    # ---- maintenance ----
+
+    def rebuild(self, campaigns: Iterable[dict]):
+        deadlines = {}
+        for row in campaigns:
+            end = deadline(row) if row.get("status", ACTIVE) == ACTIVE else None
+            if end is not None:
+                deadlines[row["id"]] = end.timestamp()
+        heap = [(at, campaign_id) for campaign_id, at in deadlines.items()]
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap, self._deadlines = heap, deadlines
+            self.built_at = time.monotonic()
+
+    def stale(self) -> bool:
+        return self.built_at is None or time.monotonic() - self.built_at > self.refresh_seconds
+
+    def upsert_campaign(self, row: dict):
+        end = deadline(row) if row.get("status", ACTIVE) == ACTIVE else None
+        with self._lock:
+            if end is None:
+                self._deadlines.pop(row["id"], None)
+                return
+            at = end.timestamp()
+            if self._deadlines.get(row["id"]) == at:
+                return
+            self._deadlines[row["id"]] = at
+            heapq.heappush(self._heap, (at, row["id"]))
+
+    def remove_campaign(self, row: dict):
+        with self._lock:
+            self._deadlines.pop(row["id"], None)
+
+    def subscribe(self):
+        events.subscribe(events.CAMPAIGN_CREATED, self.upsert_campaign)
+        events.subscribe(events.CAMPAIGN_UPDATED, self.upsert_campaign)
+        events.subscribe(events.CAMPAIGN_DELETED, self.remove_campaign)
+
+    # ---- scheduling ----
+
+    def _prune_locked(self):
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_deadline(self) -> Optional[float]:
+        with self._lock:
+            self._prune_locked()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[str]:
+        """Ids of active campaigns whose deadline is at or before `now`, earliest first"""
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            self._prune_locked()
+            while self._heap and self._heap[0][0] <= now and (limit is None or len(due) < limit):
+                _, campaign_id = heapq.heappop(self._heap)
+                del self._deadlines[campaign_id]
+                due.append(campaign_id)
+                self._prune_locked()
+        return due
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def close_due(self, db: StorageBackend, now: Optional[float] = None,
+                  batch_size: int = CLOSE_BATCH_SIZE) -> int:
+        """End every campaign past its deadline; returns how many this call closed"""
+        closed = 0
+        while True:
+            due = self.pop_due(now, batch_size)
+            if not due:
+                return closed
+            update = {"status": COMPLETED, "updated_at": datetime.now(timezone.utc).isoformat()}
+            with db_span("campaigns", "close"):
+                rows = db.update("campaigns", {"id": {"$in": due}, "status": ACTIVE}, update)
+            if self.merge is not None:
+                rows = self.merge(rows)
+            for row in rows:
+                events.emit(events.CAMPAIGN_UPDATED, row)
+                events.emit(events.CAMPAIGN_ENDED, row)
+            closed += len(rows)
+            if len(due) < batch_size:
+                return closed
+
+
+async def run_scheduler(scheduler: DeadlineScheduler, get_db: Callable[[], StorageBackend],
+                        poll_interval: float = POLL_INTERVAL_SECONDS):
+    """Close campaigns as their deadlines pass, forever. Campaigns already
+    past their deadline are the caller's to close first (lifespan does)."""
+    while True:
+        upcoming = scheduler.next_deadline()
+        delay = poll_interval if upcoming is None else min(max(upcoming - time.time(), 0.0), poll_interval)
+        await asyncio.sleep(delay)
+        try:
+            closed = await asyncio.to_thread(scheduler.close_due, get_db())
+            if closed:
+                logger.info(f"Lifecycle scheduler ended {closed} campaigns")
+        except Exception as e:
+            # Campaigns popped for a failed update come back with the next rebuild
+            logger.error(f"Closing ended campaigns failed: {e}")
@@ -0,0 +1,83 @@
+"""
+Per-user, per-endpoint LLM usage ledger.
+
+generate_ai_content() records every Gemini call here: input and output
+tokens (from the response's usage metadata, or estimated when it has none)
+and latency. Calls are aggregated into one row per (user, endpoint), so the
+ledger's size depends on how many users call the AI endpoints, not on how
+often they do. Anonymous calls (ai_chat allows them) are keyed on
+ANONYMOUS. Past `max_keys` rows, the least recently active is dropped.
+
+The ledger is per process and starts empty on restart; admins read it from
+/api/admin/llm-usage to find the expensive users and endpoints.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional
+
+ANONYMOUS = "anonymous"
+GROUPINGS = ("user", "endpoint", "user_endpoint")
+
+
+class UsageLedger:
+    def __init__(self, max_keys: int = 50_000):
+        self.max_keys = max_keys
+        self._rows: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.since = datetime.now(timezone.utc)
+
+    def record(self, user_id: Optional[str], endpoint: str, input_tokens: int, output_tokens: int,
+               latency_seconds: float):
+        key = (user_id or ANONYMOUS, endpoint)
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = {"calls": 0, "input_tokens": 0, "output_tokens": 0,
+                                         "latency_seconds": 0.0, "max_latency_seconds": 0.0}
+                if len(self._rows) > self.max_keys:
+                    self._rows.popitem(last=False)
+            else:
+                self._rows.move_to_end(key)
+            row["calls"] += 1
+            row["input_tokens"] += input_tokens
+            row["output_tokens"] += output_tokens
+            row["latency_seconds"] += latency_seconds
+            row["max_latency_seconds"] = max(row["max_latency_seconds"], latency_seconds)
+            row["last_call_at"] = time.time()
+
+    def summary(self, group_by: str = "user", limit: int = 50) -> List[dict]:
+        """Aggregated rows, most tokens first"""
+        if group_by not in GROUPINGS:
+            raise ValueError(f"group_by must be one of {GROUPINGS}")
+        groups = {}
+        with self._lock:
+            for (user_id, endpoint), row in self._rows.items():
+                key = {"user": (user_id,), "endpoint": (endpoint,), "user_endpoint": (user_id, endpoint)}[group_by]
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = {"calls": 0, "input_tokens": 0, "output_tokens": 0,
+                                           "latency_seconds": 0.0, "max_latency_seconds": 0.0}
+                    if group_by != "endpoint":
+                        group["user_id"] = user_id
+                    if group_by != "user":
+                        group["endpoint"] = endpoint
+                for field in ("calls", "input_tokens", "output_tokens", "latency_seconds"):
+                    group[field] += row[field]
+                group["max_latency_seconds"] = max(group["max_latency_seconds"], row["max_latency_seconds"])
+
+        rows = sorted(groups.values(), key=lambda g: g["input_tokens"] + g["output_tokens"], reverse=True)
+        for group in rows[:limit]:
+            group["avg_latency_seconds"] = round(group["latency_seconds"] / group["calls"], 4)
+            group["latency_seconds"] = round(group["latency_seconds"], 4)
+            group["max_latency_seconds"] = round(group["max_latency_seconds"], 4)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._rows.clear()
+            self.since = datetime.now(timezone.utc)
+
+
+LEDGER = UsageLedger()
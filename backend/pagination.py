@@ -0,0 +1,37 @@
+"""
+Keyset pagination cursors.
+
+A page ends at the sort key of its last row; the next page is the rows
+strictly after that key (`{"column": {"$gt": key}}`), which an index answers
+without counting or skipping the rows before it, unlike OFFSET. The sort
+column must be unique, otherwise rows sharing the boundary value are lost.
+
+Cursors are the key values as base64url JSON: opaque to clients, and free
+to grow more columns later.
+"""
+import base64
+import json
+from typing import List, Optional, Sequence
+
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Key values of a cursor; raises ValueError if it was not made by encode_cursor"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return values
+
+
+def next_cursor(rows: List[dict], limit: int, columns: Sequence[str]) -> Optional[str]:
+    """Cursor after the page, given rows fetched with limit + 1; None on the last page"""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(*(last[column] for column in columns))
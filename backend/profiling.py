@@ -0,0 +1,281 @@
+"""
+On-demand CPU and memory profiling of a live worker, for admins.
+
+CpuProfiler is a sampling profiler. While a session runs, a background thread
+reads every thread's stack (sys._current_frames) every `interval` seconds and
+counts identical stacks. Idle threads (waiting in selectors, locks or queues)
+are skipped. A session is armed either for a number of seconds or for the
+next N requests whose path starts with a route prefix; in the second mode
+samples are only kept while a matching request is in flight. The result is
+flame-graph data: collapsed stacks ("outer;inner;leaf count" lines, as read
+by flamegraph.pl, speedscope and inferno) or the same as JSON.
+
+MemoryProfiler wraps tracemalloc. Once started, snapshot() reports
+allocated memory by owner and, from the second snapshot on, what grew since
+the previous one. An allocation's owner is the nearest frame in its
+traceback that belongs to this app (a module in backend/, e.g. similarity or
+images) or to a library we track (pydantic, the supabase client stack, ...),
+so growth in caches, models and the client can be told apart even though the
+bytes are allocated deep inside the stdlib.
+
+Both cost nothing when off: no thread runs, tracemalloc is stopped, and
+ProfilingMiddleware only checks one attribute per request. Everything here
+is per worker; responses carry the pid that answered.
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MAX_SECONDS = 300.0
+MAX_REQUESTS = 1000
+MAX_DEPTH = 64
+MIN_INTERVAL = 0.001
+
+# Leaf frames in these files mean the thread is waiting, not working
+IDLE_FILES = ("selectors.py", "threading.py", "queue.py")
+
+APP_DIR = str(Path(__file__).resolve().parent)
+# Top-level package -> owner label for memory attribution
+LIBRARY_OWNERS = {
+    "pydantic": "pydantic", "pydantic_core": "pydantic",
+    "supabase": "supabase", "postgrest": "supabase", "gotrue": "supabase", "supafunc": "supabase",
+    "realtime": "supabase", "storage3": "supabase", "httpx": "supabase", "httpcore": "supabase", "h2": "supabase",
+    "google": "gemini", "grpc": "gemini",
+    "stripe": "stripe",
+    "PIL": "pillow",
+    "numpy": "numpy",
+    "starlette": "starlette", "fastapi": "fastapi", "uvicorn": "uvicorn",
+}
+GROUPINGS = ("owner", "file", "line")
+
+
+class ProfilerBusy(Exception):
+    """A profiling session is already running in this worker"""
+
+
+# ============ CPU ============
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _collapse(frame) -> Optional[str]:
+    """Root-first `file:function` stack of `frame`, or None if the thread is idle"""
+    if os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+        return None
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class CpuProfiler:
+    def __init__(self):
+        # Checked by ProfilingMiddleware on every request; None unless armed for requests
+        self.route: Optional[str] = None
+        self.session: Optional[dict] = None
+        self._stacks: Counter = Counter()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, seconds: Optional[float] = None, requests: Optional[int] = None, route: str = "/api/",
+              interval: float = 0.005) -> dict:
+        """Arm a session for `seconds`, or for the next `requests` requests under `route`"""
+        if (seconds is None) == (requests is None):
+            raise ValueError("Pass either seconds or requests")
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                raise ProfilerBusy("A CPU profile is already running")
+            self._stacks = Counter()
+            self._active = 0
+            self._stop.clear()
+            self.session = {
+                "mode": "seconds" if seconds is not None else "requests",
+                "seconds": min(seconds, MAX_SECONDS) if seconds is not None else None,
+                "requests": min(requests, MAX_REQUESTS) if requests is not None else None,
+                "route": route if requests is not None else None,
+                "requests_profiled": 0,
+                "interval": max(interval, MIN_INTERVAL),
+                "started_at": time.time(),
+                "finished_at": None,
+                "samples": 0,
+                "pid": os.getpid(),
+            }
+            self._thread = threading.Thread(target=self._sample, name="cpu-profiler", daemon=True)
+            self._thread.start()
+            if requests is not None:
+                self.route = route
+            return dict(self.session)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    # ---- request hooks (ProfilingMiddleware) ----
+
+    def enter(self, path: str) -> bool:
+        """Count a request in if the session still wants it"""
+        with self._lock:
+            route, session = self.route, self.session
+            if route is None or not path.startswith(route):
+                return False
+            if session["requests_profiled"] + self._active >= session["requests"]:
+                return False
+            self._active += 1
+            return True
+
+    def exit(self):
+        with self._lock:
+            if not self._active:
+                return  # the session was restarted meanwhile
+            self._active -= 1
+            self.session["requests_profiled"] += 1
+            if self.session["requests_profiled"] >= self.session["requests"]:
+                self.route = None
+                self._stop.set()
+
+    # ---- sampling ----
+
+    def _sample(self):
+        session = self.session
+        deadline = session["started_at"] + (session["seconds"] or MAX_SECONDS)
+        own = threading.get_ident()
+        while not self._stop.wait(session["interval"]) and time.time() < deadline:
+            if session["mode"] == "requests" and not self._active:
+                continue
+            stacks = [_collapse(frame) for ident, frame in sys._current_frames().items() if ident != own]
+            with self._lock:
+                for stack in stacks:
+                    if stack is not None:
+                        self._stacks[stack] += 1
+                session["samples"] += 1
+        with self._lock:
+            self.route = None
+            session["finished_at"] = time.time()
+
+    def report(self, limit: Optional[int] = None) -> dict:
+        with self._lock:
+            if self.session is None:
+                return {"session": None, "stacks": []}
+            stacks = self._stacks.most_common(limit)
+            return {
+                "session": {**self.session, "running": self.session["finished_at"] is None},
+                "stacks": [{"stack": stack, "count": count} for stack, count in stacks],
+            }
+
+    def collapsed(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+
+class ProfilingMiddleware:
+    """Pure ASGI: marks requests a CPU profile was armed for; a no-op otherwise"""
+
+    def __init__(self, app, profiler: CpuProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if self.profiler.route is None or scope["type"] != "http" or not self.profiler.enter(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.exit()
+
+
+# ============ MEMORY ============
+
+def _owner(traceback: tracemalloc.Traceback) -> str:
+    """Nearest app module or tracked library in an allocation's traceback"""
+    fallback = None
+    for frame in reversed(traceback):  # most recent call first
+        filename = frame.filename
+        if filename.startswith(APP_DIR):
+            return "app:" + Path(filename).stem
+        parts = Path(filename).parts
+        if "site-packages" in parts:
+            package = parts[parts.index("site-packages") + 1].split(".")[0]
+            if package in LIBRARY_OWNERS:
+                return LIBRARY_OWNERS[package]
+            fallback = fallback or package
+    return fallback or "stdlib"
+
+
+class MemoryProfiler:
+    def __init__(self):
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 16):
+        """Trace allocations from now on (earlier ones are not attributed)"""
+        if tracemalloc.is_tracing():
+            raise ProfilerBusy("Memory tracing is already on")
+        tracemalloc.start(frames)
+        self._previous = None
+
+    def stop(self):
+        tracemalloc.stop()
+        self._previous = None
+
+    @staticmethod
+    def _key(stat, group_by: str) -> str:
+        frame = stat.traceback[-1]  # where the allocation happened
+        if group_by == "file":
+            return frame.filename
+        if group_by == "line":
+            return f"{frame.filename}:{frame.lineno}"
+        return _owner(stat.traceback)
+
+    def snapshot(self, group_by: str = "owner", limit: int = 25) -> dict:
+        """Traced memory by `group_by`, plus growth since the previous snapshot"""
+        if group_by not in GROUPINGS:
+            raise ValueError(f"group_by must be one of {GROUPINGS}")
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Memory tracing is off; start it first")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        sizes: Dict[str, List[int]] = {}
+        for stat in snapshot.statistics("traceback"):
+            entry = sizes.setdefault(self._key(stat, group_by), [0, 0])
+            entry[0] += stat.size
+            entry[1] += stat.count
+        current, peak = tracemalloc.get_traced_memory()
+        result = {
+            "pid": os.getpid(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [{"key": key, "bytes": size, "blocks": count}
+                    for key, (size, count) in sorted(sizes.items(), key=lambda kv: -kv[1][0])[:limit]],
+            "growth": None,
+        }
+        with self._lock:
+            previous, self._previous = self._previous, snapshot
+        if previous is not None:
+            growth: Dict[str, List[int]] = {}
+            for diff in snapshot.compare_to(previous, "traceback"):
+                entry = growth.setdefault(self._key(diff, group_by), [0, 0])
+                entry[0] += diff.size_diff
+                entry[1] += diff.count_diff
+            result["growth"] = [{"key": key, "bytes": size, "blocks": count}
+                                for key, (size, count) in sorted(growth.items(), key=lambda kv: -kv[1][0])[:limit]
+                                if size]
+        return result
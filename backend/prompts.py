@@ -0,0 +1,117 @@
+"""
+Prompt input budgets.
+
+Every AI prompt embeds user-supplied text (titles, descriptions, chat
+history) next to a fixed instruction template. The template's cost is
+constant, so INPUT_BUDGETS caps only the variable part, per endpoint, in
+tokens. fit() shares an endpoint's budget between its fields by water-filling:
+fields that fit their fair share are kept verbatim and the leftover goes to
+the longer ones, which are shortened by truncate().
+
+truncate() keeps the opening of a text (where campaigns state what they
+are) plus a shorter closing part, cut on sentence boundaries, with a marker
+in between.
+
+Tokens are estimated at CHARS_PER_TOKEN characters each. That is close
+enough for budgeting English text; exact counts come back in Gemini's
+usage metadata and are what the usage ledger records.
+"""
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+from instrumentation import PROMPT_TRUNCATIONS
+
+CHARS_PER_TOKEN = 4
+ELISION = " […] "
+
+# Tokens of variable (user-supplied or looked-up) input per endpoint
+INPUT_BUDGETS = {
+    "create_campaign": 600,
+    "ai_chat": 1500,
+    "optimize_title": 500,
+    "enhance_description": 1200,
+    "success_prediction": 800,
+    "marketing_strategy": 800,
+    "competitor_analysis": 1000,
+    "strategic_recommendations": 1000,
+}
+DEFAULT_BUDGET = 800
+
+# ai_chat: the current message, then earlier turns newest first
+CHAT_MESSAGE_TOKENS = 400
+CHAT_TURN_TOKENS = 200
+
+_WHITESPACE = re.compile(r"[ \t]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+_SENTENCE_END = re.compile(r"[.!?](?:\s|$)|\n")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def _normalize(text: str) -> str:
+    return _BLANK_LINES.sub("\n\n", _WHITESPACE.sub(" ", text)).strip()
+
+
+def truncate(text: Optional[str], max_tokens: int) -> str:
+    """`text` cut to about `max_tokens`: roughly the first three quarters of
+    the budget from the start, the rest from the end"""
+    text = _normalize(text or "")
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 0:
+        return ""
+    head_chars = max_chars * 3 // 4
+    tail_chars = max(max_chars - head_chars - len(ELISION), 0)
+
+    head = text[:head_chars]
+    ends = [m.end() for m in _SENTENCE_END.finditer(head)]
+    # Prefer a sentence boundary unless that would throw away most of the head
+    if ends and ends[-1] >= head_chars // 2:
+        head = head[:ends[-1]]
+    tail = text[len(text) - tail_chars:] if tail_chars else ""
+    starts = [m.end() for m in _SENTENCE_END.finditer(tail)]
+    if starts and starts[0] <= len(tail) // 2:
+        tail = tail[starts[0]:]
+    return head.rstrip() + ELISION.rstrip() + (" " + tail.lstrip() if tail.strip() else "")
+
+
+def fit(endpoint: str, **fields: Optional[str]) -> Dict[str, str]:
+    """Fields shortened so together they fit the endpoint's input budget"""
+    budget = INPUT_BUDGETS.get(endpoint, DEFAULT_BUDGET)
+    texts = {name: _normalize(str(value or "")) for name, value in fields.items()}
+    fitted = {}
+    remaining = budget
+    by_size = sorted(texts, key=lambda name: estimate_tokens(texts[name]))
+    for position, name in enumerate(by_size):
+        share = remaining // (len(by_size) - position)
+        tokens = estimate_tokens(texts[name])
+        if tokens <= share:
+            fitted[name] = texts[name]
+            remaining -= tokens
+        else:
+            fitted[name] = truncate(texts[name], share)
+            remaining -= share
+            PROMPT_TRUNCATIONS.inc(endpoint=endpoint, field=name)
+    return fitted
+
+
+def fit_turns(turns: List[Tuple[str, Optional[str]]], budget: int,
+              per_turn: int = CHAT_TURN_TOKENS) -> List[Tuple[str, Optional[str]]]:
+    """Most recent (message, response) turns that fit `budget`, oldest first;
+    each side of a turn is truncated to `per_turn` tokens"""
+    kept = []
+    for message, response in reversed(turns):
+        message = truncate(message, per_turn)
+        response = truncate(response, per_turn) if response else response
+        cost = estimate_tokens(message) + estimate_tokens(response)
+        if cost > budget:
+            break
+        kept.append((message, response))
+        budget -= cost
+    if len(kept) < len(turns):
+        PROMPT_TRUNCATIONS.inc(endpoint="ai_chat", field="history")
+    return kept[::-1]
@@ -0,0 +1,321 @@
+"""
+Admission control: token-bucket rate limits and LLM load shedding.
+
+Requests are classified by path prefix, or exact method and path, into
+route classes. Each class can carry a per-IP budget and a per-user budget.
+Per-user budgets are keyed on the user a session token belongs to, resolved
+through `resolve_user` and cached for USER_CACHE_SECONDS. A new login or a
+made-up Bearer value therefore doesn't get a fresh bucket: requests without
+a valid session only have the per-IP budget. Over budget -> 429 with
+Retry-After.
+
+Classes marked `pooled` also need a slot in a bounded concurrency pool. When
+every slot is taken the request is shed right away with 503 + Retry-After
+instead of queueing, so admitted requests keep a stable latency. Retry-After
+is the pool's recent average hold time.
+
+Buckets live in a BucketStore. MemoryBucketStore is per worker;
+RedisBucketStore (optional `redis` package) shares budgets across workers.
+Select with RATE_LIMIT_BACKEND=memory|redis.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from starlette.requests import cookie_parser
+
+from instrumentation import ADMISSION_REJECTED
+
+
+# How long a session token's user is remembered for per-user budgets
+USER_CACHE_SECONDS = 60.0
+
+
+class Limit:
+    """Refill `per_minute` tokens a minute, holding at most `burst`"""
+
+    def __init__(self, per_minute: float, burst: float):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+
+
+class RouteClass:
+    def __init__(self, name: str, prefixes: Tuple[str, ...], per_user: Optional[Limit] = None,
+                 per_ip: Optional[Limit] = None, pooled: bool = False,
+                 endpoints: Tuple[Tuple[str, str], ...] = ()):
+        self.name = name
+        self.prefixes = prefixes
+        # (method, path) pairs matched exactly, for routes whose prefix is shared with cheap ones
+        self.endpoints = endpoints
+        self.per_user = per_user
+        self.per_ip = per_ip
+        self.pooled = pooled
+
+
+ROUTE_CLASSES = (
+    # Gemini calls: quota and worker time
+    RouteClass("llm", ("/api/ai/", "/api/analytics/competitor-analysis/", "/api/analytics/strategic-recommendations/"),
+               per_user=Limit(20, 5), per_ip=Limit(60, 15), pooled=True,
+               endpoints=(("POST", "/api/campaigns"),)),
+    # bcrypt: ~250ms of CPU per attempt, and a brute-force target
+    RouteClass("auth", ("/api/auth/login", "/api/auth/register", "/api/auth/google/callback"),
+               per_ip=Limit(10, 10)),
+)
+
+
+# ============ BUCKET STORES ============
+
+class BucketStore:
+    def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        """Spend `cost` tokens; returns 0 if allowed, else seconds until it would be"""
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+
+class MemoryBucketStore(BucketStore):
+    """Per-process buckets; the least recently used are dropped past `max_keys`
+    (an idle bucket is full anyway, so forgetting it changes nothing)"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, limit, cost=1.0):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [limit.burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / limit.rate
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+_REDIS_TAKE = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rate, burst, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBucketStore(BucketStore):
+    """Buckets shared by every worker; one atomic Lua call per check"""
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(_REDIS_TAKE)
+
+    @classmethod
+    def from_url(cls, url: str):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def take(self, key, limit, cost=1.0):
+        return float(self._take(keys=[self.prefix + key], args=[limit.rate, limit.burst, time.time(), cost]))
+
+    def reset(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+# ============ CONCURRENCY POOL ============
+
+class ConcurrencyPool:
+    """Non-blocking slots; callers that can't get one are shed, not queued"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._avg_hold = 1.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, held_seconds: float):
+        with self._lock:
+            self.in_flight -= 1
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held_seconds
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._avg_hold))
+
+
+# ============ MIDDLEWARE ============
+
+class AdmissionController:
+    def __init__(self, store: BucketStore, route_classes=ROUTE_CLASSES, llm_concurrency: int = 4,
+                 trust_forwarded: bool = False, enabled: bool = True,
+                 resolve_user: Optional[Callable[[str], Optional[str]]] = None, max_users: int = 100_000):
+        self.store = store
+        self.route_classes = route_classes
+        self.pool = ConcurrencyPool(llm_concurrency)
+        self.trust_forwarded = trust_forwarded
+        self.enabled = enabled
+        # Session token -> user id of a live session, else None (blocking; run in a thread)
+        self.resolve_user = resolve_user
+        self.max_users = max_users
+        # Hashed token -> (user id, cached until)
+        self._users: "OrderedDict[str, tuple]" = OrderedDict()
+        self._users_lock = threading.Lock()
+
+    def classify(self, path: str, method: str = "GET") -> Optional[RouteClass]:
+        for route_class in self.route_classes:
+            if path.startswith(route_class.prefixes) or (method, path) in route_class.endpoints:
+                return route_class
+        return None
+
+    def client_ip(self, scope, headers: dict) -> str:
+        if self.trust_forwarded and b"x-forwarded-for" in headers:
+            return headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    def session_token(headers: dict) -> Optional[str]:
+        """Session token from the cookie or Bearer header, unvalidated"""
+        token = cookie_parser(headers.get(b"cookie", b"").decode("latin-1")).get("session_token")
+        if not token:
+            auth = headers.get(b"authorization", b"").decode("latin-1")
+            if auth.startswith("Bearer "):
+                token = auth.split(" ")[1]
+        return token or None
+
+    @classmethod
+    def user_key(cls, headers: dict) -> Optional[str]:
+        """Session token hashed, so raw tokens never reach a store"""
+        token = cls.session_token(headers)
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()[:32] if token else None
+
+    async def user_id(self, headers: dict) -> Optional[str]:
+        """User behind the request's session, or None if it has no valid one"""
+        key = self.user_key(headers)
+        if key is None or self.resolve_user is None:
+            return None
+        now = time.monotonic()
+        with self._users_lock:
+            cached = self._users.get(key)
+            if cached is not None and cached[1] > now:
+                return cached[0]
+        user_id = await asyncio.to_thread(self.resolve_user, self.session_token(headers))
+        # Misses aren't cached: made-up tokens would only push out real sessions
+        if user_id is not None:
+            with self._users_lock:
+                self._users[key] = (user_id, now + USER_CACHE_SECONDS)
+                self._users.move_to_end(key)
+                if len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+        return user_id
+
+    async def check(self, scope, route_class: RouteClass) -> float:
+        """Seconds to wait before retrying, or 0 if the request is within budget"""
+        headers = dict(scope.get("headers") or [])
+        wait = 0.0
+        if route_class.per_ip is not None:
+            wait = self.store.take(f"{route_class.name}:ip:{self.client_ip(scope, headers)}", route_class.per_ip)
+        if route_class.per_user is not None and not wait:
+            user = await self.user_id(headers)
+            if user is not None:
+                wait = self.store.take(f"{route_class.name}:user:{user}", route_class.per_user)
+        return wait
+
+    def reset(self):
+        self.store.reset()
+        with self._users_lock:
+            self._users.clear()
+
+
+class AdmissionMiddleware:
+    """Pure ASGI: 429 over budget, 503 when the LLM pool is saturated"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.controller.enabled or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        route_class = self.controller.classify(scope["path"], scope["method"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        wait = await self.controller.check(scope, route_class)
+        if wait:
+            ADMISSION_REJECTED.inc(route_class=route_class.name, reason="rate_limited")
+            await self._reject(send, 429, "Rate limit exceeded", math.ceil(wait))
+            return
+
+        if not route_class.pooled:
+            await self.app(scope, receive, send)
+            return
+
+        pool = self.controller.pool
+        if not pool.try_acquire():
+            ADMISSION_REJECTED.inc(route_class=route_class.name, reason="shed")
+            await self._reject(send, 503, "Server busy, retry shortly", pool.retry_after())
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release(time.perf_counter() - started)
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str, retry_after: int):
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(retry_after).encode("latin-1")),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def controller_from_env() -> AdmissionController:
+    kind = os.environ.get("RATE_LIMIT_BACKEND", "memory").lower()
+    if kind == "redis":
+        store = RedisBucketStore.from_url(os.environ["RATE_LIMIT_REDIS_URL"])
+    elif kind == "memory":
+        store = MemoryBucketStore()
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND '{kind}' (expected 'memory' or 'redis')")
+    return AdmissionController(
+        store,
+        llm_concurrency=int(os.environ.get("LLM_CONCURRENCY", "4")),
+        trust_forwarded=os.environ.get("RATE_LIMIT_TRUST_FORWARDED", "0") == "1",
+        enabled=os.environ.get("RATE_LIMIT_ENABLED", "1") == "1",
+    )
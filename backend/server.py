@@ -1,88 +1,229 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Header, Request, Response
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from supabase import create_client, Client
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 import uuid
+import asyncio
+import functools
+import time
+import zlib
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone, timedelta
-import google.generativeai as genai
-import stripe
-import bcrypt
+from lazy import lazy_import
+from datastore import BROWSING, FRESH, REPORTING, StorageBackend, backend_from_env, bind_route_key, scan
+from compression import CompressionMiddleware, etag_matches
+from instrumentation import ServerTimingMiddleware, db_span, span, record_cache, record_llm_usage, render_metrics
+import events
+from category_stats import CategoryStatsEngine, describe as describe_category
+from similarity import SimilarityIndex
+import feeds
+import sessions
+import exports
+import prompts
+import images
+import lifecycle
+import counters
+import appends
+import llm_usage
+import profiling
+from pagination import decode_cursor, next_cursor
+from structured import generate_structured, StructuredOutputError
+from rate_limit import AdmissionMiddleware, controller_from_env
+from idempotency import IdempotencyMiddleware, store_from_env as idempotency_store_from_env
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Supabase connection
-SUPABASE_URL = os.environ['SUPABASE_URL']
-SUPABASE_KEY = os.environ['SUPABASE_KEY']
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-# Helper functions for Supabase
-def handle_supabase_response(response):
-    """Extract data from Supabase response"""
-    if hasattr(response, 'data'):
-        return response.data
-    return response
-
-async def sb_find_one(table: str, filters: dict):
+# Heavy SDKs are imported on first use, not at worker boot
+genai = lazy_import('google.generativeai')
+stripe = lazy_import('stripe')
+bcrypt = lazy_import('bcrypt')
+
+# Storage backend (Supabase by default, see datastore.py). Created in
+# lifespan() unless something, e.g. a test or benchmark, installed one first.
+db: Optional[StorageBackend] = None
+
+# Campaign image thumbnails (see images.py); created in lifespan() like `db`
+image_proxy: Optional[images.ImageProxy] = None
+
+# Batched inserts for append-only tables (see appends.py); created in lifespan() like `db`
+append_queues: Optional[Dict[str, appends.AppendQueue]] = None
+
+# Confirmed pledges not yet added to campaign totals (see counters.py)
+counter_aggregator = counters.CounterAggregator()
+
+# In-memory views over the campaigns table, kept current from campaign/pledge
+# events and rebuilt from one scan at startup and, in the background, every
+# refresh interval
+CAMPAIGN_INDEX_REFRESH_SECONDS = float(os.environ.get('CAMPAIGN_INDEX_REFRESH_SECONDS', '300'))
+category_stats = CategoryStatsEngine(refresh_seconds=CAMPAIGN_INDEX_REFRESH_SECONDS)
+similarity_index = SimilarityIndex(refresh_seconds=CAMPAIGN_INDEX_REFRESH_SECONDS)
+feed_index = feeds.FeedIndex(refresh_seconds=CAMPAIGN_INDEX_REFRESH_SECONDS)
+lifecycle_scheduler = lifecycle.DeadlineScheduler(refresh_seconds=CAMPAIGN_INDEX_REFRESH_SECONDS,
+                                                  merge=counter_aggregator.merge_all)
+CAMPAIGN_INDEXES = (category_stats, similarity_index, feed_index, lifecycle_scheduler)
+
+# Admin-armed CPU sampling and allocation tracing (see profiling.py); idle by default
+cpu_profiler = profiling.CpuProfiler()
+memory_profiler = profiling.MemoryProfiler()
+for _index in CAMPAIGN_INDEXES:
+    _index.subscribe()
+
+async def sb_find_one(table: str, filters: dict, max_staleness: float = FRESH):
     """Find one record from Supabase table"""
-    query = supabase.table(table).select("*")
-    for key, value in filters.items():
-        query = query.eq(key, value)
-    result = query.limit(1).execute()
-    data = handle_supabase_response(result)
+    with db_span(table, "find_one"):
+        data = db.find(table, filters, limit=1, max_staleness=max_staleness)
     return data[0] if data else None
 
-async def sb_find(table: str, filters: dict = None, limit: int = 1000):
+async def sb_find(table: str, filters: dict = None, limit: int = 1000, order: Optional[str] = None,
+                  columns: Optional[List[str]] = None, max_staleness: float = FRESH):
     """Find multiple records from Supabase table"""
-    query = supabase.table(table).select("*")
-    if filters:
-        for key, value in filters.items():
-            if isinstance(value, dict):
-                # Handle special queries
-                if "$regex" in value:
-                    # Supabase uses ilike for pattern matching
-                    search_term = value["$regex"]
-                    query = query.ilike(key, f"%{search_term}%")
-            else:
-                query = query.eq(key, value)
-    result = query.limit(limit).execute()
-    return handle_supabase_response(result) or []
+    with db_span(table, "find"):
+        return db.find(table, filters, limit=limit, order=order, columns=columns, max_staleness=max_staleness)
+
+async def sb_count(table: str, filters: dict = None, max_staleness: float = FRESH) -> int:
+    """Count matching records without fetching them"""
+    with db_span(table, "count"):
+        return db.count(table, filters, max_staleness=max_staleness)
 
 async def sb_insert(table: str, data: dict):
     """Insert a record into Supabase table"""
     clean_data = {k: v for k, v in data.items() if k != '_id' and v is not None}
-    result = supabase.table(table).insert(clean_data).execute()
-    inserted = handle_supabase_response(result)
+    with db_span(table, "insert"):
+        inserted = db.insert(table, [clean_data])
     return inserted[0] if inserted else None
 
+async def sb_append(table: str, data: dict):
+    """Queue a row for an append-only table; it is inserted with the next batch"""
+    clean_data = {k: v for k, v in data.items() if k != '_id' and v is not None}
+    try:
+        await append_queues[table].put(clean_data, db)
+    except appends.Backpressure as e:
+        logger.warning(str(e))
+        raise HTTPException(503, "Server busy, retry shortly", headers={"Retry-After": "1"})
+    return clean_data
+
+# Tables whose rows carry an updated_at version marker (used for ETags)
+VERSIONED_TABLES = {"campaigns"}
+
 async def sb_update(table: str, filters: dict, update_data: dict):
     """Update records in Supabase table"""
     # Remove $set wrapper if present
     if "$set" in update_data:
         update_data = update_data["$set"]
+    if table in VERSIONED_TABLES:
+        update_data = {**update_data, "updated_at": datetime.now(timezone.utc).isoformat()}
     
-    query = supabase.table(table).update(update_data)
-    for key, value in filters.items():
-        query = query.eq(key, value)
-    result = query.execute()
-    return handle_supabase_response(result)
+    with db_span(table, "update"):
+        return db.update(table, filters, update_data)
 
 async def sb_delete(table: str, filters: dict):
     """Delete records from Supabase table"""
-    query = supabase.table(table).delete()
-    for key, value in filters.items():
-        query = query.eq(key, value)
-    result = query.execute()
-    return handle_supabase_response(result)
+    with db_span(table, "delete"):
+        return db.delete(table, filters)
+
+# ============ LIFECYCLE ============
+
+async def check_readiness() -> bool:
+    """Readiness probe: the storage backend answers a trivial query"""
+    if db is None:
+        return False
+    try:
+        with db_span("campaigns", "ping"):
+            db.ping()
+        return True
+    except Exception as e:
+        logger.error(f"Readiness check failed: {e}")
+        return False
+
+_index_refresh_lock = asyncio.Lock()
+
+async def refresh_campaign_indexes():
+    """Rebuild every in-memory campaign index from one campaigns scan (plus
+    recent pledges for trending). The scans page through whole tables and
+    the rebuild is CPU-bound, so both run off the event loop."""
+    since = (datetime.now(timezone.utc) - feeds.TRENDING_WINDOW).isoformat()
+    rows = await asyncio.to_thread(lambda: list(scan(db, "campaigns", max_staleness=REPORTING)))
+    rows = counter_aggregator.merge_all(rows)
+    pledges = await asyncio.to_thread(
+        lambda: list(scan(db, "pledges", {"created_at": {"$gte": since}}, max_staleness=REPORTING)))
+    await asyncio.to_thread(category_stats.rebuild, rows)
+    await asyncio.to_thread(similarity_index.rebuild, rows)
+    await asyncio.to_thread(feed_index.rebuild, rows, pledges)
+    await asyncio.to_thread(lifecycle_scheduler.rebuild, rows)
+
+async def run_index_refresher(interval: float = CAMPAIGN_INDEX_REFRESH_SECONDS):
+    """Rebuild the indexes in the background once they are older than
+    `interval`, so writes made by other workers are eventually picked up"""
+    while True:
+        await asyncio.sleep(interval)
+        if not any(index.stale() for index in CAMPAIGN_INDEXES):
+            continue
+        try:
+            async with _index_refresh_lock:
+                await refresh_campaign_indexes()
+        except Exception as e:
+            logger.error(f"Campaign index refresh failed: {e}")
+
+async def ensure_campaign_indexes():
+    """Build the indexes if startup couldn't (the backend was unreachable);
+    otherwise they are served as they are and refreshed in the background"""
+    built = all(index.built_at is not None for index in CAMPAIGN_INDEXES)
+    record_cache("campaign_indexes", built)
+    if not built:
+        async with _index_refresh_lock:
+            if any(index.built_at is None for index in CAMPAIGN_INDEXES):
+                await refresh_campaign_indexes()
+
+async def get_category_stats(category: str) -> Optional[dict]:
+    await ensure_campaign_indexes()
+    return category_stats.get(category)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global db, image_proxy, append_queues
+    started = time.perf_counter()
+    if db is None:
+        db = backend_from_env()
+    if image_proxy is None:
+        image_proxy = images.proxy_from_env(ROOT_DIR)
+    if append_queues is None:
+        append_queues = appends.queues_from_env(ROOT_DIR)
+    app.state.ready = await check_readiness()
+    if app.state.ready:
+        await refresh_campaign_indexes()
+        # Catch up on campaigns that ended while no worker was running
+        await asyncio.to_thread(lifecycle_scheduler.close_due, db)
+        await asyncio.to_thread(counter_aggregator.replay, db)
+        for queue in append_queues.values():
+            await asyncio.to_thread(queue.replay, db)
+    sweeper = asyncio.create_task(sessions.run_sweeper(lambda: db))
+    closer = asyncio.create_task(lifecycle.run_scheduler(lifecycle_scheduler, lambda: db))
+    flusher = asyncio.create_task(counters.run_flusher(counter_aggregator, lambda: db))
+    appender = asyncio.create_task(appends.run_flusher(append_queues, lambda: db))
+    refresher = asyncio.create_task(run_index_refresher())
+    logger.info(f"Startup finished in {(time.perf_counter() - started) * 1000:.1f}ms "
+                f"(backend={db.name}, ready={app.state.ready})")
+    yield
+    sweeper.cancel()
+    closer.cancel()
+    flusher.cancel()
+    appender.cancel()
+    refresher.cancel()
+    await asyncio.to_thread(appends.flush_all, append_queues, db)
+    try:
+        await asyncio.to_thread(counter_aggregator.flush, db)
+    except Exception as e:
+        logger.error(f"Final counter flush failed: {e}")
+    # Supabase client doesn't need explicit closing
 
 # Create the main app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
 # ============ MODELS ============
@@ -121,6 +262,10 @@ class Campaign(BaseModel):
     tags: List[str] = []
     reward_tiers: List[Dict[str, Any]] = []
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: Optional[datetime] = None
+    # Computed from created_at + duration_days on reads (lifecycle.py), never stored
+    deadline: Optional[datetime] = None
+    days_remaining: Optional[int] = None
 
 class AIAnalysis(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -147,6 +292,8 @@ class Pledge(BaseModel):
     amount: float
     session_id: Optional[str] = None
     payment_status: str = "pending"
+    # True until the pledge has been added to the campaign's totals (counters.py)
+    counter_pending: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class PaymentTransaction(BaseModel):
@@ -246,9 +393,106 @@ class MarketingStrategyRequest(BaseModel):
     category: str
     goal_amount: float
 
+class AdminUser(BaseModel):
+    id: str
+    email: str
+    name: str
+    picture: Optional[str] = None
+    is_admin: bool = False
+    created_at: datetime
+
+class AdminUserCounts(BaseModel):
+    total: int
+    admins: int
+    matching: int
+
+class AdminUsersPage(BaseModel):
+    users: List[AdminUser]
+    next_cursor: Optional[str] = None
+    counts: Optional[AdminUserCounts] = None
+
+# ============ AI OUTPUT MODELS ============
+# Response schemas for Gemini JSON mode (see structured.py). Field names are
+# the API's response keys; list lengths are capped to bound output tokens.
+
+Priority = Literal["High", "Medium", "Low"]
+
+class TitleSuggestions(BaseModel):
+    titles: List[str] = Field(min_length=5, max_length=5)
+
+class SuccessPredictionOutput(BaseModel):
+    success_percentage: int = Field(ge=0, le=100)
+    confidence_level: Priority
+    analysis: str
+    recommendations: List[str] = Field(min_length=3, max_length=5)
+
+class TargetAudience(BaseModel):
+    primary: str
+    secondary: str
+
+class MarketingChannel(BaseModel):
+    name: str
+    strategy: str
+    priority: Priority
+
+class TimelinePhase(BaseModel):
+    phase: str
+    duration: str
+    actions: List[str] = Field(max_length=4)
+
+class BudgetAllocation(BaseModel):
+    social_media: str
+    content_creation: str
+    influencer_partnerships: str
+    paid_advertising: str
+
+class MarketingStrategyOutput(BaseModel):
+    overview: str
+    target_audience: TargetAudience
+    channels: List[MarketingChannel] = Field(min_length=3, max_length=4)
+    timeline: List[TimelinePhase] = Field(min_length=3, max_length=3)
+    key_messages: List[str] = Field(max_length=3)
+    budget_allocation: BudgetAllocation
+
+class CompetitorFactor(BaseModel):
+    name: str
+    success_factors: str
+
+class CompetitorNarrative(BaseModel):
+    category_performance: str
+    key_trends: List[str] = Field(min_length=3, max_length=3)
+    competitors: List[CompetitorFactor] = Field(max_length=3)
+
+class SuccessOutlook(BaseModel):
+    percentage: int = Field(ge=0, le=100)
+    level: Priority
+    similar_campaigns: str
+
+class ActionRecommendation(BaseModel):
+    title: str
+    description: str
+    priority: Priority
+
+class RewardTierSuggestion(BaseModel):
+    amount: float
+    description: str
+
+class StrategicRecommendation(BaseModel):
+    category: str
+    priority: Priority
+    description: str
+    reward_tiers: Optional[List[RewardTierSuggestion]] = None
+
+class StrategicRecommendationsOutput(BaseModel):
+    success_prediction: SuccessOutlook
+    success_factors: List[str] = Field(max_length=3)
+    risk_factors: List[str] = Field(max_length=3)
+    action_recommendations: List[ActionRecommendation] = Field(max_length=4)
+    strategic_recommendations: List[StrategicRecommendation] = Field(max_length=4)
+
 # ============ HELPER FUNCTIONS ============
 
-async def get_current_user(request: Request) -> Optional[User]:
+def request_session_token(request: Request) -> Optional[str]:
     # Check session_token from cookie first, then Authorization header
     session_token = request.cookies.get("session_token")
     
@@ -256,7 +500,24 @@ async def get_current_user(request: Request) -> Optional[User]:
         auth_header = request.headers.get("authorization")
         if auth_header and auth_header.startswith("Bearer "):
             session_token = auth_header.split(" ")[1]
-    
+    return session_token
+
+async def start_session(response: Response, user_id: str, secure: bool = True, samesite: str = "none") -> str:
+    """Create a session (evicting the user's oldest beyond the cap) and set its cookie"""
+    session = sessions.create_session(db, user_id)
+    response.set_cookie(
+        key="session_token",
+        value=session["session_token"],
+        httponly=True,
+        secure=secure,
+        samesite=samesite,
+        max_age=int(sessions.SESSION_TTL.total_seconds()),
+        path="/"
+    )
+    return session["session_token"]
+
+async def get_current_user(request: Request) -> Optional[User]:
+    session_token = request_session_token(request)
     if not session_token:
         return None
     
@@ -271,13 +532,90 @@ async def get_current_user(request: Request) -> Optional[User]:
     if isinstance(user_doc['created_at'], str):
         user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     
+    # Writes made for this user pin their next reads to the primary
+    bind_route_key(user_doc["id"])
     return User(**user_doc)
 
+def resolve_session_user(session_token: str) -> Optional[str]:
+    """User id of a live session, for admission control's per-user budgets"""
+    with db_span("user_sessions", "find_one"):
+        rows = db.find("user_sessions", {"session_token": session_token}, limit=1, columns=["user_id", "expires_at"])
+    if not rows or datetime.fromisoformat(rows[0]["expires_at"]) < datetime.now(timezone.utc):
+        return None
+    return rows[0]["user_id"]
+
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    with span("bcrypt", "hash"):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    with span("bcrypt", "verify"):
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+GEMINI_MODEL = 'gemini-2.0-flash-exp'
+
+def generate_ai_content(prompt: str, endpoint: str, generation_config: Optional[dict] = None,
+                        user_id: Optional[str] = None):
+    """Call Gemini, recording latency and token usage under `endpoint` and,
+    in the usage ledger, under `user_id`"""
+    genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
+    model = genai.GenerativeModel(GEMINI_MODEL)
+    started = time.perf_counter()
+    with span("llm", endpoint):
+        if generation_config:
+            response = model.generate_content(prompt, generation_config=generation_config)
+        else:
+            response = model.generate_content(prompt)
+    latency = time.perf_counter() - started
+    record_llm_usage(endpoint, response)
+    
+    usage = getattr(response, "usage_metadata", None)
+    input_tokens = getattr(usage, "prompt_token_count", None) or prompts.estimate_tokens(prompt)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if output_tokens is None:
+        try:
+            output_tokens = prompts.estimate_tokens(response.text)
+        except ValueError:  # blocked response, no text
+            output_tokens = 0
+    llm_usage.LEDGER.record(user_id, endpoint, input_tokens, output_tokens, latency)
+    return response
+
+def llm_for(user: Optional[User]):
+    """generate_ai_content that charges its calls to `user` in the usage ledger"""
+    return functools.partial(generate_ai_content, user_id=user.id if user else None)
+
+def fast_json(content) -> ORJSONResponse:
+    """Serialize rows straight from the data layer with orjson.
+
+    Returning a Response skips FastAPI's per-row response_model validation and
+    the datetime round trip; the declared response_model still documents the
+    shape in OpenAPI. Rows must already be JSON-ready (timestamps as ISO strings).
+    """
+    return ORJSONResponse(content)
+
+def rows_etag(rows: list, *scope) -> str:
+    """Strong ETag from row versions rather than from the serialized body.
+
+    Folds each row's id, updated_at/created_at marker and counters into a
+    CRC, together with the row count and whatever else scopes the response
+    (query string, user id).
+    """
+    digest = zlib.crc32("|".join(str(part) for part in scope).encode())
+    for row in rows:
+        version = f"{row.get('id')}|{row.get('updated_at') or row.get('created_at')}|" \
+                  f"{row.get('raised_amount')}|{row.get('backers_count')}|{row.get('status')}"
+        digest = zlib.crc32(version.encode(), digest)
+    return f'"{len(rows):x}-{digest:08x}"'
+
+def conditional_json(request: Request, rows: list, content=None, scope: tuple = (), private: bool = False) -> Response:
+    """fast_json() with an ETag; answers 304 with no body when the client's copy is current"""
+    etag = rows_etag(rows, request.url.path, request.url.query, *scope)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache" if private else "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response = fast_json(rows if content is None else content)
+    response.headers.update(headers)
+    return response
 
 # ============ AUTH ENDPOINTS ============
 
@@ -298,28 +636,8 @@ async def register(data: RegisterRequest, response: Response):
     user_dict['created_at'] = user_dict['created_at'].isoformat()
     await sb_insert("users", user_dict)
     
-    # Create session
-    session = UserSession(
-        user_id=user.id,
-        expires_at=datetime.now(timezone.utc) + timedelta(days=7)
-    )
-    session_dict = session.model_dump()
-    session_dict['created_at'] = session_dict['created_at'].isoformat()
-    session_dict['expires_at'] = session_dict['expires_at'].isoformat()
-    await sb_insert("user_sessions", session_dict)
-    
-    # Set cookie
-    response.set_cookie(
-        key="session_token",
-        value=session.session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        max_age=7*24*60*60,
-        path="/"
-    )
-    
-    return {"user": user.model_dump(), "session_token": session.session_token}
+    session_token = await start_session(response, user.id)
+    return {"user": user.model_dump(), "session_token": session_token}
 
 @api_router.post("/auth/login")
 async def login(data: LoginRequest, response: Response):
@@ -334,28 +652,8 @@ async def login(data: LoginRequest, response: Response):
         user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     user = User(**user_doc)
     
-    # Create session
-    session = UserSession(
-        user_id=user.id,
-        expires_at=datetime.now(timezone.utc) + timedelta(days=7)
-    )
-    session_dict = session.model_dump()
-    session_dict['created_at'] = session_dict['created_at'].isoformat()
-    session_dict['expires_at'] = session_dict['expires_at'].isoformat()
-    await sb_insert("user_sessions", session_dict)
-    
-    # Set cookie
-    response.set_cookie(
-        key="session_token",
-        value=session.session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        max_age=7*24*60*60,
-        path="/"
-    )
-    
-    return {"user": user.model_dump(), "session_token": session.session_token}
+    session_token = await start_session(response, user.id)
+    return {"user": user.model_dump(), "session_token": session_token}
 
 @api_router.get("/auth/google-login")
 async def google_login():
@@ -363,7 +661,7 @@ async def google_login():
     try:
         # Supabase OAuth sign in
         redirect_url = f"{os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')}/api/auth/google/callback"
-        data = supabase.auth.sign_in_with_oauth({
+        data = db.auth.sign_in_with_oauth({
             "provider": "google",
             "options": {
                 "redirect_to": redirect_url
@@ -385,7 +683,7 @@ async def google_callback(request: Request, response: Response):
             raise HTTPException(400, "Missing access token")
         
         # Get user from Supabase auth
-        user_response = supabase.auth.get_user(access_token)
+        user_response = db.auth.get_user(access_token)
         supabase_user = user_response.user
         
         if not supabase_user:
@@ -410,27 +708,7 @@ async def google_callback(request: Request, response: Response):
             user = User(**user_doc)
         
         # Create backend session
-        session_token = str(uuid.uuid4())
-        backend_session = UserSession(
-            session_token=session_token,
-            user_id=user.id,
-            expires_at=datetime.now(timezone.utc) + timedelta(days=7)
-        )
-        session_dict = backend_session.model_dump()
-        session_dict['created_at'] = session_dict['created_at'].isoformat()
-        session_dict['expires_at'] = session_dict['expires_at'].isoformat()
-        await sb_insert("user_sessions", session_dict)
-        
-        # Set cookie
-        response.set_cookie(
-            key="session_token",
-            value=session_token,
-            httponly=True,
-            secure=False,  # Set to False for localhost
-            samesite="lax",
-            max_age=7*24*60*60,
-            path="/"
-        )
+        session_token = await start_session(response, user.id, secure=False, samesite="lax")  # secure=False for localhost
         
         return {"user": user.model_dump(), "session_token": session_token}
     except Exception as e:
@@ -446,9 +724,10 @@ async def get_me(request: Request):
 
 @api_router.post("/auth/logout")
 async def logout(request: Request, response: Response):
-    session_token = request.cookies.get("session_token")
+    # Bearer clients log out too, not only cookie sessions
+    session_token = request_session_token(request)
     if session_token:
-        await sb_delete("user_sessions", {"session_token": session_token})
+        sessions.revoke_session(db, session_token)
     
     response.delete_cookie("session_token", path="/")
     return {"message": "Logged out"}
@@ -456,24 +735,25 @@ async def logout(request: Request, response: Response):
 # ============ CAMPAIGN ENDPOINTS ============
 
 @api_router.get("/campaigns", response_model=List[Campaign])
-async def get_campaigns(category: Optional[str] = None, search: Optional[str] = None):
+async def get_campaigns(request: Request, category: Optional[str] = None, search: Optional[str] = None):
     query = {"status": "active"}
     if category:
         query["category"] = category
     if search:
         query["title"] = {"$regex": search, "$options": "i"}
     
-    campaigns = await sb_find("campaigns", query, 1000)
-    for campaign in campaigns:
-        if isinstance(campaign['created_at'], str):
-            campaign['created_at'] = datetime.fromisoformat(campaign['created_at'])
-    return campaigns
+    campaigns = await sb_find("campaigns", query, 1000, max_staleness=BROWSING)
+    today = datetime.now(timezone.utc).date()
+    campaigns = [lifecycle.with_deadline(c) for c in counter_aggregator.merge_all(campaigns)]
+    # days_remaining changes at midnight UTC without a row changing
+    return conditional_json(request, campaigns, scope=(today,))
 
 @api_router.get("/campaigns/{campaign_id}")
 async def get_campaign(campaign_id: str):
-    campaign = await sb_find_one("campaigns", {"id": campaign_id})
+    campaign = await sb_find_one("campaigns", {"id": campaign_id}, max_staleness=BROWSING)
     if not campaign:
         raise HTTPException(404, "Campaign not found")
+    lifecycle.with_deadline(counter_aggregator.merge(campaign))
     if isinstance(campaign['created_at'], str):
         campaign['created_at'] = datetime.fromisoformat(campaign['created_at'])
     return campaign
@@ -499,18 +779,17 @@ async def create_campaign(data: CampaignCreate, request: Request):
     
     # Get AI analysis
     try:
-        genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
+        fields = prompts.fit("create_campaign", title=campaign.title, category=campaign.category,
+                             description=campaign.description)
         analysis_prompt = f"""Analyze this crowdfunding campaign and predict its success probability (0-100%):
-        Title: {campaign.title}
-        Category: {campaign.category}
+        Title: {fields['title']}
+        Category: {fields['category']}
         Goal: ${campaign.goal_amount}
-        Description: {campaign.description}
+        Description: {fields['description']}
         
         Respond with ONLY a number between 0-100 representing the success probability percentage."""
         
-        response = model.generate_content(analysis_prompt)
+        response = generate_ai_content(analysis_prompt, "create_campaign", user_id=user.id)
         ai_response = response.text.strip()
         
         # Extract percentage
@@ -536,6 +815,7 @@ async def create_campaign(data: CampaignCreate, request: Request):
     campaign_dict = campaign.model_dump()
     campaign_dict['created_at'] = campaign_dict['created_at'].isoformat()
     await sb_insert("campaigns", campaign_dict)
+    events.emit(events.CAMPAIGN_CREATED, campaign_dict)
     
     return campaign
 
@@ -565,6 +845,7 @@ async def create_campaign_extended(data: CampaignCreateExtended, request: Reques
     campaign_dict = campaign.model_dump()
     campaign_dict['created_at'] = campaign_dict['created_at'].isoformat()
     await sb_insert("campaigns", campaign_dict)
+    events.emit(events.CAMPAIGN_CREATED, campaign_dict)
     
     return campaign
 
@@ -574,18 +855,27 @@ async def update_campaign(campaign_id: str, data: CampaignUpdate, request: Reque
     if not user:
         raise HTTPException(401, "Not authenticated")
     
-    campaign = await sb_find_one("campaigns", {"id": campaign_id})
-    if not campaign:
-        raise HTTPException(404, "Campaign not found")
-    
-    if campaign["creator_id"] != user.id and not user.is_admin:
-        raise HTTPException(403, "Not authorized")
+    # Ownership is enforced in the filter so the edit is a single round trip
+    # that returns the updated row; admins may edit any campaign.
+    filters = {"id": campaign_id}
+    if not user.is_admin:
+        filters["creator_id"] = user.id
     
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     if update_data:
-        await sb_update("campaigns", {"id": campaign_id}, {"$set": update_data})
+        rows = await sb_update("campaigns", filters, {"$set": update_data})
+    else:
+        rows = await sb_find("campaigns", filters, 1)
+    
+    if not rows:
+        # Only the failure path pays for telling "missing" from "not yours"
+        if await sb_find_one("campaigns", {"id": campaign_id}):
+            raise HTTPException(403, "Not authorized")
+        raise HTTPException(404, "Campaign not found")
     
-    updated = await sb_find_one("campaigns", {"id": campaign_id})
+    updated = counter_aggregator.merge(rows[0])
+    if update_data:
+        events.emit(events.CAMPAIGN_UPDATED, updated)
     if isinstance(updated['created_at'], str):
         updated['created_at'] = datetime.fromisoformat(updated['created_at'])
     return updated
@@ -604,11 +894,12 @@ async def delete_campaign(campaign_id: str, request: Request):
         raise HTTPException(403, "Not authorized")
     
     await sb_delete("campaigns", {"id": campaign_id})
+    events.emit(events.CAMPAIGN_DELETED, campaign)
     return {"message": "Campaign deleted"}
 
 @api_router.get("/campaigns/{campaign_id}/analysis")
 async def get_campaign_analysis(campaign_id: str):
-    analysis = await sb_find_one("ai_analyses", {"campaign_id": campaign_id})
+    analysis = await sb_find_one("ai_analyses", {"campaign_id": campaign_id}, max_staleness=BROWSING)
     if not analysis:
         return {"success_probability": 75.0, "analysis_text": "Analysis pending"}
     
@@ -616,31 +907,74 @@ async def get_campaign_analysis(campaign_id: str):
         analysis['created_at'] = datetime.fromisoformat(analysis['created_at'])
     return analysis
 
-@api_router.get("/my-campaigns")
+@api_router.get("/campaigns/{campaign_id}/similar")
+async def get_similar_campaigns(campaign_id: str, limit: int = 5):
+    await ensure_campaign_indexes()
+    similar = similarity_index.similar(campaign_id, k=max(1, min(limit, 50)))
+    if similar is None:
+        raise HTTPException(404, "Campaign not found")
+    return fast_json(similar)
+
+@api_router.get("/feeds/{feed}", response_model=List[Campaign])
+async def get_feed(feed: str, limit: int = 6):
+    """Ranked active campaigns: trending, nearly_funded or newest"""
+    if feed not in feeds.FEEDS:
+        raise HTTPException(404, f"Unknown feed (expected one of: {', '.join(feeds.FEEDS)})")
+    await ensure_campaign_indexes()
+    campaigns = feed_index.top(feed, max(1, min(limit, 50)))
+    return fast_json([lifecycle.with_deadline(c) for c in counter_aggregator.merge_all(campaigns)])
+
+@api_router.get("/my-campaigns", response_model=List[Campaign])
 async def get_my_campaigns(request: Request):
     user = await get_current_user(request)
     if not user:
         raise HTTPException(401, "Not authenticated")
     
-    campaigns = await sb_find("campaigns", {"creator_id": user.id}, 1000)
-    for campaign in campaigns:
-        if isinstance(campaign['created_at'], str):
-            campaign['created_at'] = datetime.fromisoformat(campaign['created_at'])
-    return campaigns
+    campaigns = await sb_find("campaigns", {"creator_id": user.id}, 1000, max_staleness=BROWSING)
+    today = datetime.now(timezone.utc).date()
+    campaigns = [lifecycle.with_deadline(c) for c in counter_aggregator.merge_all(campaigns)]
+    return conditional_json(request, campaigns, scope=(user.id, today), private=True)
+
+# ============ IMAGE ENDPOINTS ============
+
+@api_router.get("/images/{campaign_id}")
+async def get_campaign_image(campaign_id: str, request: Request, size: Literal["thumb", "card", "hero"] = "card",
+                             v: Optional[str] = None):
+    """The campaign's image resized for display. Clients pass `v` (derived
+    from image_url) to make the response cacheable for a year."""
+    rows = await sb_find("campaigns", {"id": campaign_id}, 1, columns=["id", "image_url"], max_staleness=REPORTING)
+    if not rows or not rows[0].get("image_url"):
+        raise HTTPException(404, "Campaign has no image")
+    url = rows[0]["image_url"]
+    fmt = images.negotiate_format(request.headers.get("accept"))
+    
+    key = images.ImageProxy.rendition_key(url, size, fmt)
+    etag = f'"{zlib.crc32(key.encode()):08x}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable" if v else "public, max-age=86400",
+        "Vary": "Accept",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        data = await asyncio.to_thread(image_proxy.rendition, url, size, fmt)
+    except images.ImageFetchError as e:
+        # Let the browser try the original rather than show a broken image
+        logging.warning(f"Image proxy failed for campaign {campaign_id}: {e}")
+        return RedirectResponse(url, status_code=307)
+    return Response(data, media_type=images.FORMATS[fmt], headers=headers)
 
 # ============ ADMIN ENDPOINTS ============
 
-@api_router.get("/admin/campaigns")
+@api_router.get("/admin/campaigns", response_model=List[Campaign])
 async def admin_get_all_campaigns(request: Request):
     user = await get_current_user(request)
     if not user or not user.is_admin:
         raise HTTPException(403, "Admin access required")
     
-    campaigns = await sb_find("campaigns", {}, 1000)
-    for campaign in campaigns:
-        if isinstance(campaign['created_at'], str):
-            campaign['created_at'] = datetime.fromisoformat(campaign['created_at'])
-    return campaigns
+    campaigns = await sb_find("campaigns", {}, 1000, max_staleness=REPORTING)
+    return conditional_json(request, campaigns, private=True)
 
 @api_router.get("/admin/stats")
 async def admin_stats(request: Request):
@@ -648,33 +982,178 @@ async def admin_stats(request: Request):
     if not user or not user.is_admin:
         raise HTTPException(403, "Admin access required")
     
-    # Get counts using Supabase
-    all_campaigns = await sb_find("campaigns", {}, 10000)
-    total_campaigns = len(all_campaigns)
-    active_campaigns = len([c for c in all_campaigns if c.get('status') == 'active'])
+    # Campaign totals come from the category aggregates; users are counted
+    # by the database instead of being fetched
+    await ensure_campaign_indexes()
+    totals = category_stats.totals()
     
-    all_users = await sb_find("users", {}, 10000)
-    total_users = len(all_users)
+    return {
+        "total_campaigns": totals["campaign_count"],
+        "active_campaigns": totals["active_count"],
+        "total_users": await sb_count("users", max_staleness=REPORTING),
+        "total_raised": totals["raised_total"]
+    }
+
+# Never password_hash
+ADMIN_USER_COLUMNS = ["id", "email", "name", "picture", "is_admin", "created_at"]
+
+@api_router.get("/admin/users", response_model=AdminUsersPage)
+async def admin_list_users(request: Request, limit: int = 50, cursor: Optional[str] = None,
+                           search: Optional[str] = None, search_by: Literal["email", "name"] = "email"):
+    """Users ordered by email with keyset pagination; `search` is a prefix
+    match on `search_by`. Counts are only computed for the first page."""
+    user = await get_current_user(request)
+    if not user or not user.is_admin:
+        raise HTTPException(403, "Admin access required")
     
-    # Calculate total raised
-    total_raised = sum(c.get('raised_amount', 0) for c in all_campaigns)
+    limit = max(1, min(limit, 200))
+    filters = {search_by: {"$prefix": search.strip()}} if search and search.strip() else {}
+    page_filters = {key: dict(value) for key, value in filters.items()}
+    if cursor:
+        try:
+            after_email, = decode_cursor(cursor)
+        except ValueError:
+            after_email = None
+        if not isinstance(after_email, str):
+            raise HTTPException(400, "Invalid cursor")
+        page_filters.setdefault("email", {})["$gt"] = after_email
+    
+    rows = await sb_find("users", page_filters, limit + 1, order="email", columns=ADMIN_USER_COLUMNS,
+                         max_staleness=REPORTING)
+    counts = None
+    if not cursor:
+        total = await sb_count("users", max_staleness=REPORTING)
+        counts = {
+            "total": total,
+            "admins": await sb_count("users", {"is_admin": True}, max_staleness=REPORTING),
+            "matching": await sb_count("users", filters, max_staleness=REPORTING) if filters else total,
+        }
+    return fast_json({"users": rows[:limit], "next_cursor": next_cursor(rows, limit, ["email"]), "counts": counts})
+
+@api_router.get("/admin/llm-usage")
+async def admin_llm_usage(request: Request, group_by: Literal["user", "endpoint", "user_endpoint"] = "user",
+                          limit: int = 50):
+    """This worker's LLM usage ledger, most tokens first"""
+    user = await get_current_user(request)
+    if not user or not user.is_admin:
+        raise HTTPException(403, "Admin access required")
     
+    rows = llm_usage.LEDGER.summary(group_by, max(1, min(limit, 500)))
+    user_ids = [row["user_id"] for row in rows if row.get("user_id", llm_usage.ANONYMOUS) != llm_usage.ANONYMOUS]
+    if user_ids:
+        users = await sb_find("users", {"id": {"$in": user_ids}}, len(user_ids), columns=["id", "email", "name"],
+                              max_staleness=REPORTING)
+        emails = {u["id"]: u["email"] for u in users}
+        for row in rows:
+            row["email"] = emails.get(row.get("user_id"))
     return {
-        "total_campaigns": total_campaigns,
-        "active_campaigns": active_campaigns,
-        "total_users": total_users,
-        "total_raised": total_raised
+        "since": llm_usage.LEDGER.since.isoformat(),
+        "input_budgets": prompts.INPUT_BUDGETS,
+        "rows": rows,
     }
 
+@api_router.get("/admin/export/{table}")
+async def admin_export(table: str, request: Request, format: Literal["ndjson", "csv"] = "ndjson",
+                       after: Optional[str] = None):
+    """Stream a whole table (campaigns, pledges or payment_transactions) as
+    NDJSON or CSV; `after` resumes an interrupted export after that id"""
+    user = await get_current_user(request)
+    if not user or not user.is_admin:
+        raise HTTPException(403, "Admin access required")
+    if table not in exports.EXPORT_COLUMNS:
+        raise HTTPException(404, f"Unknown export '{table}'")
+    
+    filename = f"{table}-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.{format}"
+    return StreamingResponse(
+        exports.stream(db, table, format, after),
+        media_type=exports.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
+
+class CpuProfileRequest(BaseModel):
+    seconds: Optional[float] = Field(None, gt=0, le=profiling.MAX_SECONDS)
+    requests: Optional[int] = Field(None, gt=0, le=profiling.MAX_REQUESTS)
+    route: str = "/api/"
+    interval_ms: float = Field(5.0, ge=1, le=1000)
+
+@api_router.post("/admin/profile/cpu")
+async def admin_start_cpu_profile(data: CpuProfileRequest, request: Request):
+    """Sample this worker's stacks for `seconds`, or during the next `requests`
+    requests whose path starts with `route`; read the result with GET"""
+    user = await get_current_user(request)
+    if not user or not user.is_admin:
+        raise HTTPException(403, "Admin access required")
+    if (data.seconds is None) == (data.requests is None):
+        raise HTTPException(400, "Pass either seconds or requests")
+    
+    try:
+        return cpu_profiler.start(data.seconds, data.requests, data.route, data.interval_ms / 1000)
+    except profiling.ProfilerBusy as e:
+        raise HTTPException(409, str(e))
+
+@api_router.get("/admin/profile/cpu")
+async def admin_get_cpu_profile(request: Request, format: Literal["json", "collapsed"] = "json", limit: int = 200):
+    """The current or last CPU profile; `collapsed` is flame-graph input
+    (flamegraph.pl, speedscope, inferno)"""
+    user = await get_current_user(request)
+    if not user or not user.is_admin:
+        raise HTTPException(403, "Admin access required")
+    
+    if format == "collapsed":
+        return PlainTextResponse(cpu_profiler.collapsed(), headers={"Cache-Control": "no-store"})
+    return cpu_profiler.report(max(1, min(limit, 5000)))
+
+@api_router.delete("/admin/profile/cpu")
+async def admin_stop_cpu_profile(request: Request):
+    user = await get_current_user(request)
+    if not user or not user.is_admin:
+        raise HTTPException(403, "Admin access required")
+    
+    await asyncio.to_thread(cpu_profiler.stop)
+    return cpu_profiler.report(0)["session"]
+
+@api_router.post("/admin/profile/memory")
+async def admin_start_memory_profile(request: Request, frames: int = 16):
+    """Start tracing allocations in this worker (slows it down until DELETE)"""
+    user = await get_current_user(request)
+    if not user or not user.is_admin:
+        raise HTTPException(403, "Admin access required")
+    
+    try:
+        memory_profiler.start(max(1, min(frames, 64)))
+    except profiling.ProfilerBusy as e:
+        raise HTTPException(409, str(e))
+    return {"tracing": True, "pid": os.getpid()}
+
+@api_router.get("/admin/profile/memory")
+async def admin_memory_snapshot(request: Request, group_by: Literal["owner", "file", "line"] = "owner",
+                                limit: int = 25):
+    """Traced memory by owner (app module or library), file or line, and what
+    grew since the previous snapshot"""
+    user = await get_current_user(request)
+    if not user or not user.is_admin:
+        raise HTTPException(403, "Admin access required")
+    if not memory_profiler.running:
+        raise HTTPException(409, "Memory tracing is off; POST /api/admin/profile/memory first")
+    
+    return await asyncio.to_thread(memory_profiler.snapshot, group_by, max(1, min(limit, 500)))
+
+@api_router.delete("/admin/profile/memory")
+async def admin_stop_memory_profile(request: Request):
+    user = await get_current_user(request)
+    if not user or not user.is_admin:
+        raise HTTPException(403, "Admin access required")
+    
+    memory_profiler.stop()
+    return {"tracing": False, "pid": os.getpid()}
+
 # ============ COMMENTS ENDPOINTS ============
 
-@api_router.get("/campaigns/{campaign_id}/comments")
+@api_router.get("/campaigns/{campaign_id}/comments", response_model=List[Comment])
 async def get_comments(campaign_id: str):
-    comments = await sb_find("comments", {"campaign_id": campaign_id}, 1000)
-    for comment in comments:
-        if isinstance(comment['created_at'], str):
-            comment['created_at'] = datetime.fromisoformat(comment['created_at'])
-    return comments
+    comments = await sb_find("comments", {"campaign_id": campaign_id}, 1000, max_staleness=BROWSING)
+    comments = appends.merge(comments, append_queues["comments"].pending({"campaign_id": campaign_id}))
+    return fast_json(comments)
 
 @api_router.post("/campaigns/{campaign_id}/comments")
 async def create_comment(campaign_id: str, data: CommentCreate, request: Request):
@@ -691,7 +1170,7 @@ async def create_comment(campaign_id: str, data: CommentCreate, request: Request
     
     comment_dict = comment.model_dump()
     comment_dict['created_at'] = comment_dict['created_at'].isoformat()
-    await sb_insert("comments", comment_dict)
+    await sb_append("comments", comment_dict)
     
     return comment
 
@@ -703,25 +1182,28 @@ async def ai_chat(data: ChatRequest, request: Request):
     session_id = data.session_id or str(uuid.uuid4())
     
     try:
-        genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
-        
-        # Get chat history for this session
-        chat_history = await sb_find("chat_messages", {"session_id": session_id}, 50)
-        
-        # Build conversation context
+        # Most recent turns of this session, newest first
+        chat_history = await sb_find("chat_messages", {"session_id": session_id}, 5, order="-created_at")
+        chat_history = appends.merge(chat_history, append_queues["chat_messages"].pending({"session_id": session_id}))
+        chat_history = sorted(chat_history, key=lambda m: m["created_at"], reverse=True)[:5]
+        
+        # Build conversation context: the new message, then as many earlier
+        # turns as fit the input budget
+        message = prompts.truncate(data.message, prompts.CHAT_MESSAGE_TOKENS)
+        turns = prompts.fit_turns([(msg['message'], msg.get('response')) for msg in reversed(chat_history)],
+                                  prompts.INPUT_BUDGETS["ai_chat"] - prompts.estimate_tokens(message))
         conversation_parts = ["You are a helpful AI assistant for a crowdfunding platform. Help users with campaign-related queries, funding advice, and platform navigation.\n"]
         
-        for msg in chat_history[-5:]:  # Last 5 messages for context
-            conversation_parts.append(f"User: {msg['message']}")
-            if msg.get('response'):
-                conversation_parts.append(f"Assistant: {msg['response']}")
+        for turn_message, turn_response in turns:
+            conversation_parts.append(f"User: {turn_message}")
+            if turn_response:
+                conversation_parts.append(f"Assistant: {turn_response}")
         
-        conversation_parts.append(f"User: {data.message}")
+        conversation_parts.append(f"User: {message}")
         
         # Generate response
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
         full_prompt = "\n".join(conversation_parts)
-        response = model.generate_content(full_prompt)
+        response = generate_ai_content(full_prompt, "ai_chat", user_id=user.id if user else None)
         response_text = response.text.strip()
         
         # Save chat message
@@ -733,9 +1215,11 @@ async def ai_chat(data: ChatRequest, request: Request):
         )
         msg_dict = chat_msg.model_dump()
         msg_dict['created_at'] = msg_dict['created_at'].isoformat()
-        await sb_insert("chat_messages", msg_dict)
+        await sb_append("chat_messages", msg_dict)
         
         return {"response": response_text, "session_id": session_id}
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"AI chat error: {e}")
         raise HTTPException(500, f"AI service error: {str(e)}")
@@ -749,48 +1233,33 @@ async def optimize_title(data: OptimizeTitleRequest, request: Request):
         raise HTTPException(401, "Not authenticated")
     
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
+        fields = prompts.fit("optimize_title", title=data.title, category=data.category, description=data.description)
         prompt = f"""You are an expert at creating compelling crowdfunding campaign titles. 
 
-Current Title: {data.title}
-Category: {data.category}
-Description: {data.description}
+Current Title: {fields['title']}
+Category: {fields['category']}
+Description: {fields['description']}
 
 Generate 5 alternative campaign titles that are:
 - Compelling and attention-grabbing
 - Clear about what the campaign offers
-- Optimized for backers in the {data.category} category
-- Under 80 characters each
-
-Return ONLY a JSON array of 5 titles, nothing else. Format:
-["Title 1", "Title 2", "Title 3", "Title 4", "Title 5"]"""
-        
-        response = model.generate_content(prompt)
+- Optimized for backers in the {fields['category']} category
+- Under 80 characters each"""
         
-        import json
-        import re
+        suggestions = generate_structured(TitleSuggestions, prompt, "optimize_title", llm_for(user))
+        return {"titles": suggestions.titles}
         
-        # Extract JSON array from response
-        response_text = response.text
-        json_match = re.search(r'\[.*?\]', response_text, re.DOTALL)
-        
-        if json_match:
-            titles = json.loads(json_match.group())
-        else:
-            # Fallback titles
-            titles = [
+    except StructuredOutputError:
+        # Fallback titles
+        return {
+            "titles": [
                 f"{data.title} - Transform Your Vision",
                 f"Support {data.title}: Make It Happen",
                 f"{data.title}: Innovation Meets Opportunity",
                 f"Back {data.title} - Shape the Future",
                 f"{data.title} - Join the Movement"
             ]
-        
-        return {"titles": titles}
-        
+        }
     except Exception as e:
         logging.error(f"Title optimization error: {e}")
         # Return fallback titles
@@ -811,16 +1280,14 @@ async def enhance_description(data: EnhanceDescriptionRequest, request: Request)
         raise HTTPException(401, "Not authenticated")
     
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
+        fields = prompts.fit("enhance_description", title=data.title, category=data.category,
+                             description=data.description)
         prompt = f"""You are an expert at writing persuasive crowdfunding campaign descriptions.
 
-Campaign Title: {data.title}
-Category: {data.category}
+Campaign Title: {fields['title']}
+Category: {fields['category']}
 Goal Amount: ${data.goal_amount}
-Current Description: {data.description}
+Current Description: {fields['description']}
 
 Improve this description to make it more compelling and persuasive. The enhanced description should:
 - Start with a strong hook that captures attention
@@ -833,7 +1300,7 @@ Improve this description to make it more compelling and persuasive. The enhanced
 
 Return ONLY the enhanced description text, no additional commentary."""
         
-        response = model.generate_content(prompt)
+        response = generate_ai_content(prompt, "enhance_description", user_id=user.id)
         enhanced_description = response.text.strip()
         
         # Remove any markdown formatting if present
@@ -852,72 +1319,48 @@ async def success_prediction(data: SuccessPredictionRequest, request: Request):
         raise HTTPException(401, "Not authenticated")
     
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
         reward_tiers_text = ""
         if data.reward_tiers:
             reward_tiers_text = "Reward Tiers:\n" + "\n".join([f"- ${tier.amount}: {tier.description}" for tier in data.reward_tiers])
         
+        fields = prompts.fit("success_prediction", title=data.title, category=data.category,
+                             description=data.description, reward_tiers=reward_tiers_text)
         prompt = f"""You are an AI expert at predicting crowdfunding campaign success.
 
 Campaign Details:
-Title: {data.title}
-Category: {data.category}
+Title: {fields['title']}
+Category: {fields['category']}
 Goal: ${data.goal_amount}
-Description: {data.description}
-{reward_tiers_text}
-
-Analyze this campaign and provide a success prediction in JSON format:
-{{
-    "success_percentage": <number between 0-100>,
-    "confidence_level": "<High/Medium/Low>",
-    "analysis": "<2-3 sentence analysis of why this percentage>",
-    "recommendations": [
-        "<recommendation 1>",
-        "<recommendation 2>",
-        "<recommendation 3>",
-        "<recommendation 4>",
-        "<recommendation 5>"
-    ]
-}}
+Description: {fields['description']}
+{fields['reward_tiers']}
 
+Predict the campaign's success percentage (0-100) with a confidence level,
+a 2-3 sentence analysis of why, and 5 specific recommendations.
 Be realistic and specific in your analysis."""
         
-        response = model.generate_content(prompt)
-        
-        import json
-        import re
-        
-        # Extract JSON from response
-        response_text = response.text
-        json_match = re.search(r'\{[\s\S]*?\}', response_text)
+        prediction = generate_structured(SuccessPredictionOutput, prompt, "success_prediction", llm_for(user))
+        return prediction.model_dump()
         
-        if json_match:
-            prediction = json.loads(json_match.group())
-        else:
-            # Fallback prediction
-            base_score = 65
-            if data.goal_amount < 10000:
-                base_score += 10
-            if len(data.reward_tiers) >= 3:
-                base_score += 5
-            
-            prediction = {
-                "success_percentage": min(95, base_score),
-                "confidence_level": "Medium",
-                "analysis": f"The campaign's success probability is moderately strong based on the {data.category} category. The goal of ${data.goal_amount} is achievable with proper marketing and community engagement.",
-                "recommendations": [
-                    "Expand reward tiers to include more options for different contribution levels",
-                    "Create a detailed budget breakdown to build trust with backers",
-                    "Promote through social media and community events to reach a wider audience",
-                    "Add testimonials or endorsements to strengthen credibility",
-                    "Incorporate visuals and videos to make the campaign more compelling"
-                ]
-            }
+    except StructuredOutputError:
+        # Fallback prediction
+        base_score = 65
+        if data.goal_amount < 10000:
+            base_score += 10
+        if len(data.reward_tiers) >= 3:
+            base_score += 5
         
-        return prediction
+        return {
+            "success_percentage": min(95, base_score),
+            "confidence_level": "Medium",
+            "analysis": f"The campaign's success probability is moderately strong based on the {data.category} category. The goal of ${data.goal_amount} is achievable with proper marketing and community engagement.",
+            "recommendations": [
+                "Expand reward tiers to include more options for different contribution levels",
+                "Create a detailed budget breakdown to build trust with backers",
+                "Promote through social media and community events to reach a wider audience",
+                "Add testimonials or endorsements to strengthen credibility",
+                "Incorporate visuals and videos to make the campaign more compelling"
+            ]
+        }
         
     except Exception as e:
         logging.error(f"Success prediction error: {e}")
@@ -942,134 +1385,96 @@ async def marketing_strategy(data: MarketingStrategyRequest, request: Request):
         raise HTTPException(401, "Not authenticated")
     
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
+        fields = prompts.fit("marketing_strategy", title=data.title, category=data.category,
+                             description=data.description)
         prompt = f"""You are a marketing expert specializing in crowdfunding campaigns.
 
 Campaign Details:
-Title: {data.title}
-Category: {data.category}
+Title: {fields['title']}
+Category: {fields['category']}
 Goal: ${data.goal_amount}
-Description: {data.description}
-
-Create a comprehensive marketing strategy in JSON format with the following structure:
-{{
-    "overview": "<2-3 sentence overview of the marketing approach>",
-    "target_audience": {{
-        "primary": "<description of primary audience>",
-        "secondary": "<description of secondary audience>"
-    }},
-    "channels": [
-        {{
-            "name": "<channel name>",
-            "strategy": "<specific strategy for this channel>",
-            "priority": "<High/Medium/Low>"
-        }}
-    ],
-    "timeline": [
-        {{
-            "phase": "<phase name>",
-            "duration": "<timeframe>",
-            "actions": ["<action 1>", "<action 2>"]
-        }}
-    ],
-    "key_messages": ["<message 1>", "<message 2>", "<message 3>"],
-    "budget_allocation": {{
-        "social_media": "<percentage>",
-        "content_creation": "<percentage>",
-        "influencer_partnerships": "<percentage>",
-        "paid_advertising": "<percentage>"
-    }}
-}}
-
-Provide 3-4 marketing channels and 3 timeline phases."""
-        
-        response = model.generate_content(prompt)
-        
-        import json
-        import re
+Description: {fields['description']}
+
+Create a comprehensive marketing strategy: a 2-3 sentence overview, primary and
+secondary target audiences, 3-4 marketing channels with a specific strategy
+and priority each, 3 timeline phases with concrete actions, 3 key messages and
+a budget allocation (percentages as strings, e.g. "30%") across social media,
+content creation, influencer partnerships and paid advertising."""
         
-        # Extract JSON from response
-        response_text = response.text
-        json_match = re.search(r'\{[\s\S]*\}', response_text)
+        strategy = generate_structured(MarketingStrategyOutput, prompt, "marketing_strategy", llm_for(user))
+        return strategy.model_dump()
         
-        if json_match:
-            strategy = json.loads(json_match.group())
-        else:
-            # Fallback strategy
-            strategy = {
-                "overview": f"A multi-channel marketing approach focused on building awareness and community engagement for this {data.category} campaign, leveraging social media, content marketing, and strategic partnerships.",
-                "target_audience": {
-                    "primary": f"Enthusiasts and early adopters in the {data.category} space who value innovation and community-driven projects",
-                    "secondary": "Broader audience interested in supporting creative and impactful projects"
+    except StructuredOutputError:
+        # Fallback strategy
+        return {
+            "overview": f"A multi-channel marketing approach focused on building awareness and community engagement for this {data.category} campaign, leveraging social media, content marketing, and strategic partnerships.",
+            "target_audience": {
+                "primary": f"Enthusiasts and early adopters in the {data.category} space who value innovation and community-driven projects",
+                "secondary": "Broader audience interested in supporting creative and impactful projects"
+            },
+            "channels": [
+                {
+                    "name": "Social Media Marketing",
+                    "strategy": "Create engaging content on Instagram, Twitter, and Facebook. Share behind-the-scenes stories, progress updates, and user testimonials. Use hashtags to increase visibility.",
+                    "priority": "High"
                 },
-                "channels": [
-                    {
-                        "name": "Social Media Marketing",
-                        "strategy": "Create engaging content on Instagram, Twitter, and Facebook. Share behind-the-scenes stories, progress updates, and user testimonials. Use hashtags to increase visibility.",
-                        "priority": "High"
-                    },
-                    {
-                        "name": "Email Marketing",
-                        "strategy": "Build an email list and send regular updates about campaign milestones, exclusive offers, and compelling stories that resonate with backers.",
-                        "priority": "High"
-                    },
-                    {
-                        "name": "Influencer Partnerships",
-                        "strategy": f"Identify and collaborate with influencers in the {data.category} niche who can authentically promote the campaign to their followers.",
-                        "priority": "Medium"
-                    },
-                    {
-                        "name": "Content Marketing",
-                        "strategy": "Create blog posts, videos, and infographics that showcase the campaign's value proposition and impact. Share success stories and expert insights.",
-                        "priority": "Medium"
-                    }
-                ],
-                "timeline": [
-                    {
-                        "phase": "Pre-Launch (2-4 weeks before)",
-                        "duration": "2-4 weeks",
-                        "actions": [
-                            "Build landing page and collect email subscribers",
-                            "Create teaser content and build anticipation",
-                            "Reach out to potential influencers and media outlets"
-                        ]
-                    },
-                    {
-                        "phase": "Launch Week",
-                        "duration": "7 days",
-                        "actions": [
-                            "Announce campaign launch across all channels",
-                            "Engage with early backers and build momentum",
-                            "Leverage PR and media coverage opportunities"
-                        ]
-                    },
-                    {
-                        "phase": "Mid-Campaign Push",
-                        "duration": "2-3 weeks",
-                        "actions": [
-                            "Share progress updates and celebrate milestones",
-                            "Run targeted ads to reach new audiences",
-                            "Host live Q&A sessions or webinars"
-                        ]
-                    }
-                ],
-                "key_messages": [
-                    f"Join us in making {data.title} a reality",
-                    "Your support drives innovation and creates lasting impact",
-                    "Be part of a community that values quality and authenticity"
-                ],
-                "budget_allocation": {
-                    "social_media": "30%",
-                    "content_creation": "25%",
-                    "influencer_partnerships": "25%",
-                    "paid_advertising": "20%"
+                {
+                    "name": "Email Marketing",
+                    "strategy": "Build an email list and send regular updates about campaign milestones, exclusive offers, and compelling stories that resonate with backers.",
+                    "priority": "High"
+                },
+                {
+                    "name": "Influencer Partnerships",
+                    "strategy": f"Identify and collaborate with influencers in the {data.category} niche who can authentically promote the campaign to their followers.",
+                    "priority": "Medium"
+                },
+                {
+                    "name": "Content Marketing",
+                    "strategy": "Create blog posts, videos, and infographics that showcase the campaign's value proposition and impact. Share success stories and expert insights.",
+                    "priority": "Medium"
+                }
+            ],
+            "timeline": [
+                {
+                    "phase": "Pre-Launch (2-4 weeks before)",
+                    "duration": "2-4 weeks",
+                    "actions": [
+                        "Build landing page and collect email subscribers",
+                        "Create teaser content and build anticipation",
+                        "Reach out to potential influencers and media outlets"
+                    ]
+                },
+                {
+                    "phase": "Launch Week",
+                    "duration": "7 days",
+                    "actions": [
+                        "Announce campaign launch across all channels",
+                        "Engage with early backers and build momentum",
+                        "Leverage PR and media coverage opportunities"
+                    ]
+                },
+                {
+                    "phase": "Mid-Campaign Push",
+                    "duration": "2-3 weeks",
+                    "actions": [
+                        "Share progress updates and celebrate milestones",
+                        "Run targeted ads to reach new audiences",
+                        "Host live Q&A sessions or webinars"
+                    ]
                 }
+            ],
+            "key_messages": [
+                f"Join us in making {data.title} a reality",
+                "Your support drives innovation and creates lasting impact",
+                "Be part of a community that values quality and authenticity"
+            ],
+            "budget_allocation": {
+                "social_media": "30%",
+                "content_creation": "25%",
+                "influencer_partnerships": "25%",
+                "paid_advertising": "20%"
             }
-        
-        return strategy
+        }
         
     except Exception as e:
         logging.error(f"Marketing strategy error: {e}")
@@ -1128,27 +1533,28 @@ async def create_checkout(data: PledgeRequest, request: Request):
         cancel_url = f"{host_url}/campaign/{data.campaign_id}"
         
         # Create Stripe checkout session
-        session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{
-                'price_data': {
-                    'currency': 'inr',
-                    'product_data': {
-                        'name': f'Back Campaign: {campaign["title"]}',
-                        'description': f'Supporting {campaign["title"]}',
+        with span("stripe", "checkout.create"):
+            session = stripe.checkout.Session.create(
+                payment_method_types=['card'],
+                line_items=[{
+                    'price_data': {
+                        'currency': 'inr',
+                        'product_data': {
+                            'name': f'Back Campaign: {campaign["title"]}',
+                            'description': f'Supporting {campaign["title"]}',
+                        },
+                        'unit_amount': int(amount * 100),  # Stripe uses paise (smallest unit)
                     },
-                    'unit_amount': int(amount * 100),  # Stripe uses paise (smallest unit)
-                },
-                'quantity': 1,
-            }],
-            mode='payment',
-            success_url=success_url,
-            cancel_url=cancel_url,
-            metadata={
-                "campaign_id": data.campaign_id,
-                "user_id": user.id
-            }
-        )
+                    'quantity': 1,
+                }],
+                mode='payment',
+                success_url=success_url,
+                cancel_url=cancel_url,
+                metadata={
+                    "campaign_id": data.campaign_id,
+                    "user_id": user.id
+                }
+            )
         
         # Save transaction
         transaction = PaymentTransaction(
@@ -1164,6 +1570,8 @@ async def create_checkout(data: PledgeRequest, request: Request):
         await sb_insert("payment_transactions", tx_dict)
         
         return {"url": session.url, "session_id": session.id}
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Payment error: {e}")
         raise HTTPException(500, f"Payment service error: {str(e)}")
@@ -1178,43 +1586,37 @@ async def get_payment_status(session_id: str, request: Request):
         stripe.api_key = os.environ.get('STRIPE_API_KEY')
         
         # Get session status from Stripe
-        session = stripe.checkout.Session.retrieve(session_id)
+        with span("stripe", "checkout.retrieve"):
+            session = stripe.checkout.Session.retrieve(session_id)
         
         # Update transaction
         transaction = await sb_find_one("payment_transactions", {"session_id": session_id})
         if transaction and transaction["payment_status"] != "paid":
             new_status = "paid" if session.payment_status == "paid" else session.status
-            await sb_update(
+            # Compare-and-set on the status we read: when the client polls
+            # twice at once, only one request confirms the payment
+            claimed = await sb_update(
                 "payment_transactions",
-                {"session_id": session_id},
+                {"session_id": session_id, "payment_status": transaction["payment_status"]},
                 {"payment_status": new_status}
             )
             
-            # If paid, update campaign
-            if new_status == "paid":
-                campaign_id = transaction["campaign_id"]
-                campaign = await sb_find_one("campaigns", {"id": campaign_id})
-                if campaign:
-                    await sb_update(
-                        "campaigns",
-                        {"id": campaign_id},
-                        {
-                            "raised_amount": campaign.get("raised_amount", 0) + transaction["amount"],
-                            "backers_count": campaign.get("backers_count", 0) + 1
-                        }
-                    )
-                
-                # Create pledge record
+            # If paid, record the pledge; campaign totals follow in the next counter flush
+            if claimed and new_status == "paid":
                 pledge = Pledge(
-                    campaign_id=campaign_id,
+                    campaign_id=transaction["campaign_id"],
                     user_id=user.id,
                     amount=transaction["amount"],
                     session_id=session_id,
-                    payment_status="paid"
+                    payment_status="paid",
+                    counter_pending=True
                 )
                 pledge_dict = pledge.model_dump()
                 pledge_dict['created_at'] = pledge_dict['created_at'].isoformat()
                 await sb_insert("pledges", pledge_dict)
+                events.emit(events.PLEDGE_CREATED, pledge_dict)
+                if counter_aggregator.record(pledge_dict):
+                    await asyncio.to_thread(counter_aggregator.flush, db)
         
         return {
             "status": session.status,
@@ -1251,27 +1653,87 @@ async def analytics_overview(request: Request):
         raise HTTPException(401, "Not authenticated")
     
     # Get user's campaigns
-    campaigns = await sb_find("campaigns", {"creator_id": user.id}, 1000)
+    campaigns = await sb_find("campaigns", {"creator_id": user.id}, 1000, max_staleness=BROWSING)
+    campaigns = counter_aggregator.merge_all(campaigns)
     
     total_raised = sum(c.get("raised_amount", 0) for c in campaigns)
     total_backers = sum(c.get("backers_count", 0) for c in campaigns)
     active_campaigns = sum(1 for c in campaigns if c.get("status") == "active")
     
-    return {
+    return conditional_json(request, campaigns, {
         "total_campaigns": len(campaigns),
         "active_campaigns": active_campaigns,
         "total_raised": total_raised,
         "total_backers": total_backers,
         "campaigns": campaigns
+    }, scope=(user.id,), private=True)
+
+@api_router.get("/analytics/category-stats")
+async def all_category_stats(request: Request):
+    user = await get_current_user(request)
+    if not user:
+        raise HTTPException(401, "Not authenticated")
+    
+    await ensure_campaign_indexes()
+    return fast_json(list(category_stats.all().values()))
+
+@api_router.get("/analytics/category-stats/{category}")
+async def one_category_stats(category: str, request: Request):
+    user = await get_current_user(request)
+    if not user:
+        raise HTTPException(401, "Not authenticated")
+    
+    stats = await get_category_stats(category)
+    if stats is None:
+        raise HTTPException(404, "Category not found")
+    return fast_json(stats)
+
+def success_rate_label(stats: Optional[dict]) -> str:
+    if not stats or not stats["campaign_count"]:
+        return "No comparable campaigns yet"
+    return f"{stats['success_rate'] * 100:.0f}% success rate ({stats['funded_count']} of {stats['campaign_count']} campaigns funded)"
+
+def market_overview(category: str, stats: Optional[dict], performance: Optional[str] = None) -> dict:
+    """Competitor-analysis market numbers from local category aggregates"""
+    if not stats:
+        return {
+            "category_performance": performance or f"No {category} campaigns on the platform yet.",
+            "average_success_rate": "0.00%",
+            "typical_funding_min": 0,
+            "typical_funding_max": 0
+        }
+    return {
+        "category_performance": performance or describe_category(stats),
+        "average_success_rate": f"{stats['success_rate'] * 100:.2f}%",
+        # "Typical" is the interquartile range of raised amounts
+        "typical_funding_min": stats["funding"]["p25"],
+        "typical_funding_max": stats["funding"]["p75"]
     }
 
+def local_competitors(campaign: dict, candidates: list) -> list:
+    """Competitor entries built from our own campaigns, excluding the one being analysed"""
+    competitors = []
+    for other in candidates:
+        if other["id"] == campaign["id"] or any(c["id"] == other["id"] for c in competitors):
+            continue
+        raised, goal, backers = other.get("raised_amount") or 0, other.get("goal_amount") or 0, other.get("backers_count") or 0
+        funded_pct = raised / goal * 100 if goal else 0
+        competitors.append({
+            "id": other["id"],
+            "name": other["title"],
+            "funding": raised,
+            "description": f"Raised ${raised:,.0f} of a ${goal:,.0f} goal ({funded_pct:.0f}%) from {backers} backers.",
+            "success_factors": f"{funded_pct:.0f}% funded with {backers} backers"
+        })
+    return competitors[:3]
+
 @api_router.get("/analytics/monte-carlo/{campaign_id}")
 async def monte_carlo_simulation(campaign_id: str, request: Request):
     user = await get_current_user(request)
     if not user:
         raise HTTPException(401, "Not authenticated")
     
-    campaign = await sb_find_one("campaigns", {"id": campaign_id})
+    campaign = await sb_find_one("campaigns", {"id": campaign_id}, max_staleness=BROWSING)
     if not campaign:
         raise HTTPException(404, "Campaign not found")
     
@@ -1281,7 +1743,7 @@ async def monte_carlo_simulation(campaign_id: str, request: Request):
     # Monte Carlo simulation parameters
     goal = campaign["goal_amount"]
     current_raised = campaign["raised_amount"]
-    days_remaining = 25
+    days_remaining = lifecycle.days_remaining(campaign)
     
     # Generate three scenarios
     pessimistic = goal * 0.475
@@ -1319,111 +1781,59 @@ async def competitor_analysis(campaign_id: str, request: Request):
     if not user:
         raise HTTPException(401, "Not authenticated")
     
-    campaign = await sb_find_one("campaigns", {"id": campaign_id})
+    campaign = await sb_find_one("campaigns", {"id": campaign_id}, max_staleness=BROWSING)
     if not campaign:
         raise HTTPException(404, "Campaign not found")
     
+    # Market numbers and competitors come from our own campaigns table; the
+    # model only writes the narrative around them.
+    stats = await get_category_stats(campaign['category'])
+    # Closest campaigns by content first, then the category leaders
+    similar = similarity_index.similar(campaign['id'], k=5) or similarity_index.search(campaign, k=5)
+    same_category = [c for c in similar if c["category"] == campaign['category']]
+    competitors = local_competitors(campaign, same_category + (stats or {}).get("top_campaigns", []))
+    
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        prompt = f"""You are analyzing a crowdfunding campaign in the {campaign['category']} category. 
-        Campaign Title: {campaign['title']}
+        competitor_lines = "\n".join(f"- {c['name']}: {c['description']}" for c in competitors) or "- (none yet)"
+        fields = prompts.fit("competitor_analysis", title=campaign['title'], category=campaign['category'],
+                             description=campaign['description'], category_stats=describe_category(stats),
+                             competitors=competitor_lines)
+        prompt = f"""You are analyzing a crowdfunding campaign in the {fields['category']} category. 
+        Campaign Title: {fields['title']}
         Goal: ${campaign['goal_amount']}
-        Description: {campaign['description']}
+        Description: {fields['description']}
         
-        Provide a comprehensive competitor analysis in JSON format with the following structure:
-        {{
-            "market_overview": {{
-                "category_performance": "Detailed text about the category performance",
-                "average_success_rate": "A percentage as a string (e.g., '80.00%')",
-                "typical_funding_min": 50000,
-                "typical_funding_max": 1000000
-            }},
-            "key_trends": [
-                "Trend 1 description",
-                "Trend 2 description",
-                "Trend 3 description"
-            ],
-            "top_competitors": [
-                {{
-                    "name": "Competitor Name",
-                    "funding": 1064708,
-                    "description": "Brief description",
-                    "success_factors": "What made them successful"
-                }}
-            ]
-        }}
-        
-        Make it realistic and specific to the {campaign['category']} category. Provide 3 top competitors with actual realistic names and amounts."""
+        {fields['category_stats']}
         
-        response = model.generate_content(prompt)
+        Closest competing campaigns on our platform:
+        {fields['competitors']}
         
-        # Parse the AI response
-        import json
-        import re
+        Using only the data above, describe how the category performs in two or three
+        sentences, give three key trends, and for each competitor listed (by its exact
+        name) say what made it successful."""
         
-        # Extract JSON from response
-        response_text = response.text
-        json_match = re.search(r'\{[\s\S]*\}', response_text)
-        
-        if json_match:
-            analysis_data = json.loads(json_match.group())
-        else:
-            # Fallback data
-            analysis_data = {
-                "market_overview": {
-                    "category_performance": f"The {campaign['category']} crowdfunding category has seen significant success, with campaigns raising substantial amounts. For instance, campaigns in this category have shown strong community engagement and innovative product offerings.",
-                    "average_success_rate": "80.00%",
-                    "typical_funding_min": 50000,
-                    "typical_funding_max": 1000000
-                },
-                "key_trends": [
-                    "Growing interest in culinary experiences and heritage recipes",
-                    "Increased support for self-published cookbooks",
-                    "Rising demand for culturally diverse and authentic cooking content"
-                ],
-                "top_competitors": [
-                    {
-                        "name": "ASMOKE Essential: Smart Pellet Grill with Unlimited Flavor",
-                        "funding": 1064708,
-                        "description": "Combines traditional grilling with modern technology, offering precise temperature control and app integration.",
-                        "success_factors": "Innovative product offering, Strong community engagement, Effective use of social media marketing"
-                    },
-                    {
-                        "name": "FYR GRILL: The Ultimate Portable Live-Fire Experience",
-                        "funding": 695890,
-                        "description": "Portable design that allows for live-fire cooking anywhere, with modular add-ons for versatility.",
-                        "success_factors": "Unique product concept, Appeal to outdoor enthusiasts, High-quality visuals and demonstrations"
-                    },
-                    {
-                        "name": "BARE 5.0: TwinSteel™ - Premium Knives Without the Premium Price",
-                        "funding": 283946,
-                        "description": "Offers premium knives at an affordable price, utilizing Swedish steel for superior sharpness.",
-                        "success_factors": "High-quality product, Competitive pricing, Strong brand storytelling"
-                    }
-                ]
-            }
+        narrative = generate_structured(CompetitorNarrative, prompt, "competitor_analysis", llm_for(user))
+        factors = {c.name: c.success_factors for c in narrative.competitors}
+        for competitor in competitors:
+            competitor["success_factors"] = factors.get(competitor["name"]) or competitor["success_factors"]
         
-        return analysis_data
+        return {
+            "market_overview": market_overview(campaign['category'], stats, narrative.category_performance),
+            "key_trends": narrative.key_trends,
+            "top_competitors": competitors
+        }
         
     except Exception as e:
         logging.error(f"Competitor analysis error: {e}")
         # Return fallback data
         return {
-            "market_overview": {
-                "category_performance": f"The {campaign['category']} crowdfunding category has seen significant success.",
-                "average_success_rate": "80.00%",
-                "typical_funding_min": 50000,
-                "typical_funding_max": 1000000
-            },
+            "market_overview": market_overview(campaign['category'], stats),
             "key_trends": [
                 "Growing interest in innovative products",
                 "Increased support for creative projects",
                 "Rising demand for quality and authenticity"
             ],
-            "top_competitors": []
+            "top_competitors": competitors
         }
 
 @api_router.get("/analytics/strategic-recommendations/{campaign_id}")
@@ -1432,162 +1842,110 @@ async def strategic_recommendations(campaign_id: str, request: Request):
     if not user:
         raise HTTPException(401, "Not authenticated")
     
-    campaign = await sb_find_one("campaigns", {"id": campaign_id})
+    campaign = await sb_find_one("campaigns", {"id": campaign_id}, max_staleness=BROWSING)
     if not campaign:
         raise HTTPException(404, "Campaign not found")
     
+    stats = await get_category_stats(campaign['category'])
+    category_average = success_rate_label(stats)
+    
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
+        fields = prompts.fit("strategic_recommendations", title=campaign['title'], category=campaign['category'],
+                             description=campaign['description'], category_stats=describe_category(stats))
         prompt = f"""You are providing strategic recommendations for a crowdfunding campaign.
-        Campaign: {campaign['title']}
-        Category: {campaign['category']}
+        Campaign: {fields['title']}
+        Category: {fields['category']}
         Goal: ${campaign['goal_amount']}
         Current Raised: ${campaign['raised_amount']}
-        Description: {campaign['description']}
+        Description: {fields['description']}
         
-        Provide strategic recommendations in JSON format:
-        {{
-            "success_prediction": {{
-                "percentage": 85,
-                "level": "High",
-                "category_average": "65% success rate",
-                "similar_campaigns": "Typically, {campaign['category']}-related campaigns with a personal touch and cultural significance have shown to succeed well, especially those that tell a compelling story."
-            }},
+        {fields['category_stats']}
+        
+        Provide strategic recommendations: a success prediction (percentage, level and how
+        similar campaigns fared), 3 success factors, 3 risk factors, up to 4 prioritised
+        action recommendations, and strategic recommendations for Product Offering,
+        Pricing Strategy (with 3-4 suggested reward tiers), Marketing Tactics and
+        Community Engagement.
+        
+        Ground the prediction in the platform data above. Make it specific and actionable for this campaign."""
+        
+        recommendations = generate_structured(StrategicRecommendationsOutput, prompt, "strategic_recommendations",
+                                              llm_for(user)).model_dump()
+        # The category figure is measured, not something the model gets to guess
+        recommendations["success_prediction"]["category_average"] = category_average
+        return recommendations
+        
+    except StructuredOutputError:
+        # Fallback
+        current_percentage = (campaign['raised_amount'] / campaign['goal_amount']) * 100
+        return {
+            "success_prediction": {
+                "percentage": min(95, max(70, int(current_percentage + 20))),
+                "level": "High" if current_percentage > 50 else "Medium",
+                "category_average": category_average,
+                "similar_campaigns": f"Typically, {campaign['category']}-related campaigns with a personal touch have shown to succeed well."
+            },
             "success_factors": [
-                "Factor 1",
-                "Factor 2",
-                "Factor 3"
+                f"Already surpassed funding goal by ${campaign['raised_amount'] - campaign['goal_amount']}" if campaign['raised_amount'] > campaign['goal_amount'] else "Strong initial backing",
+                "Well-defined niche focused on heritage and family recipes",
+                "Attractive and professional campaign presentation"
             ],
             "risk_factors": [
-                "Risk 1",
-                "Risk 2",
-                "Risk 3"
+                f"Potential saturation in the {campaign['category']} market",
+                "Seasonality of food-related campaigns",
+                "High competition from similar successful projects"
             ],
             "action_recommendations": [
-                {{
-                    "title": "Action title",
-                    "description": "Detailed description",
+                {
+                    "title": "Promote on social media platforms to maintain momentum",
+                    "description": "Increased visibility and potential backers",
                     "priority": "High"
-                }}
+                },
+                {
+                    "title": "Consider stretch goals to incentivize additional funding",
+                    "description": "Encourage backers to contribute more as campaign already exceeded initial goal",
+                    "priority": "Medium"
+                },
+                {
+                    "title": "Engage backers with updates about the cookbook process and additional content",
+                    "description": "Build community interest and increase shareability of the campaign",
+                    "priority": "Medium"
+                },
+                {
+                    "title": "Collaborate with food influencers for greater outreach",
+                    "description": "Enhance credibility and attract more backers through social proof",
+                    "priority": "Low"
+                }
             ],
             "strategic_recommendations": [
-                {{
+                {
                     "category": "Product Offering",
                     "priority": "High",
-                    "description": "Recommendation description"
-                }},
-                {{
+                    "description": "Highlight the unique cultural stories and modern adaptations accompanying each recipe to differentiate the cookbook."
+                },
+                {
                     "category": "Pricing Strategy",
                     "priority": "High",
-                    "description": "Recommendation with reward tiers",
+                    "description": "Implement tiered pricing with early bird discounts to encourage prompt support and reward higher pledges with exclusive content.",
                     "reward_tiers": [
-                        {{"amount": 25, "description": "Digital copy of the cookbook"}},
-                        {{"amount": 50, "description": "Physical copy of the cookbook"}},
-                        {{"amount": 100, "description": "Signed copy with exclusive recipes"}},
-                        {{"amount": 200, "description": "Bundle with additional cooking tools or merchandise"}}
+                        {"amount": 25, "description": "Digital copy of the cookbook"},
+                        {"amount": 50, "description": "Physical copy of the cookbook"},
+                        {"amount": 100, "description": "Signed copy with exclusive recipes"},
+                        {"amount": 200, "description": "Bundle with additional cooking tools or merchandise"}
                     ]
-                }},
-                {{
+                },
+                {
                     "category": "Marketing Tactics",
                     "priority": "Medium",
-                    "description": "Marketing recommendation"
-                }},
-                {{
+                    "description": "Collaborate with food bloggers and influencers to review and promote the cookbook, leveraging their established audiences."
+                },
+                {
                     "category": "Community Engagement",
                     "priority": "Medium",
-                    "description": "Community engagement recommendation"
-                }}
+                    "description": "Create a campaign hashtag and encourage backers to share their own family recipes and stories, fostering a sense of community."
+                }
             ]
-        }}
-        
-        Make it specific and actionable for this campaign."""
-        
-        response = model.generate_content(prompt)
-        
-        import json
-        import re
-        
-        response_text = response.text
-        json_match = re.search(r'\{[\s\S]*\}', response_text)
-        
-        if json_match:
-            recommendations = json.loads(json_match.group())
-        else:
-            # Fallback
-            current_percentage = (campaign['raised_amount'] / campaign['goal_amount']) * 100
-            recommendations = {
-                "success_prediction": {
-                    "percentage": min(95, max(70, int(current_percentage + 20))),
-                    "level": "High" if current_percentage > 50 else "Medium",
-                    "category_average": "65% success rate",
-                    "similar_campaigns": f"Typically, {campaign['category']}-related campaigns with a personal touch have shown to succeed well."
-                },
-                "success_factors": [
-                    f"Already surpassed funding goal by ${campaign['raised_amount'] - campaign['goal_amount']}" if campaign['raised_amount'] > campaign['goal_amount'] else "Strong initial backing",
-                    "Well-defined niche focused on heritage and family recipes",
-                    "Attractive and professional campaign presentation"
-                ],
-                "risk_factors": [
-                    f"Potential saturation in the {campaign['category']} market",
-                    "Seasonality of food-related campaigns",
-                    "High competition from similar successful projects"
-                ],
-                "action_recommendations": [
-                    {
-                        "title": "Promote on social media platforms to maintain momentum",
-                        "description": "Increased visibility and potential backers",
-                        "priority": "High"
-                    },
-                    {
-                        "title": "Consider stretch goals to incentivize additional funding",
-                        "description": "Encourage backers to contribute more as campaign already exceeded initial goal",
-                        "priority": "Medium"
-                    },
-                    {
-                        "title": "Engage backers with updates about the cookbook process and additional content",
-                        "description": "Build community interest and increase shareability of the campaign",
-                        "priority": "Medium"
-                    },
-                    {
-                        "title": "Collaborate with food influencers for greater outreach",
-                        "description": "Enhance credibility and attract more backers through social proof",
-                        "priority": "Low"
-                    }
-                ],
-                "strategic_recommendations": [
-                    {
-                        "category": "Product Offering",
-                        "priority": "High",
-                        "description": "Highlight the unique cultural stories and modern adaptations accompanying each recipe to differentiate the cookbook."
-                    },
-                    {
-                        "category": "Pricing Strategy",
-                        "priority": "High",
-                        "description": "Implement tiered pricing with early bird discounts to encourage prompt support and reward higher pledges with exclusive content.",
-                        "reward_tiers": [
-                            {"amount": 25, "description": "Digital copy of the cookbook"},
-                            {"amount": 50, "description": "Physical copy of the cookbook"},
-                            {"amount": 100, "description": "Signed copy with exclusive recipes"},
-                            {"amount": 200, "description": "Bundle with additional cooking tools or merchandise"}
-                        ]
-                    },
-                    {
-                        "category": "Marketing Tactics",
-                        "priority": "Medium",
-                        "description": "Collaborate with food bloggers and influencers to review and promote the cookbook, leveraging their established audiences."
-                    },
-                    {
-                        "category": "Community Engagement",
-                        "priority": "Medium",
-                        "description": "Create a campaign hashtag and encourage backers to share their own family recipes and stories, fostering a sense of community."
-                    }
-                ]
-            }
-        
-        return recommendations
+        }
         
     except Exception as e:
         logging.error(f"Strategic recommendations error: {e}")
@@ -1596,7 +1954,7 @@ async def strategic_recommendations(campaign_id: str, request: Request):
             "success_prediction": {
                 "percentage": min(95, max(70, int(current_percentage + 20))),
                 "level": "High",
-                "category_average": "65% success rate",
+                "category_average": category_average,
                 "similar_campaigns": "Campaigns with strong narratives tend to perform well."
             },
             "success_factors": ["Strong backing", "Good presentation"],
@@ -1605,24 +1963,60 @@ async def strategic_recommendations(campaign_id: str, request: Request):
             "strategic_recommendations": []
         }
 
+# ============ HEALTH & METRICS ============
+
+@api_router.get("/health")
+async def health():
+    """Liveness: the worker is up and serving requests"""
+    return {"status": "ok"}
+
+@api_router.get("/health/ready")
+async def health_ready(request: Request):
+    """Readiness: startup finished and the storage backend is reachable"""
+    ready = getattr(request.app.state, "ready", False)
+    if not ready:
+        # Re-probe so a worker recovers once the backend comes back
+        ready = request.app.state.ready = await check_readiness()
+    if not ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready", "backend": db.name}
+
+@api_router.get("/metrics")
+async def metrics():
+    """Prometheus-style histograms and counters for this worker"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Include router
 app.include_router(api_router)
 
+# Innermost, so a profiled request covers the handler and not the time spent queued for admission
+app.add_middleware(profiling.ProfilingMiddleware, profiler=cpu_profiler)
+
+# Admission control sits inside CORS so 429/503 responses still carry CORS headers
+admission = controller_from_env()
+admission.resolve_user = resolve_session_user
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
+# Outside admission control, so replaying a stored response costs no rate-limit budget or LLM slot
+# (admission control's 429s are never stored, see idempotency.TRANSIENT_STATUSES)
+idempotency_store = idempotency_store_from_env()
+app.add_middleware(IdempotencyMiddleware, store=idempotency_store,
+                   enabled=os.environ.get("IDEMPOTENCY_ENABLED", "1") == "1")
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "Retry-After", "Idempotent-Replayed"],
 )
 
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+app.add_middleware(ServerTimingMiddleware)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    # Supabase client doesn't need explicit closing
-    pass
@@ -0,0 +1,87 @@
+"""
+user_sessions lifecycle.
+
+Every sign-in path (register, login, Google OAuth) creates its session
+through create_session(), which keeps at most MAX_SESSIONS_PER_USER live
+sessions per user, evicting the oldest first. Expired rows are removed by
+run_sweeper(), a background task started from the lifespan hook that
+deletes them in batches of SWEEP_BATCH_SIZE so no single statement holds
+locks on a large slice of the table.
+
+Functions take the StorageBackend explicitly; server.py passes its `db`.
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from datastore import StorageBackend
+from instrumentation import db_span
+
+SESSION_TTL = timedelta(days=int(os.environ.get("SESSION_TTL_DAYS", "7")))
+MAX_SESSIONS_PER_USER = int(os.environ.get("MAX_SESSIONS_PER_USER", "10"))
+SWEEP_INTERVAL_SECONDS = float(os.environ.get("SESSION_SWEEP_INTERVAL_SECONDS", "600"))
+SWEEP_BATCH_SIZE = int(os.environ.get("SESSION_SWEEP_BATCH_SIZE", "500"))
+
+logger = logging.getLogger(__name__)
+
+
+def create_session(db: StorageBackend, user_id: str, max_sessions: Optional[int] = None) -> dict:
+    """Insert a new session for `user_id`, evicting the oldest beyond the cap"""
+    now = datetime.now(timezone.utc)
+    max_sessions = max(max_sessions or MAX_SESSIONS_PER_USER, 1)
+    with db_span("user_sessions", "find"):
+        existing = db.find("user_sessions", {"user_id": user_id}, limit=max_sessions + 100, order="-created_at")
+    surplus = [s["session_token"] for s in existing[max_sessions - 1:]]
+    if surplus:
+        with db_span("user_sessions", "delete"):
+            db.delete("user_sessions", {"session_token": {"$in": surplus}})
+
+    session = {
+        "session_token": str(uuid.uuid4()),
+        "user_id": user_id,
+        "expires_at": (now + SESSION_TTL).isoformat(),
+        "created_at": now.isoformat(),
+    }
+    with db_span("user_sessions", "insert"):
+        db.insert("user_sessions", [session])
+    return session
+
+
+def revoke_session(db: StorageBackend, session_token: str):
+    with db_span("user_sessions", "delete"):
+        db.delete("user_sessions", {"session_token": session_token})
+
+
+def sweep_expired(db: StorageBackend, batch_size: int = SWEEP_BATCH_SIZE, now: Optional[datetime] = None) -> int:
+    """Delete expired sessions in batches; returns the number removed"""
+    cutoff = (now or datetime.now(timezone.utc)).isoformat()
+    removed = 0
+    while True:
+        with db_span("user_sessions", "find"):
+            expired = db.find("user_sessions", {"expires_at": {"$lt": cutoff}}, limit=batch_size,
+                              order="expires_at")
+        if not expired:
+            break
+        with db_span("user_sessions", "delete"):
+            db.delete("user_sessions", {"session_token": {"$in": [s["session_token"] for s in expired]}})
+        removed += len(expired)
+        if len(expired) < batch_size:
+            break
+    return removed
+
+
+async def run_sweeper(get_db: Callable[[], StorageBackend], interval: float = SWEEP_INTERVAL_SECONDS):
+    """Sweep forever; the first run is jittered so workers don't sweep in lockstep"""
+    await asyncio.sleep(random.uniform(0, interval))
+    while True:
+        try:
+            removed = await asyncio.to_thread(sweep_expired, get_db())
+            if removed:
+                logger.info(f"Session sweeper removed {removed} expired sessions")
+        except Exception as e:
+            logger.error(f"Session sweep failed: {e}")
+        await asyncio.sleep(interval)
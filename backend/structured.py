@@ -0,0 +1,92 @@
+"""
+Structured generation: Gemini JSON mode with a response schema derived from
+a pydantic model, and validated parsing.
+
+compact_schema() reduces pydantic's JSON Schema to the subset Gemini's
+Schema proto accepts (type, properties, required, items, enum, nullable,
+min/max_items), inlining $refs and dropping titles and defaults so the
+schema stays small. With the schema constraining the output, prompts no
+longer need verbose example JSON, and the model can't wrap its answer in
+prose or markdown fences.
+
+generate_structured() retries only when the output fails to parse or
+validate. Transport and quota errors propagate on the first attempt,
+because retrying them just burns another generation.
+"""
+import functools
+import json
+import logging
+from typing import Callable, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from instrumentation import LLM_SCHEMA_FAILURES
+
+T = TypeVar("T", bound=BaseModel)
+
+logger = logging.getLogger(__name__)
+
+_KEEP = ("type", "format", "description", "enum", "required")
+
+
+class StructuredOutputError(Exception):
+    """The model's output still didn't match the schema after all retries"""
+
+
+def _compact(node: dict, defs: dict) -> dict:
+    if "$ref" in node:
+        return _compact(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+    if "anyOf" in node:
+        # Optional[X] -> X with nullable
+        options = [o for o in node["anyOf"] if o.get("type") != "null"]
+        compact = _compact(options[0], defs)
+        if len(options) < len(node["anyOf"]):
+            compact["nullable"] = True
+        return compact
+    if "const" in node:
+        node = {**node, "enum": [node["const"]]}
+    if "enum" in node and "type" not in node:
+        node = {**node, "type": "string"}
+
+    compact = {key: node[key] for key in _KEEP if key in node}
+    if "properties" in node:
+        compact["properties"] = {name: _compact(child, defs) for name, child in node["properties"].items()}
+    if "items" in node:
+        compact["items"] = _compact(node["items"], defs)
+    if "minItems" in node:
+        compact["min_items"] = node["minItems"]
+    if "maxItems" in node:
+        compact["max_items"] = node["maxItems"]
+    return compact
+
+
+@functools.lru_cache(maxsize=None)
+def compact_schema(model: Type[BaseModel]) -> dict:
+    """Gemini response_schema for a pydantic model"""
+    schema = model.model_json_schema()
+    return _compact(schema, schema.get("$defs", {}))
+
+
+def generation_config(model: Type[BaseModel]) -> dict:
+    return {"response_mime_type": "application/json", "response_schema": compact_schema(model)}
+
+
+def parse(model: Type[T], text: str) -> T:
+    """Validate raw model output; raises ValueError/ValidationError on mismatch"""
+    return model.model_validate(json.loads(text))
+
+
+def generate_structured(model: Type[T], prompt: str, endpoint: str, generate: Callable, retries: int = 1) -> T:
+    """Generate and validate `model`; `generate(prompt, endpoint, generation_config)` makes the call"""
+    config = generation_config(model)
+    attempt_prompt = prompt
+    for attempt in range(retries + 1):
+        response = generate(attempt_prompt, endpoint, config)
+        try:
+            return parse(model, response.text)
+        except (ValueError, ValidationError) as e:
+            LLM_SCHEMA_FAILURES.inc(endpoint=endpoint)
+            logger.warning(f"{endpoint}: output failed schema validation (attempt {attempt + 1}): {e}")
+            error = str(e).splitlines()[0][:200]
+            attempt_prompt = f"{prompt}\n\nYour previous answer was invalid ({error}). Return only JSON matching the schema."
+    raise StructuredOutputError(f"{endpoint}: no schema-valid output after {retries + 1} attempts")
@@ -0,0 +1,10 @@
+// One Idempotency-Key per user action (see backend/idempotency.py). Double
+// submits and retries after a network error reuse the key, so the server runs
+// the action once; once a response arrives the action is settled and the
+// next attempt gets a fresh key.
+export const newIdempotencyKey = () =>
+  window.crypto?.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+export const idempotencyHeaders = (key) => ({ headers: { 'Idempotency-Key': key } });
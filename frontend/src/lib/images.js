@@ -0,0 +1,28 @@
+const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
+
+const PLACEHOLDER = 'https://images.unsplash.com/photo-1557804506-669a67965ba0?w=800&h=600&fit=crop';
+
+// Short stable hash of the source URL: the proxy serves `v`-tagged
+// renditions as immutable, and a new image_url gets a new `v`.
+const urlVersion = (url) => {
+  let hash = 5381;
+  for (let i = 0; i < url.length; i++) {
+    hash = ((hash * 33) ^ url.charCodeAt(i)) >>> 0;
+  }
+  return hash.toString(36);
+};
+
+// Resized campaign image from the backend proxy (size: thumb | card | hero)
+export const campaignImageSrc = (campaign, size = 'card') => {
+  if (!campaign.image_url) return PLACEHOLDER;
+  return `${API}/images/${campaign.id}?size=${size}&v=${urlVersion(campaign.image_url)}`;
+};
+
+// If the proxy can't serve an image, fall back to the original URL once
+export const fallbackToOriginal = (campaign) => (event) => {
+  const img = event.currentTarget;
+  if (!img.dataset.fallback) {
+    img.dataset.fallback = 'original';
+    img.src = campaign.image_url || PLACEHOLDER;
+  }
+};
@@ -2,7 +2,9 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { Button } from '../components/ui/button';
-import { TrendingUp, Users, Target, DollarSign } from 'lucide-react';
+import { Input } from '../components/ui/input';
+import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
+import { TrendingUp, Users, Target, DollarSign, Search } from 'lucide-react';
 import { toast } from 'sonner';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -12,6 +14,10 @@ const AdminDashboard = () => {
   const navigate = useNavigate();
   const [campaigns, setCampaigns] = useState([]);
   const [users, setUsers] = useState([]);
+  const [userCounts, setUserCounts] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [userSearch, setUserSearch] = useState('');
+  const [searchBy, setSearchBy] = useState('email');
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
 
@@ -19,6 +25,28 @@ const AdminDashboard = () => {
     fetchAdminData();
   }, []);
 
+  // Search runs server-side; wait for typing to settle before asking
+  useEffect(() => {
+    const timer = setTimeout(() => fetchUsers(), 300);
+    return () => clearTimeout(timer);
+  }, [userSearch, searchBy]);
+
+  const fetchUsers = async (cursor = null) => {
+    try {
+      const params = { limit: 50, search_by: searchBy };
+      if (userSearch.trim()) params.search = userSearch.trim();
+      if (cursor) params.cursor = cursor;
+      const usersResp = await axios.get(`${API}/admin/users`, { params });
+      setUsers(cursor ? [...users, ...usersResp.data.users] : usersResp.data.users);
+      setNextCursor(usersResp.data.next_cursor);
+      // Counts only come with the first page
+      if (usersResp.data.counts) setUserCounts(usersResp.data.counts);
+    } catch (err) {
+      console.error('Failed to load users:', err);
+      if (!cursor) setUsers([]);
+    }
+  };
+
   const fetchAdminData = async () => {
     try {
       const [campaignsResp, statsResp] = await Promise.all([
@@ -28,15 +56,6 @@ const AdminDashboard = () => {
       
       setCampaigns(campaignsResp.data);
       setStats(statsResp.data);
-      
-      // Fetch all users (we'll add an endpoint for this)
-      try {
-        const usersResp = await axios.get(`${API}/admin/users`);
-        setUsers(usersResp.data);
-      } catch (err) {
-        console.error('Failed to load users:', err);
-        setUsers([]);
-      }
     } catch (error) {
       toast.error('Failed to load admin data');
       if (error.response?.status === 403) {
@@ -190,10 +209,34 @@ const AdminDashboard = () => {
         </div>
 
         {/* Users Table */}
-        {users.length > 0 && (
+        {userCounts && (
           <div className="bg-slate-800/30 border border-slate-700 rounded-2xl overflow-hidden mt-8">
-            <div className="p-6 border-b border-slate-700">
-              <h2 className="text-2xl font-bold">All Users</h2>
+            <div className="p-6 border-b border-slate-700 flex flex-col md:flex-row md:items-center gap-4">
+              <div className="flex-1">
+                <h2 className="text-2xl font-bold">All Users</h2>
+                <p className="text-sm text-slate-400">
+                  {userCounts.matching} of {userCounts.total} users · {userCounts.admins} admins
+                </p>
+              </div>
+              <div className="relative md:w-72">
+                <Search className="absolute left-4 top-1/2 transform -translate-y-1/2 text-slate-400 w-5 h-5" />
+                <Input
+                  placeholder={searchBy === 'email' ? 'Email starts with...' : 'Name starts with...'}
+                  value={userSearch}
+                  onChange={(e) => setUserSearch(e.target.value)}
+                  className="pl-12 bg-slate-800/50 border-slate-700 h-12"
+                  data-testid="admin-user-search"
+                />
+              </div>
+              <Select value={searchBy} onValueChange={setSearchBy}>
+                <SelectTrigger className="w-full md:w-36 bg-slate-800/50 border-slate-700 h-12" data-testid="admin-user-search-by">
+                  <SelectValue />
+                </SelectTrigger>
+                <SelectContent className="bg-[#0f172a] border-slate-700">
+                  <SelectItem value="email">Email</SelectItem>
+                  <SelectItem value="name">Name</SelectItem>
+                </SelectContent>
+              </Select>
             </div>
             
             <div className="overflow-x-auto">
@@ -233,6 +276,14 @@ const AdminDashboard = () => {
                 </tbody>
               </table>
             </div>
+
+            {nextCursor && (
+              <div className="p-6 border-t border-slate-700 text-center">
+                <Button variant="outline" onClick={() => fetchUsers(nextCursor)} data-testid="admin-users-load-more">
+                  Load more
+                </Button>
+              </div>
+            )}
           </div>
         )}
       </div>
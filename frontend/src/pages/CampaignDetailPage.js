@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useContext } from 'react';
+import React, { useState, useEffect, useContext, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { AuthContext } from '../App';
@@ -7,6 +7,8 @@ import { Textarea } from '../components/ui/textarea';
 import { Avatar, AvatarFallback } from '../components/ui/avatar';
 import { Sparkles, Users, TrendingUp, MessageSquare } from 'lucide-react';
 import { toast } from 'sonner';
+import { campaignImageSrc, fallbackToOriginal } from '../lib/images';
+import { idempotencyHeaders, newIdempotencyKey } from '../lib/idempotency';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -17,6 +19,8 @@ const CampaignDetailPage = () => {
   const navigate = useNavigate();
   const [campaign, setCampaign] = useState(null);
   const [analysis, setAnalysis] = useState(null);
+  const checkoutKey = useRef(newIdempotencyKey());
+  const commentKey = useRef(newIdempotencyKey());
   const [comments, setComments] = useState([]);
   const [newComment, setNewComment] = useState('');
   const [loading, setLoading] = useState(true);
@@ -91,11 +95,12 @@ const CampaignDetailPage = () => {
       const response = await axios.post(`${API}/payments/create-checkout`, {
         campaign_id: id,
         origin_url: originUrl
-      });
+      }, idempotencyHeaders(checkoutKey.current));
       
       // Redirect to Stripe checkout
       window.location.href = response.data.url;
     } catch (error) {
+      if (error.response) checkoutKey.current = newIdempotencyKey();
       toast.error('Failed to initiate payment');
       setPledging(false);
     }
@@ -112,12 +117,14 @@ const CampaignDetailPage = () => {
     try {
       const response = await axios.post(`${API}/campaigns/${id}/comments`, {
         content: newComment
-      });
+      }, idempotencyHeaders(commentKey.current));
       
+      commentKey.current = newIdempotencyKey();
       setComments([response.data, ...comments]);
       setNewComment('');
       toast.success('Comment posted!');
     } catch (error) {
+      if (error.response) commentKey.current = newIdempotencyKey();
       toast.error('Failed to post comment');
     }
   };
@@ -143,7 +150,8 @@ const CampaignDetailPage = () => {
             {/* Campaign Image */}
             <div className="relative rounded-2xl overflow-hidden">
               <img 
-                src={campaign.image_url || 'https://images.unsplash.com/photo-1557804506-669a67965ba0?w=1200&h=600&fit=crop'}
+                src={campaignImageSrc(campaign, 'hero')}
+                onError={fallbackToOriginal(campaign)}
                 alt={campaign.title}
                 className="w-full h-96 object-cover"
               />
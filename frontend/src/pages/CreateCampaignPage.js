@@ -1,4 +1,4 @@
-import React, { useState, useContext } from 'react';
+import React, { useState, useContext, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { AuthContext } from '../App';
 import axiosInstance from '../utils/axios';
@@ -10,12 +10,14 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '.
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '../components/ui/card';
 import { Sparkles, TrendingUp, Lightbulb, Target, Check } from 'lucide-react';
 import { toast } from 'sonner';
+import { idempotencyHeaders, newIdempotencyKey } from '../lib/idempotency';
 
 const CreateCampaignPage = () => {
   const navigate = useNavigate();
   const { user } = useContext(AuthContext);
   const [currentStep, setCurrentStep] = useState(1);
   const [loading, setLoading] = useState(false);
+  const submitKey = useRef(newIdempotencyKey());
   
   // Step 1: Campaign Basics
   const [campaignData, setCampaignData] = useState({
@@ -181,10 +183,11 @@ const CreateCampaignPage = () => {
         image_url: campaignData.image_url || null
       };
 
-      const response = await axiosInstance.post('/campaigns/extended', payload);
+      const response = await axiosInstance.post('/campaigns/extended', payload, idempotencyHeaders(submitKey.current));
       toast.success('Campaign created successfully!');
       navigate(`/campaign/${response.data.id}`);
     } catch (error) {
+      if (error.response) submitKey.current = newIdempotencyKey();
       toast.error(error.response?.data?.detail || 'Failed to create campaign');
     } finally {
       setLoading(false);
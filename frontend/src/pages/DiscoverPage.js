@@ -6,6 +6,7 @@ import { Input } from '../components/ui/input';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
 import { Search, Sparkles } from 'lucide-react';
 import { toast } from 'sonner';
+import { campaignImageSrc, fallbackToOriginal } from '../lib/images';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -22,7 +23,9 @@ const CampaignCard = ({ campaign, analysis }) => {
     >
       <div className="relative">
         <img 
-          src={campaign.image_url || 'https://images.unsplash.com/photo-1557804506-669a67965ba0?w=800&h=600&fit=crop'} 
+          src={campaignImageSrc(campaign, 'card')}
+          onError={fallbackToOriginal(campaign)}
+          loading="lazy"
           alt={campaign.title}
           className="w-full h-56 object-cover"
         />
@@ -79,14 +82,19 @@ const DiscoverPage = () => {
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
   const [selectedCategory, setSelectedCategory] = useState('all');
+  const [sortBy, setSortBy] = useState('all');
 
   useEffect(() => {
     fetchCampaigns();
-  }, []);
+  }, [sortBy]);
 
   const fetchCampaigns = async () => {
+    setLoading(true);
     try {
-      const response = await axios.get(`${API}/campaigns`);
+      // Ranked views come pre-sorted from the feed endpoint
+      const response = sortBy === 'all'
+        ? await axios.get(`${API}/campaigns`)
+        : await axios.get(`${API}/feeds/${sortBy}`, { params: { limit: 50 } });
       setCampaigns(response.data);
       
       // Fetch AI analyses for each campaign
@@ -151,6 +159,17 @@ const DiscoverPage = () => {
               ))}
             </SelectContent>
           </Select>
+          <Select value={sortBy} onValueChange={setSortBy}>
+            <SelectTrigger className="w-full md:w-48 bg-slate-800/50 border-slate-700 h-12" data-testid="feed-filter">
+              <SelectValue placeholder="All Campaigns" />
+            </SelectTrigger>
+            <SelectContent className="bg-[#0f172a] border-slate-700">
+              <SelectItem value="all">All Campaigns</SelectItem>
+              <SelectItem value="trending">Trending</SelectItem>
+              <SelectItem value="nearly_funded">Nearly Funded</SelectItem>
+              <SelectItem value="newest">Newest</SelectItem>
+            </SelectContent>
+          </Select>
         </div>
 
         {/* Campaigns Grid */}
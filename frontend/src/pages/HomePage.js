@@ -4,6 +4,7 @@ import { AuthContext } from '../App';
 import axios from 'axios';
 import { Button } from '../components/ui/button';
 import { Sparkles, TrendingUp, Users } from 'lucide-react';
+import { campaignImageSrc, fallbackToOriginal } from '../lib/images';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -16,7 +17,9 @@ const CampaignCard = ({ campaign }) => {
     <div className="bg-[#0f172a] border border-slate-700 rounded-2xl overflow-hidden hover:border-purple-500/30 transition-all group">
       <div className="relative">
         <img
-          src={campaign.image_url || 'https://images.unsplash.com/photo-1557804506-669a67965ba0?w=800&h=600&fit=crop'}
+          src={campaignImageSrc(campaign, 'card')}
+          onError={fallbackToOriginal(campaign)}
+          loading="lazy"
           alt={campaign.title}
           className="w-full h-56 object-cover"
         />
@@ -77,8 +80,9 @@ const HomePage = () => {
 
   const fetchCampaigns = async () => {
     try {
-      const response = await axios.get(`${API}/campaigns`);
-      setCampaigns(response.data.slice(0, 6)); // Show first 6 campaigns
+      // Ranked server-side; only the 6 cards we show are transferred
+      const response = await axios.get(`${API}/feeds/trending`, { params: { limit: 6 } });
+      setCampaigns(response.data);
     } catch (error) {
       console.error('Failed to fetch campaigns');
     } finally {
@@ -4,6 +4,7 @@ import axios from 'axios';
 import { Button } from '../components/ui/button';
 import { Sparkles, TrendingUp } from 'lucide-react';
 import { toast } from 'sonner';
+import { campaignImageSrc, fallbackToOriginal } from '../lib/images';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -72,7 +73,9 @@ const MyCampaignsPage = () => {
               return (
                 <div key={campaign.id} className="bg-slate-800/30 border border-slate-700 rounded-2xl overflow-hidden" data-testid={`my-campaign-card-${campaign.id}`}>
                   <img
-                    src={campaign.image_url || 'https://images.unsplash.com/photo-1557804506-669a67965ba0?w=800&h=600&fit=crop'}
+                    src={campaignImageSrc(campaign, 'card')}
+                    onError={fallbackToOriginal(campaign)}
+                    loading="lazy"
                     alt={campaign.title}
                     className="w-full h-48 object-cover"
                   />
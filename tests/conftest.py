@@ -0,0 +1,39 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ["DATA_BACKEND"] = "memory"
+
+
+@pytest.fixture(scope="session")
+def seed():
+    """Small synthetic dataset; user 0 is an admin. MemoryBackend copies rows, so sharing it is safe."""
+    from benchmarks import synthetic
+
+    return synthetic.generate(users=5, campaigns=20, comments_per_campaign=2, pledges_per_campaign=1)
+
+
+@pytest.fixture
+def server(seed):
+    """server.py running on a seeded MemoryBackend with Gemini and Stripe faked out"""
+    import server as server_module
+    from benchmarks import fakes
+
+    fakes.install_fakes(server_module, seed)
+    server_module.admission.reset()
+    server_module.llm_usage.LEDGER.reset()
+    server_module.counter_aggregator.reset()
+    server_module.idempotency_store.reset()
+    return server_module
+
+
+@pytest.fixture
+def client(server):
+    from fastapi.testclient import TestClient
+
+    with TestClient(server.app) as test_client:
+        yield test_client
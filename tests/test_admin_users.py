@@ -0,0 +1,46 @@
+from datastore import MemoryBackend
+
+
+def _auth(seed, admin=True):
+    user = next(u for u in seed["users"] if u["is_admin"] == admin)
+    token = next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == user["id"])
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_pages_cover_every_user_without_password_hashes(client, seed):
+    headers = _auth(seed)
+    first = client.get("/api/admin/users?limit=2", headers=headers).json()
+    assert first["counts"] == {"total": len(seed["users"]), "matching": len(seed["users"]),
+                               "admins": sum(u["is_admin"] for u in seed["users"])}
+
+    emails, page = [], first
+    while True:
+        assert all("password_hash" not in u for u in page["users"])
+        emails += [u["email"] for u in page["users"]]
+        if not page["next_cursor"]:
+            break
+        page = client.get(f"/api/admin/users?limit=2&cursor={page['next_cursor']}", headers=headers).json()
+        assert page["counts"] is None
+    assert emails == sorted(u["email"] for u in seed["users"])
+
+    assert client.get("/api/admin/users?cursor=garbage", headers=headers).status_code == 400
+    assert client.get("/api/admin/users", headers=_auth(seed, admin=False)).status_code == 403
+
+
+def test_prefix_search(client, seed):
+    target = seed["users"][3]
+    response = client.get("/api/admin/users", headers=_auth(seed),
+                          params={"search": target["email"][:6].upper(), "search_by": "email"}).json()
+    assert target["email"] in [u["email"] for u in response["users"]]
+    assert all(u["email"].lower().startswith(target["email"][:6].lower()) for u in response["users"])
+    assert response["counts"]["matching"] == len(response["users"])
+
+
+def test_memory_backend_prefix_count_and_projection():
+    db = MemoryBackend({"users": [{"id": "1", "email": "ann@x.test", "name": "Ann", "password_hash": "h"},
+                                  {"id": "2", "email": "andy@x.test", "name": "Andy", "password_hash": "h"},
+                                  {"id": "3", "email": "bob@x.test", "name": "Bob", "password_hash": "h"}]})
+    assert db.count("users", {"name": {"$prefix": "an"}}) == 2
+    assert db.count("users") == 3
+    rows = db.find("users", {"email": {"$prefix": "a", "$gt": "andy@x.test"}}, order="email", columns=["id", "email"])
+    assert rows == [{"id": "1", "email": "ann@x.test"}]
@@ -0,0 +1,83 @@
+import pytest
+
+from appends import AppendQueue
+from benchmarks.fakes import LatencyBackend
+from datastore import MemoryBackend
+from instrumentation import render_metrics
+
+
+def _comment(i, campaign_id="c1"):
+    return {"id": f"m{i}", "campaign_id": campaign_id, "content": f"comment {i}"}
+
+
+def test_rows_are_inserted_in_batches_and_visible_while_queued(tmp_path):
+    db = LatencyBackend(MemoryBackend())
+    queue = AppendQueue("comments", tmp_path, batch_size=3)
+    for i in range(7):
+        queue.append(_comment(i, campaign_id="c1" if i % 2 else "c2"))
+
+    assert [r["id"] for r in queue.pending({"campaign_id": "c1"})] == ["m1", "m3", "m5"]
+    assert queue.flush(db) == 7
+    assert db.calls == 3
+    assert queue.pending() == [] and len(db.find("comments")) == 7
+    assert list(tmp_path.glob("*.spool")) == [queue._spool.path]
+
+
+def test_failed_batches_keep_good_rows_and_requeue_on_outage(tmp_path):
+    db = MemoryBackend({"comments": [_comment(1)]})
+    queue = AppendQueue("comments", tmp_path)
+    for i in range(3):
+        queue.append(_comment(i))
+    # m1 already exists: only that row is rejected, and it is dead-lettered rather than dropped
+    assert queue.flush(db) == 2
+    assert sorted(r["id"] for r in db.find("comments")) == ["m0", "m1", "m2"]
+    assert queue._dead.path.read_text().count('"m1"') == 1
+    assert 'append_dead_letters_total{table="comments"}' in render_metrics()
+
+    def unavailable(*args):
+        raise ConnectionError("database unavailable")
+
+    queue.append(_comment(3))
+    insert, db.insert = db.insert, unavailable
+    with pytest.raises(ConnectionError):
+        queue.flush(db)
+    assert [r["id"] for r in queue.pending()] == ["m3"]
+    db.insert = insert
+    assert queue.flush(db) == 1
+
+
+def test_replay_recovers_spooled_rows_of_a_stopped_worker(tmp_path):
+    db = MemoryBackend({"comments": [_comment(0)]})
+    crashed = AppendQueue("comments", tmp_path)
+    for i in range(3):
+        crashed.append(_comment(i))
+
+    restarted = AppendQueue("comments", tmp_path)
+    assert restarted.replay(db) == 0  # still locked by a live worker
+
+    crashed._spool.file.close()  # the worker dies, releasing its lock
+    assert restarted.replay(db) == 2
+    assert sorted(r["id"] for r in db.find("comments")) == ["m0", "m1", "m2"]
+    assert restarted.replay(db) == 0
+
+
+def test_dead_lettered_rows_are_retried_on_replay(tmp_path):
+    db = MemoryBackend()
+    queue = AppendQueue("chat_messages", tmp_path)
+    for i in range(2):
+        queue.append({"id": f"t{i}", "session_id": "s1"})
+    insert = db.insert
+
+    def reject_t1(table, rows):
+        if any(r["id"] == "t1" for r in rows):
+            raise ValueError("violates foreign key constraint")
+        return insert(table, rows)
+
+    db.insert = reject_t1
+    assert queue.flush(db) == 1
+    queue._dead.file.close()  # the worker stops
+
+    db.insert = insert
+    assert AppendQueue("chat_messages", tmp_path).replay(db) == 1
+    assert sorted(r["id"] for r in db.find("chat_messages")) == ["t0", "t1"]
+    assert list(tmp_path.glob("*.dead.spool")) == []
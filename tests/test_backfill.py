@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import backfill_analyses
+from benchmarks import fakes
+from datastore import MemoryBackend
+
+
+def _backend(seed):
+    return MemoryBackend({"campaigns": seed["campaigns"], "ai_analyses": seed["ai_analyses"][:5]})
+
+
+def test_backfill_batches_and_checkpoints(seed, tmp_path, monkeypatch):
+    import google.generativeai as genai
+    monkeypatch.setattr(genai, "configure", lambda **kwargs: None)
+    calls = []
+
+    class CountingModel(fakes.FakeGenerativeModel):
+        def generate_content(self, prompt, **kwargs):
+            calls.append(kwargs)
+            return super().generate_content(prompt, **kwargs)
+
+    monkeypatch.setattr(genai, "GenerativeModel", CountingModel)
+    db = _backend(seed)
+    analysed_before = {row["campaign_id"] for row in seed["ai_analyses"][:5]}
+    missing = len({c["id"] for c in seed["campaigns"]} - analysed_before)
+    checkpoint = tmp_path / "checkpoint.jsonl"
+
+    stats = asyncio.run(backfill_analyses.backfill(db, batch_size=4, concurrency=2, checkpoint=checkpoint))
+
+    assert stats["analysed"] == missing and stats["failed"] == 0
+    assert len(calls) == -(-missing // 4)
+    assert calls[0]["generation_config"]["response_mime_type"] == "application/json"
+    assert {row["campaign_id"] for row in db.find("ai_analyses", {})} == {c["id"] for c in seed["campaigns"]}
+    assert len(backfill_analyses.load_checkpoint(checkpoint)) == missing
+
+    # A second run has nothing left to do
+    assert asyncio.run(backfill_analyses.backfill(db, checkpoint=checkpoint))["missing"] == 0
+
+
+def test_find_missing_pages_past_max_rows(seed):
+    db = MemoryBackend({"campaigns": seed["campaigns"], "ai_analyses": seed["ai_analyses"][:5]}, max_rows=3)
+    analysed = {row["campaign_id"] for row in seed["ai_analyses"][:5]}
+    missing = backfill_analyses.find_missing(db, done=set())
+    assert {c["id"] for c in missing} == {c["id"] for c in seed["campaigns"]} - analysed
+    assert [c["created_at"] for c in missing] == sorted(c["created_at"] for c in missing)
+
+
+def test_parse_response_drops_invalid_records():
+    batch = [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    text = json.dumps([{"k": 1, "p": 70, "a": "fine"}, {"k": 2, "p": 140, "a": "out of range"},
+                       {"k": 9, "p": 50, "a": "unknown key"}, {"p": 50}])
+    assert backfill_analyses.parse_response(text, batch) == {
+        "a": {"success_probability": 70.0, "analysis_text": "fine"}}
+    assert backfill_analyses.parse_response("not json", batch) == {}
@@ -0,0 +1,40 @@
+def _auth(seed, user_id):
+    token = next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == user_id)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _other_user(seed, campaign):
+    return next(u for u in seed["users"] if u["id"] != campaign["creator_id"] and not u["is_admin"])
+
+
+def test_update_campaign_returns_updated_row(client, seed):
+    campaign = seed["campaigns"][0]
+    response = client.put(f"/api/campaigns/{campaign['id']}", headers=_auth(seed, campaign["creator_id"]),
+                          json={"title": "Renamed"})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Renamed"
+    assert response.json()["id"] == campaign["id"]
+
+
+def test_update_campaign_forbidden_for_other_users(client, seed):
+    campaign = seed["campaigns"][0]
+    other = _other_user(seed, campaign)
+    response = client.put(f"/api/campaigns/{campaign['id']}", headers=_auth(seed, other["id"]),
+                          json={"title": "Hijacked"})
+    assert response.status_code == 403
+    assert client.get(f"/api/campaigns/{campaign['id']}").json()["title"] == campaign["title"]
+
+
+def test_update_campaign_missing_is_404(client, seed):
+    campaign = seed["campaigns"][0]
+    response = client.put("/api/campaigns/does-not-exist", headers=_auth(seed, campaign["creator_id"]),
+                          json={"title": "Renamed"})
+    assert response.status_code == 404
+
+
+def test_admin_can_update_any_campaign(client, seed):
+    campaign = next(c for c in seed["campaigns"] if c["creator_id"] != seed["users"][0]["id"])
+    response = client.put(f"/api/campaigns/{campaign['id']}", headers=_auth(seed, seed["users"][0]["id"]),
+                          json={"status": "completed"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
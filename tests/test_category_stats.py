@@ -0,0 +1,73 @@
+from category_stats import CategoryStatsEngine
+
+
+def _auth(seed, user_id):
+    token = next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == user_id)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _campaign(id, raised, goal=1000, backers=1, category="Tech"):
+    return {"id": id, "category": category, "raised_amount": raised, "goal_amount": goal,
+            "backers_count": backers, "status": "active", "title": id}
+
+
+def test_incremental_updates_match_rebuild():
+    rows = [_campaign(f"c{i}", raised=i * 100, backers=i) for i in range(1, 12)]
+    incremental = CategoryStatsEngine()
+    incremental.rebuild(rows[:5])
+    for row in rows[5:]:
+        incremental.upsert_campaign(row)
+    incremental.upsert_campaign({**rows[0], "raised_amount": 5000})
+    incremental.apply_pledge({"campaign_id": "c2", "amount": 900})
+    incremental.remove_campaign(rows[3])
+
+    expected_rows = [{**rows[0], "raised_amount": 5000}, {**rows[1], "raised_amount": 1100, "backers_count": 3}]
+    expected_rows += [r for r in rows[2:] if r["id"] != "c4"]
+    rebuilt = CategoryStatsEngine()
+    rebuilt.rebuild(expected_rows)
+
+    assert incremental.get("Tech") == rebuilt.get("Tech")
+    stats = rebuilt.get("Tech")
+    assert stats["campaign_count"] == 10
+    assert stats["funded_count"] == 4  # c1, c2, c10, c11 reached their 1000 goal
+    assert stats["top_campaigns"][0]["id"] == "c1"
+
+
+def test_category_stats_follow_campaign_writes(client, seed):
+    creator = seed["users"][1]
+    headers = _auth(seed, creator["id"])
+    before = client.get("/api/analytics/category-stats/Robotics", headers=headers)
+    assert before.status_code == 404
+
+    created = client.post("/api/campaigns", headers=headers, json={
+        "title": "Robot arm", "description": "A desk robot arm", "category": "Robotics", "goal_amount": 500})
+    stats = client.get("/api/analytics/category-stats/Robotics", headers=headers).json()
+    assert stats["campaign_count"] == 1
+    assert stats["top_campaigns"][0]["id"] == created.json()["id"]
+
+    client.delete(f"/api/campaigns/{created.json()['id']}", headers=headers)
+    stats = client.get("/api/analytics/category-stats/Robotics", headers=headers).json()
+    assert stats["campaign_count"] == 0
+
+
+def test_competitor_analysis_uses_local_campaigns(client, seed):
+    categories = [c["category"] for c in seed["campaigns"]]
+    campaign = max(seed["campaigns"], key=lambda c: categories.count(c["category"]))
+    response = client.get(f"/api/analytics/competitor-analysis/{campaign['id']}",
+                          headers=_auth(seed, campaign["creator_id"]))
+    body = response.json()
+    local_ids = {c["id"] for c in seed["campaigns"] if c["category"] == campaign["category"]}
+    assert body["top_competitors"]
+    assert {c["id"] for c in body["top_competitors"]} <= local_ids - {campaign["id"]}
+    assert body["market_overview"]["average_success_rate"] != "80.00%"
+
+
+def test_index_refresh_pages_past_max_rows(server, seed):
+    from fastapi.testclient import TestClient
+
+    server.db.inner.max_rows = 7  # fewer than the seeded campaigns, like PostgREST's cap
+    admin = next(u for u in seed["users"] if u["is_admin"])
+    with TestClient(server.app) as client:
+        stats = client.get("/api/admin/stats", headers=_auth(seed, admin["id"])).json()
+    assert stats["total_campaigns"] == len(seed["campaigns"])
+    assert stats["total_raised"] == sum(c["raised_amount"] for c in seed["campaigns"])
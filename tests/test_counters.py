@@ -0,0 +1,101 @@
+import pytest
+
+from counters import CounterAggregator
+from datastore import MemoryBackend
+
+
+def _db(pending_pledges=()):
+    return MemoryBackend({
+        "campaigns": [{"id": "c1", "raised_amount": 100.0, "backers_count": 1},
+                      {"id": "c2", "raised_amount": 0.0, "backers_count": 0}],
+        "pledges": [{"id": f"p{i}", "campaign_id": campaign_id, "amount": amount, "counter_pending": True}
+                    for i, (campaign_id, amount) in enumerate(pending_pledges)],
+    })
+
+
+def _totals(db):
+    return {c["id"]: (c["raised_amount"], c["backers_count"]) for c in db.find("campaigns")}
+
+
+def test_pending_pledges_merge_into_reads_and_flush_once():
+    db = _db([("c1", 50.0), ("c1", 25.0), ("c2", 10.0)])
+    aggregator = CounterAggregator(flush_threshold=4)
+    pledges = db.find("pledges", order="id")
+    assert [aggregator.record(p) for p in pledges] == [False, False, False]
+    assert aggregator.record(pledges[0]) is False  # already recorded
+
+    assert aggregator.merge({"id": "c1", "raised_amount": 100.0, "backers_count": 1}) == \
+        {"id": "c1", "raised_amount": 175.0, "backers_count": 3}
+    assert aggregator.flush(db) == 3
+    assert _totals(db) == {"c1": (175.0, 3), "c2": (10.0, 1)}
+    assert aggregator.pending("c1", backers_count=3) == (0.0, 0)
+    # A replica that hasn't caught up with the flush still serves the totals
+    lagging = {"id": "c1", "raised_amount": 100.0, "backers_count": 1}
+    assert aggregator.merge(lagging) == {"id": "c1", "raised_amount": 175.0, "backers_count": 3}
+    assert aggregator.merge({"id": "c2", "raised_amount": 10.0, "backers_count": 1})["raised_amount"] == 10.0
+
+    # Replaying the same flush claims nothing
+    db.rpc("apply_pledge_counters", {"p_pledge_ids": [p["id"] for p in pledges]})
+    assert _totals(db) == {"c1": (175.0, 3), "c2": (10.0, 1)}
+
+
+def test_failed_flush_keeps_pledges_pending_and_replay_recovers_them():
+    db = _db([("c1", 50.0), ("c2", 10.0)])
+    aggregator = CounterAggregator()
+    for pledge in db.find("pledges"):
+        aggregator.record(pledge)
+
+    def unavailable(*args):
+        raise ConnectionError("database unavailable")
+
+    rpc, db.rpc = db.rpc, unavailable
+    with pytest.raises(ConnectionError):
+        aggregator.flush(db)
+    assert aggregator.pending("c1") == (50.0, 1)
+    db.rpc = rpc
+
+    # A restarted worker finds the same pledges in the ledger
+    restarted = CounterAggregator()
+    assert restarted.replay(db) == 2
+    assert restarted.flush(db) == 2
+    assert aggregator.flush(db) == 2
+    assert _totals(db) == {"c1": (150.0, 2), "c2": (10.0, 1)}
+
+
+def test_replay_pages_past_max_rows():
+    db = _db([("c1", 10.0)] * 5 + [("c2", 1.0)] * 2)
+    db.max_rows = 3
+    restarted = CounterAggregator()
+    assert restarted.replay(db) == 7
+    assert restarted.flush(db) == 7
+    assert _totals(db) == {"c1": (150.0, 6), "c2": (2.0, 2)}
+
+
+def test_confirmed_payment_counts_once(client, server, seed):
+    campaign = seed["campaigns"][2]
+    token = next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == campaign["creator_id"])
+    headers = {"Authorization": f"Bearer {token}"}
+    created = client.post("/api/payments/create-checkout", headers=headers,
+                          json={"campaign_id": campaign["id"], "origin_url": "http://test"}).json()
+    for _ in range(2):
+        assert client.get(f"/api/payments/status/{created['session_id']}", headers=headers).status_code == 200
+
+    shown = client.get(f"/api/campaigns/{campaign['id']}").json()
+    assert shown["backers_count"] == campaign["backers_count"] + 1
+    server.counter_aggregator.flush(server.db)
+    stored = server.db.find("campaigns", {"id": campaign["id"]})[0]
+    assert (stored["raised_amount"], stored["backers_count"]) == (shown["raised_amount"], shown["backers_count"])
+
+
+def test_campaign_update_response_and_event_include_pending_pledges(client, server, seed, monkeypatch):
+    import events
+
+    campaign = seed["campaigns"][3]
+    token = next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == campaign["creator_id"])
+    server.counter_aggregator.record({"id": "pending-1", "campaign_id": campaign["id"], "amount": 40.0})
+    updates = []
+    monkeypatch.setitem(events._handlers, events.CAMPAIGN_UPDATED,
+                        [*events._handlers[events.CAMPAIGN_UPDATED], updates.append])
+    response = client.put(f"/api/campaigns/{campaign['id']}", headers={"Authorization": f"Bearer {token}"},
+                          json={"title": "Renamed"}).json()
+    assert response["raised_amount"] == updates[0]["raised_amount"] == campaign["raised_amount"] + 40.0
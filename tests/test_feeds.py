@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+from feeds import FeedIndex
+
+
+def _campaign(id, raised=0, goal=1000, days_old=0, status="active"):
+    created = datetime.now(timezone.utc) - timedelta(days=days_old)
+    return {"id": id, "title": id, "raised_amount": raised, "goal_amount": goal, "backers_count": 0,
+            "status": status, "created_at": created.isoformat()}
+
+
+def _pledge(campaign_id, hours_ago):
+    created = datetime.now(timezone.utc) - timedelta(hours=hours_ago)
+    return {"campaign_id": campaign_id, "amount": 10, "created_at": created.isoformat()}
+
+
+def test_feeds_rank_and_follow_events():
+    index = FeedIndex()
+    campaigns = [_campaign("old", raised=900, days_old=10), _campaign("new", raised=100),
+                 _campaign("funded", raised=2000, days_old=3), _campaign("closed", status="completed")]
+    # "old" had more pledges, but a week ago; "new" had fewer, today
+    pledges = [_pledge("old", 150)] * 4 + [_pledge("new", 1)] * 2
+    index.rebuild(campaigns, pledges)
+
+    assert [r["id"] for r in index.top("newest", 5)] == ["new", "funded", "old"]
+    assert [r["id"] for r in index.top("nearly_funded", 5)] == ["old", "new"]
+    assert index.top("trending", 1)[0]["id"] == "new"
+
+    index.apply_pledge({"campaign_id": "old", "amount": 100})
+    assert [r["id"] for r in index.top("nearly_funded", 5)] == ["new"]
+    index.upsert_campaign({**campaigns[1], "status": "completed"})
+    assert "new" not in {r["id"] for feed in ("trending", "newest") for r in index.top(feed, 5)}
+
+
+def test_feed_endpoint(client, server):
+    response = client.get("/api/feeds/newest?limit=3")
+    assert response.status_code == 200
+    rows = response.json()
+    assert len(rows) == 3
+    assert [r["created_at"] for r in rows] == sorted((r["created_at"] for r in rows), reverse=True)
+    assert all("deadline" in r and "days_remaining" in r for r in rows)
+
+    server.counter_aggregator.record({"id": "pending-1", "campaign_id": rows[0]["id"], "amount": 40.0})
+    merged = client.get("/api/feeds/newest?limit=3").json()[0]
+    assert merged["raised_amount"] == rows[0]["raised_amount"] + 40.0
+    assert merged["backers_count"] == rows[0]["backers_count"] + 1
+    assert client.get("/api/feeds/unknown").status_code == 404
@@ -0,0 +1,35 @@
+def test_unchanged_list_returns_304(client):
+    first = client.get("/api/campaigns")
+    etag = first.headers["etag"]
+
+    second = client.get("/api/campaigns", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+
+
+def test_etag_changes_after_edit(client, seed):
+    campaign = seed["campaigns"][0]
+    token = next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == campaign["creator_id"])
+    etag = client.get("/api/campaigns").headers["etag"]
+
+    client.put(f"/api/campaigns/{campaign['id']}", headers={"Authorization": f"Bearer {token}"},
+               json={"title": "Fresh title"})
+
+    response = client.get("/api/campaigns", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_large_lists_are_compressed(client):
+    response = client.get("/api/campaigns", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].endswith('-gzip"')
+    # The coded ETag still validates the representation
+    revalidated = client.get("/api/campaigns", headers={"Accept-Encoding": "gzip",
+                                                        "If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get("/api/health", headers={"Accept-Encoding": "gzip, br"})
+    assert "content-encoding" not in response.headers
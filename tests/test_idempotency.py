@@ -0,0 +1,87 @@
+import asyncio
+
+from idempotency import IdempotencyMiddleware, MemoryIdempotencyStore
+from rate_limit import AdmissionController, AdmissionMiddleware, Limit, MemoryBucketStore, RouteClass
+
+
+def _auth(seed, user_id, key):
+    token = next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == user_id)
+    return {"Authorization": f"Bearer {token}", "Idempotency-Key": key}
+
+
+def test_duplicate_comment_is_replayed_not_recreated(client, server, seed):
+    campaign = seed["campaigns"][0]
+    headers = _auth(seed, campaign["creator_id"], "comment-1")
+    path = f"/api/campaigns/{campaign['id']}/comments"
+
+    first = client.post(path, headers=headers, json={"content": "Great idea"})
+    second = client.post(path, headers=headers, json={"content": "Great idea"})
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json() and second.headers["idempotent-replayed"] == "true"
+    comments = client.get(path).json()
+    assert [c["content"] for c in comments].count("Great idea") == 1
+
+    assert client.post(path, headers=headers, json={"content": "Other"}).status_code == 422
+    other_user = next(u for u in seed["users"] if u["id"] != campaign["creator_id"])
+    assert "idempotent-replayed" not in client.post(path, headers=_auth(seed, other_user["id"], "comment-1"),
+                                                    json={"content": "Great idea"}).headers
+
+
+def _call(app, key=b"k"):
+    scope = {"type": "http", "method": "POST", "path": "/api/ai/chat", "client": ("1.2.3.4", 1),
+             "headers": [(b"idempotency-key", key)]}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b'{"message": "hi"}', "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await app(scope, receive, send)
+        return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+    return run()
+
+
+def test_concurrent_duplicates_wait_and_errors_are_not_stored():
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(await receive())
+        await asyncio.sleep(0.05)
+        status = 500 if len(calls) == 1 else 200
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": f"call {len(calls)}".encode()})
+
+    middleware = IdempotencyMiddleware(app, MemoryIdempotencyStore())
+
+    async def scenario():
+        failed = await _call(middleware)
+        duplicates = await asyncio.gather(_call(middleware), _call(middleware), _call(middleware))
+        return failed, duplicates
+
+    failed, duplicates = asyncio.run(scenario())
+    assert failed == (500, b"call 1")
+    assert duplicates == [(200, b"call 2")] * 3
+    assert len(calls) == 2
+
+
+def test_retry_after_rate_limit_runs_again():
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(await receive())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": f"call {len(calls)}".encode()})
+
+    controller = AdmissionController(MemoryBucketStore(), route_classes=(
+        RouteClass("llm", ("/api/ai/",), per_ip=Limit(60, 1)),))
+    middleware = IdempotencyMiddleware(AdmissionMiddleware(app, controller), MemoryIdempotencyStore())
+
+    assert asyncio.run(_call(middleware, key=b"first")) == (200, b"call 1")
+    limited = asyncio.run(_call(middleware))
+    assert limited[0] == 429
+    controller.store.reset()  # Retry-After has passed
+    assert asyncio.run(_call(middleware)) == (200, b"call 2")
+    assert asyncio.run(_call(middleware)) == (200, b"call 2")
@@ -0,0 +1,60 @@
+import io
+
+import pytest
+from PIL import Image
+
+import images
+from benchmarks import fakes
+
+
+def test_renders_sized_renditions_once(client, server, seed):
+    campaign = seed["campaigns"][0]
+    fetcher = server.image_proxy.fetcher
+    url = f"/api/images/{campaign['id']}?size=card"
+
+    webp = client.get(url, headers={"Accept": "image/avif,image/webp,*/*"})
+    assert webp.status_code == 200 and webp.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(webp.content)).size == images.SIZES["card"]
+    assert len(webp.content) * 10 < len(fakes._photo())
+    assert webp.headers["cache-control"] == "public, max-age=86400"
+
+    jpeg = client.get(url + "&v=abc", headers={"Accept": "*/*"})
+    assert jpeg.headers["content-type"] == "image/jpeg"
+    assert "immutable" in jpeg.headers["cache-control"]
+    assert client.get(url, headers={"Accept": "image/webp"}).content == webp.content
+    # Two renditions, one fetch of the source
+    assert fetcher.fetched == [campaign["image_url"]]
+
+    revalidated = client.get(url, headers={"Accept": "image/webp", "If-None-Match": webp.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_missing_image_and_unfetchable_source(client, server, seed):
+    assert client.get("/api/images/no-such-campaign").status_code == 404
+
+    def broken(url):
+        raise images.ImageFetchError("unreachable")
+
+    server.image_proxy.fetcher = broken
+    campaign = seed["campaigns"][1]
+    response = client.get(f"/api/images/{campaign['id']}", follow_redirects=False)
+    assert response.status_code == 307 and response.headers["location"] == campaign["image_url"]
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = images.DiskLRUCache(tmp_path, max_bytes=250)
+    for key in "abc":
+        cache.put(key, key.encode() * 100)
+    assert cache.get("a") is None and cache.size <= 250
+    cache.get("b")
+    cache.put("d", b"d" * 100)
+    assert cache.get("c") is None and cache.get("b") == b"b" * 100
+
+    reopened = images.DiskLRUCache(tmp_path, max_bytes=250)
+    assert reopened.get("d") == b"d" * 100 and reopened.size == cache.size
+
+
+@pytest.mark.parametrize("url", ["http://127.0.0.1/photo.jpg", "http://10.0.0.5/photo.jpg", "file:///etc/passwd"])
+def test_http_fetcher_refuses_non_public_sources(url):
+    with pytest.raises(images.ImageFetchError):
+        images.HttpFetcher()(url)
@@ -0,0 +1,56 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import events
+import lifecycle
+from datastore import MemoryBackend
+from lifecycle import DeadlineScheduler
+
+
+def _campaign(id, days_old, duration=30, status="active"):
+    created = datetime.now(timezone.utc) - timedelta(days=days_old)
+    return {"id": id, "title": id, "status": status, "duration_days": duration, "created_at": created.isoformat()}
+
+
+def test_scheduler_pops_due_campaigns_in_deadline_order():
+    scheduler = DeadlineScheduler()
+    scheduler.rebuild([_campaign("late", 40), _campaign("later", 31), _campaign("live", 5),
+                       _campaign("draft", 90, status="draft")])
+    assert len(scheduler) == 3
+
+    # Extending a campaign and deleting another leave stale heap entries behind
+    extended = _campaign("later", 31, duration=60)
+    scheduler.upsert_campaign(extended)
+    scheduler.remove_campaign({"id": "live"})
+    assert scheduler.pop_due() == ["late"]
+    assert scheduler.pop_due() == []
+    assert scheduler.next_deadline() == lifecycle.deadline(extended).timestamp()
+
+
+def test_close_due_ends_expired_campaigns_in_batches(monkeypatch):
+    rows = [_campaign(f"old{i}", 35) for i in range(5)] + [_campaign("live", 2)]
+    db = MemoryBackend({"campaigns": rows})
+    scheduler = DeadlineScheduler()
+    scheduler.rebuild(rows)
+    ended = []
+    # Only this handler: server.py's indexes must not see these fake campaigns
+    monkeypatch.setattr(events, "_handlers", defaultdict(list))
+    events.subscribe(events.CAMPAIGN_ENDED, ended.append)
+
+    assert scheduler.close_due(db, batch_size=2) == 5
+    assert sorted(r["id"] for r in ended) == [f"old{i}" for i in range(5)]
+    assert [r["id"] for r in db.find("campaigns", {"status": "active"})] == ["live"]
+    assert len(scheduler) == 1
+
+
+def test_days_remaining_reaches_api_and_simulation(client, seed):
+    campaigns = client.get("/api/campaigns").json()
+    assert campaigns and all(c["days_remaining"] > 0 for c in campaigns)
+
+    campaign = campaigns[0]
+    assert client.get(f"/api/campaigns/{campaign['id']}").json()["deadline"] == campaign["deadline"]
+    user = next(u for u in seed["users"] if not u["is_admin"])
+    token = next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == user["id"])
+    simulation = client.get(f"/api/analytics/monte-carlo/{campaign['id']}",
+                            headers={"Authorization": f"Bearer {token}"}).json()
+    assert len(simulation["progression_data"]) == campaign["days_remaining"]
@@ -0,0 +1,71 @@
+import threading
+import time
+import tracemalloc
+
+from profiling import CpuProfiler, MemoryProfiler, _owner
+
+
+def _auth(seed, admin=True):
+    user = next(u for u in seed["users"] if u["is_admin"] == admin)
+    token = next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == user["id"])
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_timed_cpu_profile_collects_collapsed_stacks():
+    profiler = CpuProfiler()
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin, args=(stop,))
+    worker.start()
+    try:
+        profiler.start(seconds=0.2, interval=0.001)
+        profiler._thread.join()
+    finally:
+        stop.set()
+        worker.join()
+
+    report = profiler.report()
+    assert report["session"]["mode"] == "seconds" and not report["session"]["running"]
+    assert report["session"]["samples"] > 0 and profiler.route is None
+    assert any(s["stack"].endswith("test_profiling.py:_spin") for s in report["stacks"])
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in profiler.collapsed().splitlines())
+
+
+def test_request_armed_profile_stops_after_matching_requests(client, server, seed):
+    admin = _auth(seed)
+    assert client.post("/api/admin/profile/cpu", json={"requests": 2}, headers=_auth(seed, admin=False)).status_code == 403
+    assert client.post("/api/admin/profile/cpu", json={}, headers=admin).status_code == 400
+
+    armed = client.post("/api/admin/profile/cpu", json={"requests": 2, "route": "/api/campaigns"}, headers=admin)
+    assert armed.json()["mode"] == "requests"
+    assert client.post("/api/admin/profile/cpu", json={"seconds": 1}, headers=admin).status_code == 409
+
+    client.get("/api/health")  # not under the route
+    for _ in range(3):
+        client.get("/api/campaigns")
+    server.cpu_profiler._thread.join(timeout=5)
+    session = client.get("/api/admin/profile/cpu", headers=admin).json()["session"]
+    assert session["requests_profiled"] == 2 and not session["running"]
+    assert server.cpu_profiler.route is None
+
+
+def test_memory_snapshots_attribute_growth():
+    assert _owner(tracemalloc.Traceback(((_owner.__code__.co_filename, 1),))) == "app:profiling"
+    assert _owner(tracemalloc.Traceback((("/x/json/decoder.py", 1),
+                                         ("/venv/lib/site-packages/pydantic/main.py", 1)))) == "pydantic"
+
+    profiler = MemoryProfiler()
+    profiler.start()
+    try:
+        profiler.snapshot(group_by="file")
+        retained = [bytearray(1024) for _ in range(1000)]
+        result = profiler.snapshot(group_by="file")
+    finally:
+        profiler.stop()
+    assert not profiler.running
+    assert result["growth"][0]["key"] == __file__ and result["growth"][0]["bytes"] >= 1024 * 1000
+    assert len(retained) == 1000
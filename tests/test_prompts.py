@@ -0,0 +1,42 @@
+import prompts
+
+
+def _auth(seed, user_id):
+    token = next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == user_id)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_truncate_keeps_head_and_tail_within_budget():
+    text = " ".join(f"Sentence number {i} about the campaign." for i in range(200))
+    short = prompts.truncate(text, 100)
+    assert prompts.estimate_tokens(short) <= 100
+    assert short.startswith("Sentence number 0") and short.endswith("number 199 about the campaign.")
+    assert "[…]" in short
+    assert prompts.truncate("Short   text.", 100) == "Short text."
+
+
+def test_fit_shares_the_budget_by_water_filling():
+    budget = prompts.INPUT_BUDGETS["marketing_strategy"]
+    fields = prompts.fit("marketing_strategy", title="Desk lamp", category="Tech", description="word " * 5000)
+    assert fields["title"] == "Desk lamp" and fields["category"] == "Tech"
+    assert sum(prompts.estimate_tokens(v) for v in fields.values()) <= budget
+
+    turns = [(f"question {i} " * 50, f"answer {i} " * 200) for i in range(5)]
+    kept = prompts.fit_turns(turns, budget=500)
+    assert kept and kept[-1][0].startswith("question 4")
+    assert sum(prompts.estimate_tokens(m) + prompts.estimate_tokens(r) for m, r in kept) <= 500
+
+
+def test_usage_ledger_is_charged_per_user(client, seed):
+    campaign = seed["campaigns"][0]
+    owner = campaign["creator_id"]
+    client.post("/api/ai/optimize-title", headers=_auth(seed, owner),
+                json={"title": "Desk lamp", "description": "A lamp " * 2000, "category": "Tech"})
+
+    admin = next(u for u in seed["users"] if u["is_admin"])
+    usage = client.get("/api/admin/llm-usage?group_by=user_endpoint", headers=_auth(seed, admin["id"])).json()
+    row = next(r for r in usage["rows"] if r["user_id"] == owner)
+    assert row["endpoint"] == "optimize_title" and row["calls"] == 1
+    assert 0 < row["input_tokens"] <= prompts.INPUT_BUDGETS["optimize_title"] + 200
+    assert row["email"] == next(u["email"] for u in seed["users"] if u["id"] == owner)
+    assert client.get("/api/admin/llm-usage", headers=_auth(seed, owner)).status_code in (401, 403)
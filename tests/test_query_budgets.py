@@ -0,0 +1,81 @@
+"""
+Data layer round-trip budgets for the hot endpoints.
+
+Each entry is the maximum number of sb_* calls a single request may make.
+Authenticated routes pay two lookups (session + user) inside
+get_current_user. If a change legitimately lowers a count, tighten the
+budget here; if it raises one, the test fails with the full query log.
+"""
+import pytest
+
+from instrumentation import count_queries
+
+QUERY_BUDGETS = {
+    # name: (method, path, auth, body, max round trips)
+    "get_campaigns": ("GET", "/api/campaigns", None, None, 1),
+    "get_campaigns_filtered": ("GET", "/api/campaigns?category=Food&search=garden", None, None, 1),
+    "get_campaign": ("GET", "/api/campaigns/{campaign_id}", None, None, 1),
+    "get_campaign_analysis": ("GET", "/api/campaigns/{campaign_id}/analysis", None, None, 1),
+    "get_comments": ("GET", "/api/campaigns/{campaign_id}/comments", None, None, 1),
+    "get_me": ("GET", "/api/auth/me", "owner", None, 2),
+    # user lookup + the session-cap check + insert; evicting adds one delete
+    "login": ("POST", "/api/auth/login", None, "login", 3),
+    "get_my_campaigns": ("GET", "/api/my-campaigns", "owner", None, 3),
+    "create_comment": ("POST", "/api/campaigns/{campaign_id}/comments", "owner", {"content": "Nice"}, 2),
+    "update_campaign": ("PUT", "/api/campaigns/{campaign_id}", "owner", {"title": "Renamed"}, 3),
+    "delete_campaign": ("DELETE", "/api/campaigns/{campaign_id}", "owner", None, 4),
+    "create_checkout": ("POST", "/api/payments/create-checkout", "owner", "checkout", 4),
+    "analytics_overview": ("GET", "/api/analytics/overview", "owner", None, 3),
+    "admin_get_all_campaigns": ("GET", "/api/admin/campaigns", "admin", None, 3),
+    "admin_stats": ("GET", "/api/admin/stats", "admin", None, 3),
+    # first page: the page itself + total and admin counts
+    "admin_users": ("GET", "/api/admin/users", "admin", None, 5),
+    # admission control resolves the session's user for the per-user budget
+    # (cached for a minute, so only the first request in a while pays it)
+    "ai_chat": ("POST", "/api/ai/chat", "owner", {"message": "hi", "session_id": "budget"}, 4),
+}
+
+
+def _token_for(seed, user_id):
+    return next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == user_id)
+
+
+@pytest.mark.parametrize("name", sorted(QUERY_BUDGETS))
+def test_query_budget(name, client, seed):
+    method, path, auth, body, budget = QUERY_BUDGETS[name]
+    campaign = seed["campaigns"][1]
+    creator = next(u for u in seed["users"] if u["id"] == campaign["creator_id"])
+
+    headers = {}
+    if auth == "owner":
+        headers["Authorization"] = f"Bearer {_token_for(seed, creator['id'])}"
+    elif auth == "admin":
+        admin = next(u for u in seed["users"] if u["is_admin"])
+        headers["Authorization"] = f"Bearer {_token_for(seed, admin['id'])}"
+
+    if body == "login":
+        from benchmarks.synthetic import DEFAULT_PASSWORD
+        body = {"email": creator["email"], "password": DEFAULT_PASSWORD}
+    elif body == "checkout":
+        body = {"campaign_id": campaign["id"], "origin_url": "http://test"}
+
+    with count_queries() as queries:
+        response = client.request(method, path.format(campaign_id=campaign["id"]), headers=headers, json=body)
+
+    assert response.status_code < 400, response.text
+    assert len(queries) <= budget, f"{name} made {len(queries)} round trips (budget {budget}): {queries}"
+
+
+def test_payment_status_budget(client, server, seed):
+    """Checkout confirmation is measured separately because it needs a session from create-checkout"""
+    campaign = seed["campaigns"][1]
+    headers = {"Authorization": f"Bearer {_token_for(seed, campaign['creator_id'])}"}
+    created = client.post("/api/payments/create-checkout", headers=headers,
+                          json={"campaign_id": campaign["id"], "origin_url": "http://test"})
+    assert created.status_code == 200
+
+    with count_queries() as queries:
+        response = client.get(f"/api/payments/status/{created.json()['session_id']}", headers=headers)
+
+    assert response.status_code == 200
+    assert len(queries) <= 5, f"get_payment_status made {len(queries)} round trips (budget 5): {queries}"
@@ -0,0 +1,89 @@
+import asyncio
+
+from rate_limit import AdmissionController, AdmissionMiddleware, Limit, MemoryBucketStore, RouteClass
+
+from benchmarks.synthetic import DEFAULT_PASSWORD
+
+
+def test_token_bucket_refills():
+    store = MemoryBucketStore()
+    limit = Limit(per_minute=60, burst=2)
+    assert store.take("k", limit) == 0
+    assert store.take("k", limit) == 0
+    wait = store.take("k", limit)
+    assert 0 < wait <= 1.0
+    store._buckets["k"][1] -= 1.0  # one second later
+    assert store.take("k", limit) == 0
+
+
+def test_login_is_limited_per_ip(client, seed):
+    user = seed["users"][1]
+    statuses = [client.post("/api/auth/login", json={"email": user["email"], "password": "wrong"}).status_code
+                for _ in range(12)]
+    assert statuses[:10] == [401] * 10
+    assert statuses[10] == 429
+    limited = client.post("/api/auth/login", json={"email": user["email"], "password": DEFAULT_PASSWORD})
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
+    # Other route classes are unaffected
+    assert client.get("/api/campaigns").status_code == 200
+
+
+def test_saturated_llm_pool_sheds_with_retry_after():
+    gate = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        await gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    controller = AdmissionController(MemoryBucketStore(), route_classes=(
+        RouteClass("llm", ("/api/ai/",), per_ip=Limit(600, 100), pooled=True),), llm_concurrency=1)
+    middleware = AdmissionMiddleware(slow_app, controller)
+
+    async def call():
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/api/ai/chat", "headers": [], "client": ("1.2.3.4", 1)}
+        await middleware(scope, None, send)
+        return sent
+
+    async def scenario():
+        first = asyncio.create_task(call())
+        await asyncio.sleep(0)
+        second = await call()
+        gate.set()
+        return await first, second
+
+    first, second = asyncio.run(scenario())
+    assert first[0]["status"] == 200
+    assert second[0]["status"] == 503
+    assert (b"retry-after", b"1") in second[0]["headers"]
+    assert controller.pool.in_flight == 0
+
+
+def test_per_user_budget_follows_the_user_not_the_token():
+    sessions = {"token-a": "u1", "token-b": "u1"}
+    controller = AdmissionController(MemoryBucketStore(), route_classes=(
+        RouteClass("llm", ("/api/ai/",), per_user=Limit(60, 2)),), resolve_user=sessions.get)
+    llm = controller.route_classes[0]
+
+    def check(token, ip="1.2.3.4"):
+        scope = {"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())], "client": (ip, 1)}
+        return asyncio.run(controller.check(scope, llm))
+
+    assert check("token-a") == 0 and check("token-b") == 0
+    # A second login of the same user shares the bucket
+    assert check("token-a") > 0 and check("token-b") > 0
+    # Made-up tokens resolve to no user, so they have no per-user bucket to reset
+    assert asyncio.run(controller.user_id({b"authorization": b"Bearer made-up"})) is None
+
+
+def test_campaign_creation_is_an_llm_route():
+    controller = AdmissionController(MemoryBucketStore())
+    assert controller.classify("/api/campaigns", "POST").name == "llm"
+    assert controller.classify("/api/campaigns", "GET") is None
+    assert controller.classify("/api/campaigns/extended", "POST") is None
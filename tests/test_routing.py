@@ -0,0 +1,51 @@
+import contextvars
+
+from datastore import BROWSING, FRESH, REPORTING, MemoryBackend, RoutingBackend, bind_route_key
+
+
+def _routed(lag=2.0):
+    primary = MemoryBackend({"campaigns": [{"id": "c1", "title": "Primary"}]})
+    replica = MemoryBackend({"campaigns": [{"id": "c1", "title": "Replica"}]})
+    return RoutingBackend(primary, replica, replica_lag=lag)
+
+
+def _title(db, max_staleness):
+    return db.find("campaigns", {"id": "c1"}, max_staleness=max_staleness)[0]["title"]
+
+
+def test_reads_route_by_staleness_tolerance():
+    db = _routed()
+    assert _title(db, FRESH) == "Primary"
+    assert _title(db, BROWSING) == "Replica"
+    assert _title(db, REPORTING) == "Replica"
+    assert db.count("campaigns", max_staleness=REPORTING) == 1
+    # A tolerance tighter than the replica's lag bound can't use it
+    assert _title(_routed(lag=10.0), BROWSING) == "Primary"
+
+
+def test_writer_reads_its_own_writes():
+    db = _routed()
+
+    def as_user(user_id):
+        bind_route_key(user_id)
+        return _title(db, BROWSING)
+
+    def write_as(user_id):
+        bind_route_key(user_id)
+        db.update("campaigns", {"id": "c1"}, {"title": "Edited"})
+
+    contextvars.copy_context().run(write_as, "u1")
+    assert contextvars.copy_context().run(as_user, "u1") == "Edited"
+    assert contextvars.copy_context().run(as_user, "u2") == "Replica"
+    db._pins["u1"] -= db.replica_lag
+    assert contextvars.copy_context().run(as_user, "u1") == "Replica"
+
+
+def test_replica_failure_falls_back_to_primary():
+    db = _routed()
+
+    def broken(*args, **kwargs):
+        raise ConnectionError("replica down")
+
+    db.replica.find = broken
+    assert _title(db, REPORTING) == "Primary"
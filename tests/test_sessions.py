@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta, timezone
+
+import sessions
+from benchmarks.synthetic import DEFAULT_PASSWORD
+
+
+def _login(client, user):
+    response = client.post("/api/auth/login", json={"email": user["email"], "password": DEFAULT_PASSWORD})
+    assert response.status_code == 200
+    return response.json()["session_token"]
+
+
+def test_sessions_are_capped_per_user(client, server, seed, monkeypatch):
+    monkeypatch.setattr(sessions, "MAX_SESSIONS_PER_USER", 3)
+    user = seed["users"][2]
+    tokens = [_login(client, user) for _ in range(5)]
+
+    live = server.db.find("user_sessions", {"user_id": user["id"]})
+    assert len(live) == 3
+    # The newest sessions survive, the oldest are evicted
+    assert {s["session_token"] for s in live} == set(tokens[-3:])
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {tokens[0]}"}).status_code == 401
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {tokens[-1]}"}).status_code == 200
+
+
+def test_sweeper_removes_expired_sessions_in_batches(server, seed):
+    past = datetime.now(timezone.utc) - timedelta(days=1)
+    server.db.insert("user_sessions", [
+        {"session_token": f"expired-{i}", "user_id": seed["users"][1]["id"],
+         "expires_at": past.isoformat(), "created_at": (past - timedelta(days=7)).isoformat()}
+        for i in range(7)
+    ])
+    live_before = len(server.db.find("user_sessions", {"expires_at": {"$gte": datetime.now(timezone.utc).isoformat()}}))
+
+    assert sessions.sweep_expired(server.db, batch_size=3) == 7
+    assert server.db.find("user_sessions", {"session_token": "expired-0"}) == []
+    assert len(server.db.find("user_sessions", {})) == live_before
+
+
+def test_logout_revokes_bearer_sessions(client, seed):
+    token = _login(client, seed["users"][3])
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
@@ -0,0 +1,46 @@
+from similarity import SimilarityIndex
+
+
+def _campaign(id, title, description, category="Technology", tags=()):
+    return {"id": id, "title": title, "description": description, "category": category, "tags": list(tags),
+            "goal_amount": 1000, "raised_amount": 0, "backers_count": 0}
+
+
+CORPUS = [
+    _campaign("grill", "Smart pellet grill", "App controlled pellet grill for backyard smoking", "Food"),
+    _campaign("smoker", "Portable pellet smoker", "Compact smoker and grill for camping trips", "Food"),
+    _campaign("novel", "Fantasy novel", "An epic fantasy novel about dragons", "Art"),
+    _campaign("drone", "Racing drone kit", "Build your own FPV racing drone", tags=["drone", "fpv"]),
+]
+
+
+def test_nearest_neighbour_and_incremental_updates():
+    index = SimilarityIndex(dim=256)
+    index.rebuild(CORPUS)
+    assert index.similar("grill", k=1)[0]["id"] == "smoker"
+
+    index.upsert(_campaign("quad", "FPV quadcopter drone", "Fast racing quadcopter", tags=["drone"]))
+    assert index.similar("drone", k=1)[0]["id"] == "quad"
+
+    index.remove(CORPUS[1])
+    assert "smoker" not in {r["id"] for r in index.similar("grill", k=10)}
+    assert index.similar("smoker") is None
+    assert len(index) == 4
+
+
+def test_matrix_grows_past_initial_capacity():
+    index = SimilarityIndex(dim=64)
+    index.rebuild([])
+    for i in range(200):
+        index.upsert(_campaign(f"c{i}", f"campaign {i}", "words"))
+    assert len(index) == 200
+    assert len(index.similar("c5", k=3)) == 3
+
+
+def test_similar_endpoint(client, seed):
+    campaign = seed["campaigns"][0]
+    response = client.get(f"/api/campaigns/{campaign['id']}/similar?limit=3")
+    assert response.status_code == 200
+    ids = [row["id"] for row in response.json()]
+    assert len(ids) <= 3 and campaign["id"] not in ids
+    assert client.get("/api/campaigns/missing/similar").status_code == 404
@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+HEAVY_SDKS = ("google.generativeai", "stripe", "supabase", "bcrypt")
+
+
+def test_importing_server_defers_heavy_sdks():
+    code = "import sys, server; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY_SDKS,)
+    env = {k: v for k, v in os.environ.items() if not k.startswith("SUPABASE_")}
+    env["DATA_BACKEND"] = "supabase"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == ""
+
+
+def test_readiness_reports_backend(client):
+    assert client.get("/api/health").json() == {"status": "ok"}
+    response = client.get("/api/health/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
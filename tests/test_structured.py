@@ -0,0 +1,69 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import structured
+
+
+def _auth(seed, user_id):
+    token = next(s["session_token"] for s in seed["user_sessions"] if s["user_id"] == user_id)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_schemas_are_accepted_by_gemini(server):
+    from google.generativeai.types import generation_types
+
+    for model in (server.TitleSuggestions, server.SuccessPredictionOutput, server.MarketingStrategyOutput,
+                  server.CompetitorNarrative, server.StrategicRecommendationsOutput):
+        config = generation_types.to_generation_config_dict(structured.generation_config(model))
+        assert config["response_mime_type"] == "application/json"
+
+    schema = structured.compact_schema(server.StrategicRecommendationsOutput)
+    assert "$defs" not in json.dumps(schema)
+    tiers = schema["properties"]["strategic_recommendations"]["items"]["properties"]["reward_tiers"]
+    assert tiers["nullable"] and tiers["type"] == "array"
+
+
+def test_retries_invalid_output_once(server):
+    replies = ["Sure! Here are your titles:", json.dumps({"titles": ["A", "B", "C", "D", "E"]})]
+    prompts = []
+
+    def generate(prompt, endpoint, config):
+        prompts.append(prompt)
+        return SimpleNamespace(text=replies[len(prompts) - 1])
+
+    result = structured.generate_structured(server.TitleSuggestions, "titles please", "optimize_title", generate)
+    assert result.titles == ["A", "B", "C", "D", "E"]
+    assert len(prompts) == 2 and "invalid" in prompts[1]
+
+    with pytest.raises(structured.StructuredOutputError):
+        structured.generate_structured(server.TitleSuggestions, "titles please", "optimize_title",
+                                       lambda *args: SimpleNamespace(text='{"titles": ["only one"]}'))
+
+
+def test_transport_errors_are_not_retried(server):
+    calls = []
+
+    def generate(prompt, endpoint, config):
+        calls.append(prompt)
+        raise RuntimeError("quota exceeded")
+
+    with pytest.raises(RuntimeError):
+        structured.generate_structured(server.TitleSuggestions, "titles please", "optimize_title", generate)
+    assert len(calls) == 1
+
+
+def test_endpoints_return_schema_shaped_payloads(client, seed):
+    campaign = seed["campaigns"][0]
+    headers = _auth(seed, campaign["creator_id"])
+
+    strategy = client.post("/api/ai/marketing-strategy", headers=headers, json={
+        "title": "Desk lamp", "description": "A lamp", "category": "Tech", "goal_amount": 1000}).json()
+    assert strategy["overview"] == "Synthetic"
+    assert len(strategy["timeline"]) == 3 and strategy["channels"][0]["priority"] == "High"
+
+    recommendations = client.get(f"/api/analytics/strategic-recommendations/{campaign['id']}", headers=headers).json()
+    prediction = recommendations["success_prediction"]
+    assert prediction["similar_campaigns"] == "Synthetic"   # the model's answer, not the fallback
+    assert "success rate" in prediction["category_average"]